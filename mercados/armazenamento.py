@@ -0,0 +1,162 @@
+"""Armazenamento local (SQLite) dos registros baixados, para consultá-los depois sem acessar a rede
+
+`BaseSQLite` guarda os objetos de uma dataclass em uma tabela cujas colunas são definidas pelas anotações dos campos
+(mesmo esquema de `mercados.exportacao`), com um índice pelas colunas usadas nas consultas. Os dados são carregados
+em "partições" (um arquivo anual, um mês etc.): cada partição é registrada na tabela `particao`, o que permite
+atualizar a base de forma incremental (baixando apenas o que falta) e recarregar uma partição sem duplicar registros.
+
+`Decimal` é guardado como texto (preservando todas as casas) e datas no formato ISO (que mantém a ordenação).
+"""
+
+import datetime
+import sqlite3
+from decimal import Decimal
+from itertools import islice
+from pathlib import Path
+
+from .exportacao import esquema, extrator_campos
+from .instrumentacao import ETAPAS
+
+TIPOS_SQLITE = {
+    "booleano": "INTEGER",
+    "inteiro": "INTEGER",
+    "real": "REAL",
+    "decimal": "TEXT",
+    "datahora": "TEXT",
+    "data": "TEXT",
+    "texto": "TEXT",
+}
+PARA_SQLITE = {"decimal": str, "datahora": datetime.datetime.isoformat, "data": datetime.date.isoformat}
+DE_SQLITE = {
+    "booleano": bool,
+    "decimal": Decimal,
+    "datahora": datetime.datetime.fromisoformat,
+    "data": datetime.date.fromisoformat,
+}
+TAMANHO_LOTE_SQLITE = 10_000
+
+
+def _converte_colunas(conversores):
+    """Cria uma função que aplica `conversores` (`{indice: funcao}`) a uma tupla, mantendo os valores `None`"""
+    if not conversores:
+        return tuple
+    itens = tuple(conversores.items())
+
+    def converte(valores):
+        valores = list(valores)
+        for indice, funcao in itens:
+            valor = valores[indice]
+            if valor is not None:
+                valores[indice] = funcao(valor)
+        return valores
+
+    return converte
+
+
+class BaseSQLite:
+    """Guarda objetos da dataclass `classe` na tabela `tabela` de um arquivo SQLite
+
+    :param filename: arquivo SQLite (criado caso não exista)
+    :param classe: dataclass dos registros (define as colunas e seus tipos)
+    :param tabela: nome da tabela
+    :param indice: colunas do índice usado pelas consultas (na ordem em que são filtradas)
+    """
+
+    def __init__(self, filename: Path | str, classe, tabela: str, indice: tuple):
+        self.filename = Path(filename)
+        self.filename.parent.mkdir(parents=True, exist_ok=True)
+        self.classe = classe
+        self.tabela = tabela
+        self.esquema = esquema(classe)
+        self.colunas = tuple(nome for nome, _ in self.esquema)
+        _, extrai = extrator_campos(classe)
+        para_sqlite = _converte_colunas(
+            {indice: PARA_SQLITE[tipo] for indice, (_, tipo) in enumerate(self.esquema) if tipo in PARA_SQLITE}
+        )
+        self._para_sqlite = lambda registro: para_sqlite(extrai(registro))
+        self._de_sqlite = _converte_colunas(
+            {indice: DE_SQLITE[tipo] for indice, (_, tipo) in enumerate(self.esquema) if tipo in DE_SQLITE}
+        )
+        definicoes = ", ".join(f"{nome} {TIPOS_SQLITE[tipo]}" for nome, tipo in self.esquema)
+        self.conexao = sqlite3.connect(self.filename)
+        self.conexao.executescript(
+            f"""
+            CREATE TABLE IF NOT EXISTS {tabela} ({definicoes});
+            CREATE INDEX IF NOT EXISTS {tabela}_indice ON {tabela} ({", ".join(indice)});
+            CREATE TABLE IF NOT EXISTS particao (
+                tabela TEXT NOT NULL,
+                nome TEXT NOT NULL,
+                registros INTEGER NOT NULL,
+                carregada_em TEXT NOT NULL,
+                PRIMARY KEY (tabela, nome)
+            );
+            """
+        )
+        self._insert = f"INSERT INTO {tabela} ({', '.join(self.colunas)}) VALUES ({', '.join('?' * len(self.colunas))})"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.conexao.commit()
+        self.conexao.close()
+
+    def commit(self):
+        self.conexao.commit()
+
+    def insere(self, registros) -> int:
+        """Insere os `registros` (iterável de objetos de `classe`) e retorna a quantidade inserida"""
+        antes = self.conexao.total_changes
+        valores = map(self._para_sqlite, registros)
+        # Em lotes, para que o tempo de escrita seja medido separado do da leitura/conversão dos registros (`--stats`)
+        while lote := list(islice(valores, TAMANHO_LOTE_SQLITE)):
+            with ETAPAS.etapa("escrita"):
+                self.conexao.executemany(self._insert, lote)
+        inseridos = self.conexao.total_changes - antes
+        ETAPAS.conta("escrita", registros=inseridos)
+        ETAPAS.conta("conversao", registros=inseridos)
+        return inseridos
+
+    def remove(self, filtro: str, parametros: tuple = ()) -> int:
+        """Remove os registros que atendem a `filtro` (cláusula `WHERE` com parâmetros `?`)"""
+        return self.conexao.execute(f"DELETE FROM {self.tabela} WHERE {filtro}", parametros).rowcount
+
+    def consulta(self, filtro: str = None, parametros: tuple = (), ordem: str = None):
+        """Devolve os objetos de `classe` que atendem a `filtro` (cláusula `WHERE` com parâmetros `?`)"""
+        sql = f"SELECT {', '.join(self.colunas)} FROM {self.tabela}"
+        if filtro:
+            sql += f" WHERE {filtro}"
+        if ordem:
+            sql += f" ORDER BY {ordem}"
+        classe, de_sqlite = self.classe, self._de_sqlite
+        for row in self.conexao.execute(sql, parametros):
+            yield classe(*de_sqlite(row))
+
+    def particoes(self) -> dict:
+        """Partições já carregadas, no formato `{nome: quantidade de registros}`"""
+        cursor = self.conexao.execute("SELECT nome, registros FROM particao WHERE tabela = ?", (self.tabela,))
+        return dict(cursor.fetchall())
+
+    def particao_carregada(self, nome: str) -> bool:
+        row = self.conexao.execute(
+            "SELECT 1 FROM particao WHERE tabela = ? AND nome = ?", (self.tabela, nome)
+        ).fetchone()
+        return row is not None
+
+    def carrega_particao(self, nome: str, registros, filtro: str, parametros: tuple = ()) -> int:
+        """Substitui os registros da partição `nome` (os que atendem a `filtro`) pelos `registros` e registra-a
+
+        Tudo é feito em uma única transação: caso o download ou a conversão dos registros falhe no meio, a partição
+        não fica carregada pela metade.
+        """
+        with self.conexao:
+            self.remove(filtro, parametros)
+            quantidade = self.insere(registros)
+            self.conexao.execute(
+                "INSERT OR REPLACE INTO particao (tabela, nome, registros, carregada_em) VALUES (?, ?, ?, ?)",
+                (self.tabela, nome, quantidade, datetime.datetime.now().isoformat()),
+            )
+        return quantidade
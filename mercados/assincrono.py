@@ -0,0 +1,459 @@
+"""Clientes assíncronos (`asyncio`) para B3, FundosNet e Banco Central
+
+Os clientes deste módulo fazem as mesmas requisições que `B3`, `FundosNet` e `BancoCentral`, mas usando `httpx`
+(dependência opcional, instale com `pip install mercados[async]`), o que permite manter centenas de requisições em
+andamento em um mesmo processo. A conversão dos dados é compartilhada com os clientes síncronos, então os objetos
+retornados são os mesmos (`FundoB3`, `DocumentMeta`, `Taxa` etc.).
+
+Exemplo:
+
+    async with AsyncB3() as b3:
+        async for emprestimo in b3.clearing_emprestimos_registrados(data_inicial, data_final):
+            print(emprestimo)
+"""
+
+import asyncio
+import base64
+import datetime
+import time
+from urllib.parse import urljoin
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from .b3 import (
+    B3,
+    AcaoCustodiada,
+    Dividendo,
+    EmprestimoAtivo,
+    EmprestimoEmAberto,
+    EmprestimoNegociado,
+    FundoB3,
+    FundoB3Resumido,
+    PrecoAtivo,
+    converte_tabela_clearing,
+    decodifica_resposta,
+)
+from .bcb import BancoCentral, Taxa
+from .document import DocumentMeta
+from .fundosnet import REGEXP_CSRF_TOKEN, FundosNet, decodifica_xml
+from .utils import CABECALHOS_PADRAO, POLITICA_RETENTATIVAS, parse_date
+
+
+def cria_cliente(timeout=10, verify_ssl=False, max_conexoes=100, transport=None):
+    """Cria um `httpx.AsyncClient` com os mesmos cabeçalhos e tentativas de conexão da sessão síncrona"""
+    if httpx is None:
+        raise ImportError("Os clientes assíncronos dependem do `httpx` - instale-o com `pip install mercados[async]`")
+    if transport is None:
+        transport = httpx.AsyncHTTPTransport(
+            retries=7,
+            verify=verify_ssl,
+            limits=httpx.Limits(max_connections=max_conexoes, max_keepalive_connections=max_conexoes),
+        )
+    return httpx.AsyncClient(
+        headers=CABECALHOS_PADRAO,
+        timeout=timeout,
+        verify=verify_ssl,
+        follow_redirects=True,
+        transport=transport,
+    )
+
+
+class _ClienteAssincrono:
+    """Base dos clientes assíncronos: controla o `httpx.AsyncClient` e o limite de requisições simultâneas
+
+    Use-os como gerenciadores de contexto assíncronos (`async with`), que chamam `inicializa` e `fecha`. As
+    retentativas seguem `politica` (por padrão, a mesma `POLITICA_RETENTATIVAS` das sessões síncronas).
+    """
+
+    politica = POLITICA_RETENTATIVAS
+
+    def __init__(self, max_requisicoes_simultaneas=100, timeout=10, verify_ssl=False, transport=None):
+        self.cliente = cria_cliente(
+            timeout=timeout, verify_ssl=verify_ssl, max_conexoes=max_requisicoes_simultaneas, transport=transport
+        )
+        self._semaforo = asyncio.Semaphore(max_requisicoes_simultaneas)
+
+    async def __aenter__(self):
+        await self.inicializa()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.fecha()
+
+    async def inicializa(self):
+        pass
+
+    async def fecha(self):
+        await self.cliente.aclose()
+
+    async def _requisicao(self, method, url, **kwargs):
+        async with self._semaforo:
+            return await self.cliente.request(method, url, **kwargs)
+
+    async def _requisicao_com_retentativas(self, method, url, tentativas=None, espera_minima=None, **kwargs):
+        """Faz a requisição seguindo `politica` (espera aleatória, orçamento de retentativas e circuito por host)"""
+        return await self.politica.executa_assincrono(
+            method,
+            url,
+            lambda: self._requisicao(method, url, **kwargs),
+            erros=(httpx.NetworkError, httpx.TimeoutException),
+            tentativas=tentativas,
+            espera_minima=espera_minima,
+        )
+
+
+class AsyncB3(_ClienteAssincrono):
+    """Versão assíncrona de `B3` (APIs JSON de fundos listados, cotações e Clearing)"""
+
+    funds_call_url = B3.funds_call_url
+    _make_url_params = B3._make_url_params
+
+    async def inicializa(self):
+        # Requisição para guardar cookies:
+        await self.request(
+            "https://www.b3.com.br/pt_br/produtos-e-servicos/negociacao/renda-variavel/fundos-de-investimento-imobiliario-fii.htm",
+            decode_json=False,
+        )
+
+    async def request(
+        self,
+        url,
+        url_params=None,
+        params=None,
+        method="GET",
+        decode_json=True,
+        json_data=None,
+        max_tries=5,
+        wait_between_errors=0.5,
+    ):
+        if url_params is not None:
+            url = urljoin(url, self._make_url_params(url_params))
+        # Mesmo motivo das tentativas em `B3.request`: erros HTTP 520 recorrentes da CloudFlare
+        response = await self._requisicao_com_retentativas(
+            method,
+            url,
+            tentativas=max_tries,
+            espera_minima=wait_between_errors,
+            params=params,
+            json=json_data,
+        )
+        if decode_json:
+            return decodifica_resposta(response.text)
+        return response
+
+    async def paginate(self, base_url, url_params=None, params=None, method="GET"):
+        url_params = url_params or {}
+        if "pageNumber" not in url_params:
+            url_params["pageNumber"] = 1
+        if "pageSize" not in url_params:
+            url_params["pageSize"] = 100
+        finished = False
+        while not finished:
+            response = await self.request(base_url, url_params, params=params, method=method)
+            if isinstance(response, list):
+                for item in response:
+                    yield item
+                finished = True
+            elif isinstance(response, dict):
+                if "results" in response:
+                    for item in response["results"]:
+                        yield item
+                    finished = url_params["pageNumber"] >= response["page"]["totalPages"]
+                    url_params["pageNumber"] += 1
+                else:
+                    yield response
+
+    async def _tabela_clearing(self, url_template, url_params, query_params, json_data=None, data_class=None):
+        """Baixa dados de Clearing do Boletim do Mercado da B3 (ver `B3._tabela_clearing`)"""
+        page, page_size = 1, 1000
+        json_data = json_data if json_data is not None else {}
+        finished = False
+        while not finished:
+            url = url_template.format(page=page, page_size=page_size, **url_params)
+            data = await self.request(url, params=query_params, method="POST", json_data=json_data)
+            table = data["table"]
+            for row in converte_tabela_clearing(table, data_class):
+                yield row
+            finished = table["pageCount"] == page or len(table["values"]) == 0
+            page += 1
+
+    async def _fundos_listados_por_tipo(self, tipo, detalhe=True):
+        objs = self.paginate(
+            base_url=urljoin(self.funds_call_url, "GetListFunds/"),
+            url_params={"language": "pt-br", "typeFund": tipo},
+        )
+        if not detalhe:
+            async for obj in objs:
+                yield FundoB3Resumido.from_dict(obj, tipo=tipo)
+            return
+        # Os detalhes são pedidos todos de uma vez (limitados pelo semáforo) e devolvidos na ordem da listagem
+        tarefas = [
+            asyncio.ensure_future(self.fundo_listado_detalhe(tipo, obj["id"], obj["acronym"])) async for obj in objs
+        ]
+        try:
+            for tarefa in tarefas:
+                yield await tarefa
+        finally:
+            for tarefa in tarefas:
+                tarefa.cancel()
+
+    async def fundo_listado_detalhe(self, tipo, id_fnet, acronimo):
+        response_data = await self.request(
+            url=urljoin(self.funds_call_url, "GetDetailFund/"),
+            url_params={"language": "pt-br", "idFNET": id_fnet, "idCEM": acronimo, "typeFund": tipo},
+        )
+        return FundoB3.from_dict(response_data)
+
+    async def fundo_listado_dividendos(self, acronimo):
+        data = await self.request(
+            url=urljoin(self.funds_call_url, "GetEventsCorporateActions/"),
+            url_params={"language": "pt-br", "idCEM": acronimo},
+        )
+        dividends = data.get("cashDividends") if data else []
+        return [Dividendo.from_dict(row) for row in dividends]
+
+    async def etfs(self, detalhe=False):
+        """Devolve os ETFs listados na B3 (incluindo os de renda fixa)"""
+        for tipo in ("ETF", "ETF-RF"):
+            async for fundo in self._fundos_listados_por_tipo(tipo, detalhe=detalhe):
+                yield fundo
+
+    async def fiis(self, detalhe=False):
+        """Devolve os FIIs listados na B3"""
+        async for fundo in self._fundos_listados_por_tipo("FII", detalhe=detalhe):
+            yield fundo
+
+    async def fiinfras(self, detalhe=False):
+        """Devolve os FI-Infras listados na B3"""
+        async for fundo in self._fundos_listados_por_tipo("FI-Infra", detalhe=detalhe):
+            yield fundo
+
+    async def fips(self, detalhe=False):
+        """Devolve os FIPs listados na B3"""
+        async for fundo in self._fundos_listados_por_tipo("FIP", detalhe=detalhe):
+            yield fundo
+
+    async def fiagros(self, detalhe=False):
+        """Devolve os FI-Agros listados na B3"""
+        for tipo in ("FIAGRO", "FIAGRO-FII"):
+            async for fundo in self._fundos_listados_por_tipo(tipo, detalhe=detalhe):
+                yield fundo
+
+    async def fidcs(self, detalhe=False):
+        """Devolve os FIDCs listados na B3"""
+        async for fundo in self._fundos_listados_por_tipo("FIDC", detalhe=detalhe):
+            yield fundo
+
+    async def clearing_acoes_custodiadas(self, data_inicial: datetime.date):
+        """Clearing - Ações Custodiadas"""
+        async for row in self._tabela_clearing(
+            url_template="https://arquivos.b3.com.br/bdi/table/Custody/{data_inicial}/{data_final}/{page}/{page_size}",
+            url_params={"data_inicial": data_inicial.isoformat(), "data_final": data_inicial.isoformat()},
+            query_params={"sort": "TckrSymb"},
+            data_class=AcaoCustodiada,
+        ):
+            yield row
+
+    async def clearing_emprestimos_registrados(
+        self, data_inicial: datetime.date, data_final: datetime.date, codigo_negociacao=None
+    ):
+        """Clearing - Empréstimos de Ativos - Empréstimos Registrados"""
+        query_params = {"sort": "TckrSymb"}
+        if codigo_negociacao is not None:
+            query_params["filter"] = base64.b64encode(codigo_negociacao.encode("utf-8")).decode("ascii")
+        async for row in self._tabela_clearing(
+            url_template="https://arquivos.b3.com.br/bdi/table/BTBLoanBalance/{data_inicial}/{data_final}/{page}/{page_size}",
+            url_params={"data_inicial": data_inicial.isoformat(), "data_final": data_final.isoformat()},
+            query_params=query_params,
+            data_class=EmprestimoAtivo,
+        ):
+            yield row
+
+    async def clearing_emprestimos_negociados(
+        self, data: datetime.date, filtro_tomador=None, filtro_doador=None, filtro_mercado=None, codigo_negociacao=None
+    ):
+        """Clearing - Empréstimos de Ativos - Negócios"""
+        query_params = {"sort": "TckrSymb"}
+        json_data = {}
+        if filtro_tomador is not None:
+            json_data["EntryBuyerNm"] = filtro_tomador
+        if filtro_doador is not None:
+            json_data["EntrySellerNm"] = filtro_doador
+        if filtro_mercado is not None:
+            json_data["MarketBTB"] = filtro_mercado
+        if codigo_negociacao is not None:
+            query_params["filter"] = base64.b64encode(codigo_negociacao.encode("utf-8")).decode("ascii")
+        async for row in self._tabela_clearing(
+            url_template="https://arquivos.b3.com.br/bdi/table/BTBTrade/{data_inicial}/{data_final}/{page}/{page_size}",
+            url_params={"data_inicial": data.isoformat(), "data_final": data.isoformat()},
+            query_params=query_params,
+            json_data=json_data,
+            data_class=EmprestimoNegociado,
+        ):
+            yield row
+
+    async def clearing_emprestimos_em_aberto(
+        self, data_inicial: datetime.date, data_final: datetime.date, filtro_mercado=None, codigo_negociacao=None
+    ):
+        """Clearing - Empréstimos de Ativos - Posições em Aberto"""
+        query_params = {"sort": "TckrSymb"}
+        if codigo_negociacao is not None:
+            query_params["filter"] = base64.b64encode(codigo_negociacao.encode("utf-8")).decode("ascii")
+        json_data = {}
+        if filtro_mercado is not None:
+            json_data["Market"] = filtro_mercado
+        async for row in self._tabela_clearing(
+            url_template="https://arquivos.b3.com.br/bdi/table/BTBLendingOpenPosition/{data_inicial}/{data_final}/{page}/{page_size}",
+            url_params={"data_inicial": data_inicial.isoformat(), "data_final": data_final.isoformat()},
+            query_params=query_params,
+            json_data=json_data,
+            data_class=EmprestimoEmAberto,
+        ):
+            yield row
+
+    async def ultimas_cotacoes(self, codigo_negociacao):
+        """Baixa as cotações para o último pregão para um determinado ativo, com atraso de 15min (ver `B3.ultimas_cotacoes`)"""
+        url = f"https://cotacao.b3.com.br/mds/api/v1/DailyFluctuationHistory/{codigo_negociacao}"
+        response = await self.request(url)
+        data = parse_date("iso-date", response["TradgFlr"]["date"])
+        ticker = response["TradgFlr"]["scty"]["symb"]
+        assert (
+            ticker.lower().strip() == codigo_negociacao.lower().strip()
+        ), f"Código negociação retornado diferente do fornecido: {repr(ticker)} vs {repr(codigo_negociacao)}"
+        return [PrecoAtivo.from_dict(data, ticker, obj) for obj in response["TradgFlr"]["scty"]["lstQtn"]]
+
+
+class AsyncFundosNet(_ClienteAssincrono):
+    """Versão assíncrona de `FundosNet` (busca de documentos e download de XMLs)"""
+
+    base_url = FundosNet.base_url
+    _parametros_busca = FundosNet._parametros_busca
+
+    def __init__(self, max_requisicoes_simultaneas=100, timeout=5, verify_ssl=False, transport=None):
+        super().__init__(
+            max_requisicoes_simultaneas=max_requisicoes_simultaneas,
+            timeout=timeout,
+            verify_ssl=verify_ssl,
+            transport=transport,
+        )
+        self.draw = 0
+        self.main_page = None
+
+    async def inicializa(self):
+        response = await self.request("GET", "abrirGerenciadorDocumentosCVM", xhr=False)
+        self.main_page = response.text
+        matches = REGEXP_CSRF_TOKEN.findall(self.main_page)
+        if not matches:
+            raise RuntimeError("Cannot find CSRF token")
+        self.cliente.headers["CSRFToken"] = matches[0]
+
+    async def request(self, method, path, headers=None, params=None, data=None, json=None, xhr=False):
+        params = params or {}
+        headers = headers or {}
+        if xhr:
+            self.draw += 1
+            params["d"] = self.draw
+            headers["X-Requested-With"] = "XMLHttpRequest"
+        return await self._requisicao_com_retentativas(
+            method,
+            urljoin(self.base_url, path),
+            headers=headers,
+            params=params,
+            data=data,
+            json=json,
+        )
+
+    async def paginate(self, path, params=None, xhr=True, items_per_page=200):
+        params = params or {}
+        params["s"] = 0  # rows to skip
+        params["l"] = items_per_page  # page length
+        params["_"] = int(time.time() * 1000)
+        total_rows, finished = None, False
+        while not finished:
+            response = await self.request("GET", path, params=dict(params), xhr=xhr)
+            if response.status_code == 404:  # Finished (wrong page?)
+                return
+            response_data = response.json()
+            if total_rows is None:
+                total_rows = response_data["recordsTotal"]
+            data = response_data["data"]
+            for row in data:
+                yield row
+            params["s"] += len(data)
+            params["_"] = int(time.time() * 1000)
+            finished = params["s"] >= total_rows
+
+    async def search(
+        self,
+        category="Todos",
+        type_="Todos",
+        fund_type="Todos",
+        cnpj=None,
+        situacao=None,
+        start_date=None,
+        end_date=None,
+        ordering_field="dataEntrega",
+        order="desc",
+        items_per_page=200,
+    ):
+        """Busca documentos (mesmos parâmetros de `FundosNet.search`)"""
+        params = self._parametros_busca(
+            category=category,
+            type_=type_,
+            fund_type=fund_type,
+            cnpj=cnpj,
+            situacao=situacao,
+            start_date=start_date,
+            end_date=end_date,
+            ordering_field=ordering_field,
+            order=order,
+        )
+        async for row in self.paginate(
+            path="pesquisarGerenciadorDocumentosDados",
+            params=params,
+            xhr=True,
+            items_per_page=items_per_page,
+        ):
+            yield DocumentMeta.from_json(row)
+
+    async def baixa_xml(self, url, max_tries=5, wait_between_errors=0.5):
+        """Baixa um XML do FundosNet a partir da URL e decodifica-o corretamente (ver `FundosNet.baixa_xml`)"""
+        # Forçar o cabeçalho `Accept` faz com que a resposta não seja enviada em base64
+        response = await self._requisicao_com_retentativas(
+            "GET",
+            url,
+            tentativas=max_tries,
+            espera_minima=wait_between_errors,
+            headers={"Accept": "application/xhtml+xml"},
+        )
+        response.raise_for_status()
+        return decodifica_xml(response.content)
+
+
+class AsyncBancoCentral(_ClienteAssincrono):
+    """Versão assíncrona de `BancoCentral` (séries temporais do SGS)"""
+
+    series = BancoCentral.series
+    _url_serie_temporal = BancoCentral._url_serie_temporal
+    _converte_serie_temporal = BancoCentral._converte_serie_temporal
+
+    def __init__(self, max_requisicoes_simultaneas=100, timeout=10, verify_ssl=True, transport=None):
+        super().__init__(
+            max_requisicoes_simultaneas=max_requisicoes_simultaneas,
+            timeout=timeout,
+            verify_ssl=verify_ssl,
+            transport=transport,
+        )
+        # Mesmo motivo de `BancoCentral`: alguns serviços não retornam resultados caso o cabeçalho `Accept` seja passado
+        del self.cliente.headers["Accept"]
+
+    async def serie_temporal(
+        self, nome_ou_codigo: str | int, inicio: datetime.date = None, fim: datetime.date = None
+    ) -> list[Taxa]:
+        """Acessa API de séries temporais do Banco Central (mesmos parâmetros de `BancoCentral.serie_temporal`)"""
+        url, params = self._url_serie_temporal(nome_ou_codigo, inicio, fim)
+        response = await self._requisicao_com_retentativas("GET", url, params=params)
+        return self._converte_serie_temporal(response.json())
@@ -3,27 +3,38 @@ import csv
 import datetime
 import io
 import json
-import time
 from copy import deepcopy
-from dataclasses import asdict, dataclass
+from dataclasses import dataclass, fields
 from decimal import Decimal
 from functools import lru_cache
+from pathlib import Path
 from typing import Dict, List, Optional
 from urllib.parse import urljoin
 from zipfile import ZipFile
 
+from .armazenamento import BaseSQLite
 from .bcb import Taxa
+from .instrumentacao import ETAPAS
 from .utils import (
     BRT,
+    LIMITADOR_CONCORRENCIA,
     REGEXP_CNPJ_SEPARATORS,
+    CacheHTTP,
+    LimitadorTaxa,
+    baixa_arquivo,
     clean_string,
     create_session,
+    day_range,
+    last_day_of_month,
+    mapeia_em_paralelo,
     parse_br_date,
     parse_br_decimal,
     parse_date,
     parse_datetime_force_timezone,
     parse_iso_date,
     parse_time,
+    serializa_dataclass,
+    versao_compacta,
 )
 
 UM_CENTAVO = Decimal("0.01")
@@ -43,6 +54,7 @@ def parse_float(value):
     return float(value)
 
 
+@lru_cache(maxsize=16 * 1024, typed=True)
 def parse_decimal(value, places=2):
     if value is None or value == "":
         return None
@@ -88,6 +100,32 @@ def json_decode(data):
 # TODO: pegar DI histórico http://estatisticas.cetip.com.br/astec/series_v05/paginas/lum_web_v05_template_informacoes_di.asp?str_Modulo=completo&int_Idioma=1&int_Titulo=6&int_NivelBD=2
 
 
+def decodifica_resposta(text: str):
+    """Decodifica o JSON retornado pelas APIs da B3 (que às vezes vem codificado duas vezes)
+
+    Sem cache: os objetos devolvidos são alterados por quem os consome (como `PrecoAtivo.from_dict`).
+
+    >>> decodifica_resposta('{"a": 1}')
+    {'a': 1}
+    >>> decodifica_resposta("")
+    {}
+    """
+    if text and text[0] == text[-1] == '"':  # WTF, B3?
+        text = json_decode(text)
+    return json_decode(text) if text else {}
+
+
+def converte_tabela_clearing(table: dict, data_class=None):
+    """Converte as linhas de uma página de tabela de Clearing para dicionários (ou para `data_class`)"""
+    header = [col["friendlyNamePt"] or col["name"] for col in table["columns"]]
+    for item in table["values"]:
+        row = dict(zip(header, item))
+        if data_class is not None:
+            yield data_class.from_dict(row)
+        else:
+            yield row
+
+
 @lru_cache(maxsize=16 * 1024)
 def converte_centavos_para_decimal(valor: str) -> Optional[Decimal]:
     """Converte um valor em centavos em str para Decimal em Reais com 2 casas decimais
@@ -143,8 +181,7 @@ class AtivoIndice:
     qtd_teorica: Decimal
     participacao: Decimal
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
 
 
 @dataclass
@@ -212,10 +249,8 @@ class NegociacaoBolsa:
         return cls(
             quantidade=int(row["quatot"]) if row["quatot"] else None,
             pontos_strike=int(row["ptoexe"]) if row["ptoexe"] != "0000000000000" else None,
-            data=datetime.datetime.strptime(row["date_of_exchange"], "%Y%m%d").date(),
-            data_vencimento=(
-                None if row["datven"] == "99991231" else datetime.datetime.strptime(row["datven"], "%Y%m%d").date()
-            ),
+            data=parse_date("yyyymmdd", row["date_of_exchange"]),
+            data_vencimento=None if row["datven"] == "99991231" else parse_date("yyyymmdd", row["datven"]),
             negociacoes=int(row["totneg"]) if row["totneg"] else None,
             lote=int(row["fatcot"]) if row["fatcot"] else None,
             indice_correcao=int(row["indopc"]) if row["indopc"] else None,
@@ -239,8 +274,204 @@ class NegociacaoBolsa:
             preco_execucao=converte_centavos_para_decimal(row["preexe"]),
         )
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
+
+
+NegociacaoBolsaCompacta = versao_compacta(NegociacaoBolsa)
+
+
+def centavos_para_decimal(valor: Optional[int]) -> Optional[Decimal]:
+    """Converte um valor inteiro em centavos para Decimal em Reais com 2 casas decimais
+
+    >>> centavos_para_decimal(12356)
+    Decimal('123.56')
+    >>> centavos_para_decimal(0)
+    Decimal('0.00')
+    >>> print(centavos_para_decimal(None))
+    None
+    """
+    return Decimal(valor).scaleb(-2) if valor is not None else None
+
+
+class TabelaNegociacaoBolsa:
+    """Negociações de um arquivo COTAHIST em formato colunar (uma lista por campo de `NegociacaoBolsa`)
+
+    Evita criar um objeto por linha: os campos são extraídos por posições pré-calculadas, os preços e o volume são
+    guardados como inteiros em centavos (e não `Decimal`) e as datas, que se repetem muito, são decodificadas uma única
+    vez. Use `to_records` para obter os objetos `NegociacaoBolsa`.
+    """
+
+    campos = tuple(field.name for field in fields(NegociacaoBolsa))
+    # Campos inteiros (posição inicial, posição final) - os valores em branco viram `None`
+    _inteiros = {
+        "quantidade": (152, 170),
+        "negociacoes": (147, 152),
+        "lote": (210, 217),
+        "indice_correcao": (201, 202),
+        "distribuicao": (242, 245),
+        "codigo_bdi": (10, 12),
+        "codigo_tipo_mercado": (24, 27),
+        "prazo_termo": (49, 52),
+    }
+    _textos = {
+        "codigo_isin": (230, 242),
+        "codigo_negociacao": (12, 24),
+        "moeda": (52, 56),
+        "nome_pregao": (27, 39),
+        "tipo_papel": (39, 49),
+    }
+    _centavos = {
+        "preco_abertura": (56, 69),
+        "preco_maximo": (69, 82),
+        "preco_minimo": (82, 95),
+        "preco_medio": (95, 108),
+        "preco_ultimo": (108, 121),
+        "preco_melhor_oferta_compra": (121, 134),
+        "preco_melhor_oferta_venda": (134, 147),
+        "volume": (170, 188),
+        "preco_execucao": (188, 201),
+    }
+
+    campos_centavos = tuple(_centavos)
+
+    def __init__(self):
+        self.colunas = {campo: [] for campo in self.campos}
+        self._datas = {"99991231": None}
+
+    def __len__(self):
+        return len(self.colunas["data"])
+
+    def _data(self, valor: str) -> Optional[datetime.date]:
+        try:
+            return self._datas[valor]
+        except KeyError:
+            data = self._datas[valor] = datetime.date(int(valor[:4]), int(valor[4:6]), int(valor[6:8]))
+            return data
+
+    @classmethod
+    def from_lines(cls, lines, codigos: Optional[set] = None):
+        """Lê as linhas de um arquivo COTAHIST (as que não forem registros de negociação são ignoradas)
+
+        Caso `codigos` seja informado, apenas as negociações desses códigos são lidas.
+        """
+        tabela = cls()
+        tabela.extend(lines, codigos=codigos)
+        return tabela
+
+    def extend(self, lines, codigos: Optional[set] = None):
+        colunas, data = self.colunas, self._data
+        inteiros = [(colunas[campo].append, slice(*posicoes)) for campo, posicoes in self._inteiros.items()]
+        textos = [(colunas[campo].append, slice(*posicoes)) for campo, posicoes in self._textos.items()]
+        centavos = [(colunas[campo].append, slice(*posicoes)) for campo, posicoes in self._centavos.items()]
+        datas, vencimentos = colunas["data"].append, colunas["data_vencimento"].append
+        pontos_strike = colunas["pontos_strike"].append
+        for line in lines:
+            if line[:2] != "01":  # Não é um registro de fato
+                continue
+            elif codigos is not None and line[12:24].rstrip() not in codigos:
+                continue
+            datas(data(line[2:10]))
+            vencimentos(data(line[202:210]))
+            valor = line[217:230]
+            pontos_strike(int(valor) if valor != "0000000000000" else None)
+            for append, posicao in inteiros:
+                valor = line[posicao].strip()
+                append(int(valor) if valor else None)
+            for append, posicao in textos:
+                append(line[posicao].strip())
+            for append, posicao in centavos:
+                valor = line[posicao].strip()
+                append(int(valor) if valor else None)
+
+    def to_records(self, classe=NegociacaoBolsa):
+        """Gera um `NegociacaoBolsa` (ou `classe`) por linha, com preços em `Decimal` como `NegociacaoBolsa.from_line`"""
+        colunas = [self.colunas[campo] for campo in self.campos]
+        indices_centavos = [self.campos.index(campo) for campo in self.campos_centavos]
+        for valores in zip(*colunas):
+            valores = list(valores)
+            for indice in indices_centavos:
+                valores[indice] = centavos_para_decimal(valores[indice])
+            yield classe(*valores)
+
+
+def periodos_negociacao_bolsa(inicio: datetime.date, fim: datetime.date, hoje: datetime.date = None):
+    """Arquivos de cotação (`(frequencia, data)`) que cobrem o intervalo, preferindo os maiores (menos downloads)
+
+    Anos já encerrados usam o arquivo anual, meses encerrados do ano atual usam o mensal e os dias do mês atual (até
+    ontem, já que o arquivo do dia só é publicado à noite) usam o diário, ignorando fins de semana.
+
+    >>> for periodo in periodos_negociacao_bolsa(
+    ...     datetime.date(2023, 6, 1), datetime.date(2024, 3, 31), hoje=datetime.date(2024, 3, 6)
+    ... ):
+    ...     print(*periodo)
+    ano 2023-01-01
+    mês 2024-01-01
+    mês 2024-02-01
+    dia 2024-03-01
+    dia 2024-03-04
+    dia 2024-03-05
+    """
+    hoje = hoje or datetime.date.today()
+    fim = min(fim, hoje - datetime.timedelta(days=1))
+    for ano in range(inicio.year, fim.year + 1):
+        if ano < hoje.year:
+            yield "ano", datetime.date(ano, 1, 1)
+            continue
+        mes_inicial = inicio.month if ano == inicio.year else 1
+        for mes in range(mes_inicial, fim.month + 1):
+            if mes < hoje.month:
+                yield "mês", datetime.date(ano, mes, 1)
+                continue
+            dia_inicial = inicio if (ano, mes) == (inicio.year, inicio.month) else datetime.date(ano, mes, 1)
+            for data in day_range(dia_inicial, fim + datetime.timedelta(days=1)):
+                if data.weekday() < 5:
+                    yield "dia", data
+
+
+class BaseNegociacaoBolsa(BaseSQLite):
+    """Base local (SQLite) com as cotações de `NegociacaoBolsa`, indexada por `(codigo_negociacao, data)`
+
+    Use `B3.atualiza_negociacao_bolsa` para carregá-la (apenas os arquivos ainda não carregados são baixados) e
+    `historico` para consultá-la, sem acessar a rede:
+
+        with BaseNegociacaoBolsa("cotacoes.sqlite") as base:
+            list(b3.atualiza_negociacao_bolsa(base, datetime.date(2015, 1, 1)))
+            for negociacao in base.historico("PETR4", inicio=datetime.date(2020, 1, 1)):
+                print(negociacao.data, negociacao.preco_ultimo)
+    """
+
+    def __init__(self, filename: Path | str):
+        super().__init__(filename, NegociacaoBolsa, tabela="negociacao_bolsa", indice=("codigo_negociacao", "data"))
+
+    @staticmethod
+    def particao(frequencia: str, data: datetime.date):
+        """Nome da partição e intervalo de datas que um arquivo de cotação cobre"""
+        if frequencia == "ano":
+            return f"ano:{data.year}", datetime.date(data.year, 1, 1), datetime.date(data.year, 12, 31)
+        elif frequencia == "mês":
+            fim = last_day_of_month(data.year, data.month)
+            return f"mês:{data.year}-{data.month:02d}", datetime.date(data.year, data.month, 1), fim
+        elif frequencia == "dia":
+            return f"dia:{data.isoformat()}", data, data
+        raise ValueError(f"Frequência inválida: {repr(frequencia)}")
+
+    def carrega(self, frequencia: str, data: datetime.date, negociacoes) -> int:
+        """Substitui as negociações do período coberto pelo arquivo `(frequencia, data)` por `negociacoes`"""
+        nome, inicio, fim = self.particao(frequencia, data)
+        return self.carrega_particao(nome, negociacoes, "data BETWEEN ? AND ?", (inicio.isoformat(), fim.isoformat()))
+
+    def historico(self, codigos, inicio: datetime.date = None, fim: datetime.date = None):
+        """Negociações dos `codigos` (um código ou lista de códigos) entre `inicio` e `fim`, ordenadas por data"""
+        codigos = sorted(normaliza_codigos(codigos))
+        filtros = [f"codigo_negociacao IN ({', '.join('?' * len(codigos))})"]
+        parametros = list(codigos)
+        if inicio is not None:
+            filtros.append("data >= ?")
+            parametros.append(inicio.isoformat())
+        if fim is not None:
+            filtros.append("data <= ?")
+            parametros.append(fim.isoformat())
+        return self.consulta(" AND ".join(filtros), tuple(parametros), ordem="data, codigo_negociacao")
 
 
 @dataclass
@@ -260,8 +491,7 @@ class PrecoAtivo:
         assert not row, f"Dados de preço não extraídos: {row=}"
         return obj
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
 
 
 @dataclass
@@ -291,8 +521,7 @@ class Dividendo:
             tipo=tipo_mapping.get(row["label"], row["label"]),
         )
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
 
 
 @dataclass
@@ -321,8 +550,7 @@ class FundoDocumento:
             url=f"https://bvmf.bmfbovespa.com.br/sig/FormConsultaPdfDocumentoFundos.asp?strSigla={acronimo}&strData={row['date']}",
         )
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
 
 
 @dataclass
@@ -333,8 +561,7 @@ class FundoB3Resumido:
     nome_negociacao: str
     empresa_razao_social: str
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
 
     @classmethod
     def from_dict(cls, obj, tipo, check=True):
@@ -394,7 +621,7 @@ class FundoB3:
         return self.codigos_negociacao[0] if self.codigos_negociacao else f"{self.acronimo}11"
 
     def to_dict(self):
-        return {"codigo_negociacao": self.codigo_negociacao, **asdict(self)}
+        return {"codigo_negociacao": self.codigo_negociacao, **serializa_dataclass(self)}
 
     def serialize(self):
         obj = self.to_dict()
@@ -561,8 +788,10 @@ class NegociacaoBalcao:
         assert not row
         return obj
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
+
+
+NegociacaoBalcaoCompacta = versao_compacta(NegociacaoBalcao)
 
 
 @dataclass
@@ -604,8 +833,119 @@ class NegociacaoIntradiaria:
         assert not row, f"Dados sobraram e não foram extraídos para {cls.__name__}: {row}"
         return obj
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
+
+
+NegociacaoIntradiariaCompacta = versao_compacta(NegociacaoIntradiaria)
+
+# Preços das negociações intradiárias em "ticks" (`preco_em_ticks=True`) são inteiros em milésimos de Real
+ESCALA_PRECO_INTRADIARIO = 1000
+
+
+def preco_para_ticks(valor: str) -> int:
+    """Converte um preço em formato brasileiro para inteiro em milésimos de Real
+
+    Preços com mais de 3 casas decimais (diferentes de zero) não podem ser representados e levantam `ValueError`.
+
+    >>> preco_para_ticks("36,45")
+    36450
+    >>> preco_para_ticks("1.234,5670")
+    1234567
+    >>> preco_para_ticks("7")
+    7000
+    >>> preco_para_ticks("1.234,5678")
+    Traceback (most recent call last):
+    ...
+    ValueError: Preço com mais de 3 casas decimais: '1.234,5678'
+    """
+    inteiro, _, fracao = valor.replace(".", "").partition(",")
+    if fracao[3:].strip("0"):
+        raise ValueError(f"Preço com mais de 3 casas decimais: {repr(valor)}")
+    return int(inteiro) * ESCALA_PRECO_INTRADIARIO + int(fracao[:3].ljust(3, "0"))
+
+
+def normaliza_codigos(codigos) -> Optional[set]:
+    """Normaliza o filtro de códigos de negociação (um código, vários ou `None`) para um conjunto
+
+    >>> normaliza_codigos(None) is None
+    True
+    >>> normaliza_codigos("PETR4")
+    {'PETR4'}
+    >>> sorted(normaliza_codigos(["petr4 ", "VALE3"]))
+    ['PETR4', 'VALE3']
+    """
+    if codigos is None:
+        return None
+    elif isinstance(codigos, str):
+        codigos = [codigos]
+    return {codigo.strip().upper() for codigo in codigos}
+
+
+def le_negociacoes_intradiarias(
+    linhas, classe=NegociacaoIntradiaria, preco_em_ticks: bool = False, codigos: Optional[set] = None
+):
+    """Converte as linhas de um arquivo `*_NEGOCIOSAVISTA.txt` (incluindo o cabeçalho) em negociações intradiárias
+
+    Equivalente a usar `csv.DictReader` e `NegociacaoIntradiaria.from_dict`, porém bem mais rápido: as colunas são
+    acessadas por posição, cada data e cada preço distintos são convertidos uma única vez e a hora é calculada
+    aritmeticamente. Caso `preco_em_ticks` seja `True`, o preço é devolvido como inteiro em milésimos de Real (ver
+    `ESCALA_PRECO_INTRADIARIO`) em vez de `Decimal`. Caso `codigos` seja informado, as linhas de outros códigos de
+    negociação são descartadas antes de qualquer conversão (apenas as primeiras colunas da linha são separadas).
+    """
+    linhas = iter(linhas)
+    cabecalho = next(linhas).rstrip("\r\n").split(";")
+    i_codigo = cabecalho.index("CodigoInstrumento")
+    i_acao = cabecalho.index("AcaoAtualizacao")
+    i_preco = cabecalho.index("PrecoNegocio")
+    i_quantidade = cabecalho.index("QuantidadeNegociada")
+    i_hora = cabecalho.index("HoraFechamento")
+    i_negocio = cabecalho.index("CodigoIdentificadorNegocio")
+    i_pregao = cabecalho.index("TipoSessaoPregao")
+    i_data = cabecalho.index("DataNegocio")
+    i_comprador = cabecalho.index("CodigoParticipanteComprador")
+    i_vendedor = cabecalho.index("CodigoParticipanteVendedor")
+    converte_preco = preco_para_ticks if preco_em_ticks else parse_br_decimal
+    datas, precos = {}, {}
+    datetime_ = datetime.datetime
+    for linha in linhas:
+        if not linha.strip():  # Como no `csv.DictReader`, linhas vazias são ignoradas
+            continue
+        elif codigos is not None and linha.split(";", i_codigo + 1)[i_codigo] not in codigos:
+            continue
+        campos = linha.rstrip("\r\n").split(";")
+        valor = campos[i_data]
+        try:
+            ano, mes, dia = datas[valor]
+        except KeyError:
+            data = parse_date("iso-date", valor)
+            ano, mes, dia = datas[valor] = (data.year, data.month, data.day)
+        hora = int(campos[i_hora])  # HHMMSSNNN
+        valor = campos[i_preco]
+        try:
+            preco = precos[valor]
+        except KeyError:
+            preco = precos[valor] = converte_preco(valor)
+        # Argumentos posicionais (na ordem dos campos de `NegociacaoIntradiaria`) são mais rápidos que nomeados
+        yield classe(
+            datetime_(
+                ano,
+                mes,
+                dia,
+                hora // 10_000_000,
+                hora // 100_000 % 100,
+                hora // 1000 % 100,
+                hora % 1000 * 1000,
+                BRT,
+            ),  # datahora
+            int(campos[i_negocio]),  # codigo_negocio
+            campos[i_codigo],  # codigo_negociacao
+            int(campos[i_acao]),  # acao_atualizacao
+            preco,
+            int(campos[i_quantidade]),  # quantidade
+            int(campos[i_pregao]),  # pregao_tipo
+            campos[i_comprador],  # comprador_codigo
+            campos[i_vendedor],  # vendedor_codigo
+        )
 
 
 @dataclass
@@ -648,8 +988,7 @@ class EmprestimoAtivo:
         assert not row, f"Dados sobraram e não foram extraídos para {cls.__name__}: {row}"
         return obj
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
 
 
 @dataclass
@@ -694,8 +1033,7 @@ class EmprestimoNegociado:
         assert not row, f"Dados sobraram e não foram extraídos para {cls.__name__}: {row}"
         return obj
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
 
 
 @dataclass
@@ -730,8 +1068,7 @@ class EmprestimoEmAberto:
         assert not row, f"Dados sobraram e não foram extraídos para {cls.__name__}: {row}"
         return obj
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
 
 
 @dataclass
@@ -764,8 +1101,7 @@ class OpcaoFlexivel:
         assert not row, f"Dados sobraram e não foram extraídos para {cls.__name__}: {row}"
         return obj
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
 
 
 @dataclass
@@ -790,8 +1126,7 @@ class PrazoDeposito:
         assert not row, f"Dados sobraram e não foram extraídos para {cls.__name__}: {row}"
         return obj
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
 
 
 @dataclass
@@ -818,8 +1153,7 @@ class PosicaoEmAberto:
         assert not row, f"Dados sobraram e não foram extraídos para {cls.__name__}: {row}"
         return obj
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
 
 
 @dataclass
@@ -846,8 +1180,7 @@ class Swap:
         assert not row, f"Dados sobraram e não foram extraídos para {cls.__name__}: {row}"
         return obj
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
 
 
 @dataclass
@@ -866,8 +1199,7 @@ class AcaoCustodiada:
         assert not row, f"Dados sobraram e não foram extraídos para {cls.__name__}: {row}"
         return obj
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
 
 
 @dataclass
@@ -895,8 +1227,7 @@ class CreditoProvento:
         assert not row, f"Dados sobraram e não foram extraídos para {cls.__name__}: {row}"
         return obj
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
 
 
 @dataclass
@@ -924,8 +1255,7 @@ class CustodiaFungivel:
         assert not row, f"Dados sobraram e não foram extraídos para {cls.__name__}: {row}"
         return obj
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
 
 
 class B3:
@@ -940,8 +1270,41 @@ class B3:
     # TODO: (talvez, se possível) criar método para listar todos os índices programaticamente a partir de scraping
     carteira_indice_periodos = ("dia", "teórica", "próxima")
 
-    def __init__(self):
+    def __init__(
+        self,
+        cache_dir: Path | str = None,
+        cache_tamanho_maximo: int = None,
+        max_workers: int = 1,
+        requisicoes_por_segundo: float = None,
+        prefetch: bool = False,
+        compacto: bool = False,
+        concorrencia_adaptativa: bool = False,
+    ):
+        """
+        :param cache_dir: (opcional) pasta onde os arquivos ZIP de negociação serão guardados, evitando que sejam
+        baixados novamente (são revalidados com o servidor antes de serem reutilizados)
+        :param cache_tamanho_maximo: (opcional) tamanho máximo do cache, em bytes. Os arquivos usados há mais tempo
+        são removidos quando o limite é ultrapassado.
+        :param max_workers: quantidade de requisições feitas em paralelo quando vários objetos independentes precisam
+        ser baixados (como o detalhe de cada fundo listado)
+        :param requisicoes_por_segundo: (opcional) limite de requisições por segundo para cada host
+        :param prefetch: caso `True`, as listagens paginadas (`paginate` e tabelas de Clearing) baixam as páginas
+        restantes em paralelo (até `max_workers`) assim que a primeira página informa o total de páginas
+        :param compacto: caso `True`, as negociações em bolsa, balcão e intradiárias são devolvidas nas versões com
+        `__slots__` das classes (`NegociacaoBolsaCompacta` etc.), que ocupam bem menos memória
+        :param concorrencia_adaptativa: caso `True`, as requisições simultâneas a cada host são limitadas por
+        `LIMITADOR_CONCORRENCIA`, que aumenta o limite enquanto o host responde bem e reduz após erros 5xx/429 ou
+        timeouts (ver `LimitadorConcorrencia`)
+        """
         self.session = create_session()
+        if requisicoes_por_segundo is not None:
+            self.session.limitador_taxa = LimitadorTaxa(requisicoes_por_segundo)
+        if concorrencia_adaptativa:
+            self.session.limitador_concorrencia = LIMITADOR_CONCORRENCIA
+        self.cache = CacheHTTP(cache_dir, tamanho_maximo=cache_tamanho_maximo) if cache_dir is not None else None
+        self.max_workers = max_workers
+        self.prefetch = prefetch
+        self.compacto = compacto
         # Requisição para guardar cookies:
         self.request(
             "https://www.b3.com.br/pt_br/produtos-e-servicos/negociacao/renda-variavel/fundos-de-investimento-imobiliario-fii.htm",
@@ -967,39 +1330,77 @@ class B3:
             date = data.strftime("%Y")
             return f"https://bvmf.bmfbovespa.com.br/InstDados/SerHist/COTAHIST_A{date}.ZIP"
 
-    def negociacao_bolsa(self, frequencia: str, data: datetime.date):
+    def negociacao_bolsa(self, frequencia: str, data: datetime.date, codigos=None):
         """
         Baixa cotação para uma determinada data (dia, mês ou ano)
 
         :param frequencia: deve ser "dia", "mês" ou "ano"
         :param data: data das cotações a serem baixadas (use o dia "01" caso frequência seja "mês" e o dia e mês "01"
         caso frequência seja "ano")
+        :param codigos: código de negociação (ou lista de códigos) a filtrar; as linhas dos demais códigos são
+        descartadas antes de serem convertidas
 
         Horários de atualização, de acordo com meus testes:
         - Diária: 23:31:45 GMT
         - Mensal: 00:20:56 GMT
         - Anual: 23:32:31 GMT
         """
+        classe = NegociacaoBolsaCompacta if self.compacto else NegociacaoBolsa
+        codigos = normaliza_codigos(codigos)
+        for line in self._linhas_negociacao_bolsa(frequencia, data):
+            if line[:2] != "01":  # Não é um registro de fato
+                continue
+            elif codigos is not None and line[12:24].rstrip() not in codigos:
+                continue
+            yield classe.from_line(line)
+
+    def negociacao_bolsa_tabela(self, frequencia: str, data: datetime.date, codigos=None) -> TabelaNegociacaoBolsa:
+        """Baixa cotação para uma determinada data (como `negociacao_bolsa`), mas devolve-a em formato colunar
+
+        Bem mais rápido para arquivos grandes (como o anual); use `TabelaNegociacaoBolsa.to_records` caso precise dos
+        objetos `NegociacaoBolsa`.
+        """
+        return TabelaNegociacaoBolsa.from_lines(
+            self._linhas_negociacao_bolsa(frequencia, data), codigos=normaliza_codigos(codigos)
+        )
+
+    def atualiza_negociacao_bolsa(
+        self,
+        base: BaseNegociacaoBolsa,
+        inicio: datetime.date,
+        fim: datetime.date = None,
+        recarregar: bool = False,
+    ):
+        """Carrega em `base` as cotações entre `inicio` e `fim` (padrão: ontem), baixando só o que ainda não foi carregado
+
+        Os arquivos são escolhidos por `periodos_negociacao_bolsa` (anual para anos encerrados, mensal para meses
+        encerrados e diário para o mês atual); um arquivo maior substitui as negociações dos menores já carregados no
+        mesmo período. Devolve, conforme carrega, `(particao, quantidade)` de cada arquivo baixado.
+        """
+        hoje = datetime.date.today()
+        for frequencia, data in periodos_negociacao_bolsa(inicio, fim or hoje, hoje=hoje):
+            particao, _, _ = base.particao(frequencia, data)
+            if not recarregar and base.particao_carregada(particao):
+                continue
+            yield particao, base.carrega(frequencia, data, self.negociacao_bolsa(frequencia, data))
+
+    def _linhas_negociacao_bolsa(self, frequencia: str, data: datetime.date):
         assert frequencia in ("dia", "mês", "ano")
 
         url = self.url_negociacao_bolsa(frequencia, data)
-        # TODO: salvar arquivo em cache
-        response = self.session.get(url, verify=False)
-        if len(response.content) == 0:  # Arquivo vazio (provavelmente dia sem pregão)
-            return ValueError(
-                f"Data {data} possui arquivo de cotação vazio (provavelmente não teve pregão ou data no futuro)"
-            )
-        zf = ZipFile(io.BytesIO(response.content))
-        if len(zf.filelist) != 1:
-            filenames = ", ".join(sorted(info.filename for info in zf.filelist))
-            raise RuntimeError(
-                f"Esperado apenas um arquivo dentro do ZIP de negociação em bolsa, encontrados: {filenames}"
-            )
-        fobj = io.TextIOWrapper(zf.open(zf.filelist[0].filename), encoding="iso-8859-1")
-        for line in fobj:
-            if line[:2] != "01":  # Não é um registro de fato
-                continue
-            yield NegociacaoBolsa.from_line(line)
+        with baixa_arquivo(self.session, url, cache=self.cache, verify=False) as zip_fobj:
+            if len(zip_fobj.read(1)) == 0:  # Arquivo vazio (provavelmente dia sem pregão)
+                return ValueError(
+                    f"Data {data} possui arquivo de cotação vazio (provavelmente não teve pregão ou data no futuro)"
+                )
+            zip_fobj.seek(0)
+            zf = ZipFile(zip_fobj)
+            if len(zf.filelist) != 1:
+                filenames = ", ".join(sorted(info.filename for info in zf.filelist))
+                raise RuntimeError(
+                    f"Esperado apenas um arquivo dentro do ZIP de negociação em bolsa, encontrados: {filenames}"
+                )
+            yield from io.TextIOWrapper(ETAPAS.arquivo(zf.open(zf.filelist[0].filename)), encoding="iso-8859-1")
 
     def url_intradiaria_zip(self, data: datetime.date):
         # <https://www.b3.com.br/pt_br/market-data-e-indices/servicos-de-dados/market-data/cotacoes/cotacoes/>
@@ -1007,7 +1408,7 @@ class B3:
         url = f"https://arquivos.b3.com.br/rapinegocios/tickercsv/{data_str}"
         return url
 
-    def _le_zip_intradiaria(self, fobj):
+    def _le_zip_intradiaria(self, fobj, preco_em_ticks: bool = False, codigo_negociacao=None):
         zf = ZipFile(fobj)
         if len(zf.filelist) != 1:
             filenames = ", ".join(sorted(info.filename for info in zf.filelist))
@@ -1016,16 +1417,24 @@ class B3:
             )
         filename = zf.filelist[0].filename
         assert "_NEGOCIOSAVISTA.txt" in filename
-        fobj = io.TextIOWrapper(zf.open(zf.filelist[0].filename), encoding="iso-8859-1")
-        for row in csv.DictReader(fobj, delimiter=";"):
-            yield NegociacaoIntradiaria.from_dict(row)
+        fobj = io.TextIOWrapper(ETAPAS.arquivo(zf.open(zf.filelist[0].filename)), encoding="iso-8859-1")
+        classe = NegociacaoIntradiariaCompacta if self.compacto else NegociacaoIntradiaria
+        yield from le_negociacoes_intradiarias(
+            fobj, classe=classe, preco_em_ticks=preco_em_ticks, codigos=normaliza_codigos(codigo_negociacao)
+        )
 
-    def negociacao_intradiaria(self, data: datetime.date):
-        url = self.url_intradiaria_zip(data)
-        # TODO: salvar arquivo em cache
-        response = self.session.get(url)
-        yield from self._le_zip_intradiaria(io.BytesIO(response.content))
+    def negociacao_intradiaria(self, data: datetime.date, preco_em_ticks: bool = False, codigo_negociacao=None):
+        """Baixa as negociações intradiárias em bolsa (uma por negócio) de uma data
 
+        :param preco_em_ticks: caso `True`, o preço é devolvido como inteiro em milésimos de Real (em vez de `Decimal`)
+        :param codigo_negociacao: código de negociação (ou lista de códigos) a filtrar; as linhas dos demais códigos
+        são descartadas antes de serem convertidas
+        """
+        url = self.url_intradiaria_zip(data)
+        with baixa_arquivo(self.session, url, cache=self.cache) as zip_fobj:
+            yield from self._le_zip_intradiaria(
+                zip_fobj, preco_em_ticks=preco_em_ticks, codigo_negociacao=codigo_negociacao
+            )
 
     def request(
         self,
@@ -1043,31 +1452,37 @@ class B3:
         if url_params is not None:
             url_params = self._make_url_params(url_params)
             url = urljoin(url, url_params)
-        tried = 0
-        while tried < max_tries:
-            # São feitas múltiplas tentativas porque recorrentemente os servidores da CloudFlare respondem com erro
-            # HTTP 520.
-            response = self.session.request(
-                method, url, params=params, timeout=timeout, verify=verify_ssl, json=json_data
-            )
-            tried += 1
-            if response.status_code < 500:
-                break
-            else:
-                time.sleep(wait_between_errors)
+        # São feitas até `max_tries` tentativas (ver `PoliticaRetentativas`) porque recorrentemente os servidores da
+        # CloudFlare respondem com erro HTTP 520.
+        response = self.session.request(
+            method,
+            url,
+            params=params,
+            timeout=timeout,
+            verify=verify_ssl,
+            json=json_data,
+            tentativas=max_tries,
+            espera_minima=wait_between_errors,
+        )
         if decode_json:
-            text = response.text
-            if text and text[0] == text[-1] == '"':  # WTF, B3?
-                text = json_decode(text)
-            return json_decode(text) if text else {}
+            return decodifica_resposta(response.text)
         return response
 
-    def paginate(self, base_url, url_params=None, params=None, method="GET"):
+    def _paginas_em_paralelo(self, busca_pagina, primeira, ultima):
+        """Baixa as páginas de `primeira` a `ultima` (inclusive) em paralelo, devolvendo-as em ordem"""
+        return mapeia_em_paralelo(busca_pagina, range(primeira, ultima + 1), max_workers=self.max_workers)
+
+    def paginate(self, base_url, url_params=None, params=None, method="GET", prefetch: bool = None):
+        prefetch = self.prefetch if prefetch is None else prefetch
         url_params = url_params or {}
         if "pageNumber" not in url_params:
             url_params["pageNumber"] = 1
         if "pageSize" not in url_params:
             url_params["pageSize"] = 100
+
+        def busca_pagina(numero):
+            return self.request(base_url, {**url_params, "pageNumber": numero}, params=params, method=method)
+
         finished = False
         while not finished:
             response = self.request(base_url, url_params, params=params, method=method)
@@ -1077,8 +1492,13 @@ class B3:
             elif isinstance(response, dict):
                 if "results" in response:
                     yield from response["results"]
-                    finished = url_params["pageNumber"] >= response["page"]["totalPages"]
+                    total_pages = response["page"]["totalPages"]
+                    finished = url_params["pageNumber"] >= total_pages
                     url_params["pageNumber"] += 1
+                    if not finished and prefetch:
+                        for pagina in self._paginas_em_paralelo(busca_pagina, url_params["pageNumber"], total_pages):
+                            yield from pagina["results"]
+                        finished = True
                 else:
                     yield response
 
@@ -1087,11 +1507,16 @@ class B3:
             base_url=urljoin(self.funds_call_url, "GetListFunds/"),
             url_params={"language": "pt-br", "typeFund": tipo},
         )
-        for obj in objs:
-            if detalhe:
-                yield self.fundo_listado_detalhe(tipo, obj["id"], obj["acronym"])
-            else:
+        if not detalhe:
+            for obj in objs:
                 yield FundoB3Resumido.from_dict(obj, tipo=tipo)
+        else:
+            # Uma requisição por fundo: são feitas em paralelo (até `self.max_workers`), mantendo a ordem da listagem
+            yield from mapeia_em_paralelo(
+                lambda obj: self.fundo_listado_detalhe(tipo, obj["id"], obj["acronym"]),
+                objs,
+                max_workers=self.max_workers,
+            )
 
     def fundo_listado_detalhe(self, tipo, id_fnet, acronimo):
         response_data = self.request(
@@ -1349,11 +1774,12 @@ class B3:
         decoded_data = base64.b64decode(response.text).decode("ISO-8859-1")
         csv_data = decoded_data[decoded_data.find("\n") + 1 :]
         reader = csv.DictReader(io.StringIO(csv_data), delimiter=";")
+        classe = NegociacaoBalcaoCompacta if self.compacto else NegociacaoBalcao
         for row in reader:
             for field in ("Cod. Isin", "Data Liquidacao"):
                 if field not in row:
                     row[field] = None
-            yield NegociacaoBalcao.from_dict(row)
+            yield classe.from_dict(row)
 
     def valor_indice(self, indice: str, ano: int):
         if indice not in self.indices:
@@ -1485,28 +1911,33 @@ class B3:
     #                 participacao=parse_br_decimal(row["Part. (%)"]),
     #             )
 
-    def _tabela_clearing(self, url_template, url_params, query_params, json_data=None, data_class=None):
+    def _tabela_clearing(
+        self, url_template, url_params, query_params, json_data=None, data_class=None, prefetch: bool = None
+    ):
         """
         Baixa dados de Clearing do Boletim do Mercado da B3
 
         <https://www.b3.com.br/pt_br/market-data-e-indices/servicos-de-dados/market-data/consultas/boletim-diario/boletim-diario-do-mercado/>
         """
+        prefetch = self.prefetch if prefetch is None else prefetch
         page, page_size = 1, 1000
         json_data = json_data if json_data is not None else {}
-        finished = False
-        while not finished:
+
+        def busca_pagina(page):
             url = url_template.format(page=page, page_size=page_size, **url_params)
             data = self.request(url, params=query_params, method="POST", json_data=json_data, decode_json=True)
-            table = data["table"]
-            header = [col["friendlyNamePt"] or col["name"] for col in table["columns"]]
-            for item in table["values"]:
-                row = dict(zip(header, item))
-                if data_class is not None:
-                    yield data_class.from_dict(row)
-                else:
-                    yield row
+            return data["table"]
+
+        finished = False
+        while not finished:
+            table = busca_pagina(page)
+            yield from converte_tabela_clearing(table, data_class)
             finished = table["pageCount"] == page or len(table["values"]) == 0
             page += 1
+            if not finished and prefetch:
+                for table in self._paginas_em_paralelo(busca_pagina, page, table["pageCount"]):
+                    yield from converte_tabela_clearing(table, data_class)
+                finished = True
 
     def clearing_acoes_custodiadas(self, data_inicial: datetime.date):
         """Clearing - Ações Custodiadas"""
@@ -1686,9 +2117,11 @@ class B3:
 if __name__ == "__main__":
     import argparse
     import datetime
-    from pathlib import Path
+    import sys
 
-    from .utils import day_range
+    from .exportacao import Exportador, exporta
+    from .instrumentacao import adiciona_argumentos_estatisticas, finaliza_estatisticas, inicia_estatisticas
+    from .utils import salva_resposta
 
     TERM_CLEAR_LINE_FROM_CURSOR = "\x1b[K"
     comandos_padrao = [
@@ -1712,6 +2145,27 @@ if __name__ == "__main__":
         "negociacao-balcao",
     ]
     parser = argparse.ArgumentParser()
+    parser.add_argument("--cache-dir", type=Path, help="Pasta para guardar em cache os arquivos ZIP baixados")
+    parser.add_argument(
+        "--workers", "-w", type=int, default=8, help="Quantidade de requisições independentes feitas em paralelo"
+    )
+    parser.add_argument(
+        "--requisicoes-por-segundo", "-r", type=float, help="Limita a quantidade de requisições por segundo por host"
+    )
+    parser.add_argument(
+        "--prefetch",
+        action="store_true",
+        help="Baixa em paralelo (usando `--workers`) as páginas restantes das listagens paginadas",
+    )
+    parser.add_argument(
+        "--concorrencia-adaptativa",
+        action="store_true",
+        help=(
+            "Ajusta a quantidade de requisições simultâneas por host de acordo com os erros e a latência (mostra os "
+            "limites e latências ao final)"
+        ),
+    )
+    adiciona_argumentos_estatisticas(parser)
     subparsers = parser.add_subparsers(dest="command", required=True)
     for comando in comandos_padrao:
         subparser = subparsers.add_parser(comando)
@@ -1750,7 +2204,46 @@ if __name__ == "__main__":
         type=parse_iso_date,
         help="Data a ser baixada em formato YYYY-MM-DD (para frequência mensal, use dia = 01, para anual use mês e dia = 01)",
     )
-    subparser_negociacao_bolsa.add_argument("csv_filename", type=Path, help="Nome do arquivo CSV a ser salvo")
+    subparser_negociacao_bolsa.add_argument(
+        "--codigo", "-c", action="append", help="Filtra pelo código de negociação (pode ser usado mais de uma vez)"
+    )
+    subparser_negociacao_bolsa.add_argument(
+        "csv_filename",
+        type=Path,
+        help="Arquivo a ser salvo: .csv, .tsv, .jsonl (+ .gz ou .zst), .parquet, .arrow ou .colunar",
+    )
+
+    subparser_base_atualizar = subparsers.add_parser(
+        "negociacao-bolsa-base",
+        help="Carrega as cotações do período em uma base SQLite local (baixa apenas os arquivos que faltam)",
+    )
+    subparser_base_atualizar.add_argument("--quiet", "-q", action="store_true", help="Não mostra mensagens de status")
+    subparser_base_atualizar.add_argument(
+        "--data-final", "-f", type=parse_iso_date, help="Data final no formato YYYY-MM-DD (padrão: ontem)"
+    )
+    subparser_base_atualizar.add_argument(
+        "data_inicial", type=parse_iso_date, help="Data inicial no formato YYYY-MM-DD"
+    )
+    subparser_base_atualizar.add_argument("base_filename", type=Path, help="Arquivo SQLite da base")
+
+    subparser_base_historico = subparsers.add_parser(
+        "negociacao-bolsa-historico", help="Exporta, a partir da base local, as cotações de um ou mais ativos"
+    )
+    subparser_base_historico.add_argument(
+        "--data-inicial", "-i", type=parse_iso_date, help="Data inicial no formato YYYY-MM-DD"
+    )
+    subparser_base_historico.add_argument(
+        "--data-final", "-f", type=parse_iso_date, help="Data final no formato YYYY-MM-DD"
+    )
+    subparser_base_historico.add_argument(
+        "--codigo", "-c", action="append", required=True, help="Código de negociação (pode ser usado mais de uma vez)"
+    )
+    subparser_base_historico.add_argument("base_filename", type=Path, help="Arquivo SQLite da base")
+    subparser_base_historico.add_argument(
+        "csv_filename",
+        type=Path,
+        help="Arquivo a ser salvo: .csv, .tsv, .jsonl (+ .gz ou .zst), .parquet, .arrow ou .colunar",
+    )
 
     subparser_baixar = subparsers.add_parser(
         "intradiaria-baixar", help="Baixa arquivo ZIP de negociações intradiárias para uma data."
@@ -1768,7 +2261,11 @@ if __name__ == "__main__":
     subparser_converter.add_argument(
         "zip_filename", type=Path, help="Nome do arquivo ZIP (já baixado) a ser convertido"
     )
-    subparser_converter.add_argument("csv_filename", type=Path, help="Nome do CSV a ser criado")
+    subparser_converter.add_argument(
+        "csv_filename",
+        type=Path,
+        help="Arquivo a ser salvo: .csv, .tsv, .jsonl (+ .gz ou .zst), .parquet, .arrow ou .colunar",
+    )
 
     subparser_clearing_acoes_custodiadas = subparsers.add_parser(
         "clearing-acoes-custodiadas", help="Coleta dados de Clearing - Ações Custodiadas"
@@ -1871,7 +2368,14 @@ if __name__ == "__main__":
     subparser_clearing_termo_eletronico.add_argument("csv_filename", type=Path, help="Nome do CSV a ser criado")
 
     args = parser.parse_args()
-    b3 = B3()
+    inicia_estatisticas(args)
+    b3 = B3(
+        cache_dir=args.cache_dir,
+        max_workers=args.workers,
+        requisicoes_por_segundo=args.requisicoes_por_segundo,
+        prefetch=args.prefetch,
+        concorrencia_adaptativa=args.concorrencia_adaptativa,
+    )
     command = args.command
     csv_filename = getattr(args, "csv_filename", None)
     if csv_filename:
@@ -1879,25 +2383,20 @@ if __name__ == "__main__":
 
     if command == "bdr":
         quiet = args.quiet
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
+        with Exportador(csv_filename) as exportador:
             if not quiet:
                 print("\rBDR: ..." + TERM_CLEAR_LINE_FROM_CURSOR, end="", flush=True)
             for counter, row in enumerate(b3.bdrs(), start=1):
                 if not quiet:
                     print(f"\rBDR: {counter:3}" + TERM_CLEAR_LINE_FROM_CURSOR, end="", flush=True)
-                if writer is None:
-                    writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                    writer.writeheader()
-                writer.writerow(row)
+                exportador.escreve(row)
             if not quiet:
                 print(f"\rBDR: {counter:4}" + TERM_CLEAR_LINE_FROM_CURSOR, flush=True)
 
     elif command == "cri-documents":
         current_year = datetime.datetime.now().year
         securitizadoras = b3.securitizadoras()
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
+        with Exportador(csv_filename) as exportador:
             for securitizadora in securitizadoras:
                 for cri in b3.cris(securitizadora["cnpj"]):
                     start_date = parse_date("iso-datetime-tz", cri["issueDate"])
@@ -1909,16 +2408,12 @@ if __name__ == "__main__":
                         )
                         for doc in documents:
                             row = {**base_row, **doc}
-                            if writer is None:
-                                writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                                writer.writeheader()
-                            writer.writerow(row)
+                            exportador.escreve(row)
 
     elif command == "cra-documents":
         current_year = datetime.datetime.now().year
         securitizadoras = b3.securitizadoras()
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
+        with Exportador(csv_filename) as exportador:
             for securitizadora in securitizadoras:
                 for cra in b3.cras(securitizadora["cnpj"]):
                     start_date = parse_date("iso-datetime-tz", cra["issueDate"])
@@ -1930,10 +2425,7 @@ if __name__ == "__main__":
                         )
                         for doc in documents:
                             row = {**base_row, **doc}
-                            if writer is None:
-                                writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                                writer.writeheader()
-                            writer.writerow(row)
+                            exportador.escreve(row)
 
     elif command == "fundo-listado":
         quiet = args.quiet
@@ -1946,213 +2438,152 @@ if __name__ == "__main__":
             (b3.fidcs(detalhe=detalhe), "FIDC"),
             (b3.etfs(detalhe=detalhe), "ETF"),
         )
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
+        with Exportador(csv_filename) as exportador:
             for iterator, tipo in data_sources:
                 if not quiet:
                     print(f"\r{tipo:10}: ..." + TERM_CLEAR_LINE_FROM_CURSOR, end="", flush=True)
                 for counter, obj in enumerate(iterator, start=1):
                     if not quiet:
                         print(f"\r{tipo:10}: {counter:4}" + TERM_CLEAR_LINE_FROM_CURSOR, end="", flush=True)
-                    row = obj.serialize()
-                    if writer is None:
-                        writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                        writer.writeheader()
-                    writer.writerow(row)
+                    exportador.escreve(obj)
                 if not quiet:
                     print(f"\r{tipo:10}: {counter:4}" + TERM_CLEAR_LINE_FROM_CURSOR, flush=True)
 
     elif command == "fii-dividends":
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
+        with Exportador(csv_filename) as exportador:
             for obj in b3.fiis(detalhe=False):
                 base_fund_data = obj.serialize()
                 for dividend in b3.fii_dividends(identificador=obj.acronimo):
                     row = {**base_fund_data, **dividend.serialize()}
-                    if writer is None:
-                        writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                        writer.writeheader()
-                    writer.writerow(row)
+                    exportador.escreve(row)
                     # TODO: include stock_dividends?
 
     elif command == "fii-subscriptions":
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
+        with Exportador(csv_filename) as exportador:
             for obj in b3.fiis(detalhe=True):
                 base_fund_data = obj.serialize()
                 data = b3.fii_subscriptions(cnpj=obj.cnpj, identificador=obj.acronimo)
                 for subscription in data:
                     row = {**base_fund_data, **subscription}
-                    if writer is None:
-                        writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                        writer.writeheader()
-                    writer.writerow(row)
+                    exportador.escreve(row)
 
     elif command == "fii-documents":
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
+        with Exportador(csv_filename) as exportador:
             for obj in b3.fiis(detalhe=True):
                 base_fund_data = obj.serialize()
                 data = b3.fii_documents(identificador=obj.acronimo, cnpj=obj.cnpj)
                 for doc in data:
                     row = {**base_fund_data, **doc}
-                    if writer is None:
-                        writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                        writer.writeheader()
-                    writer.writerow(row)
+                    exportador.escreve(row)
 
     elif command == "fiinfra-dividends":
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
+        with Exportador(csv_filename) as exportador:
             for obj in b3.fiinfras(detalhe=False):
                 base_fund_data = obj.serialize()
                 for dividend in b3.fiinfra_dividends(identificador=obj.acronimo):
                     row = {**base_fund_data, **dividend.serialize()}
-                    if writer is None:
-                        writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                        writer.writeheader()
-                    writer.writerow(row)
+                    exportador.escreve(row)
                     # TODO: include stock_dividends?
 
     elif command == "fiinfra-subscriptions":
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
+        with Exportador(csv_filename) as exportador:
             for obj in b3.fiinfras(detalhe=True):
                 base_fund_data = obj.serialize()
                 data = b3.fiinfra_subscriptions(cnpj=obj.cnpj, identificador=obj.acronimo)
                 for subscription in data:
                     row = {**base_fund_data, **subscription}
-                    if writer is None:
-                        writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                        writer.writeheader()
-                    writer.writerow(row)
+                    exportador.escreve(row)
 
     elif command == "fiinfra-documents":
         # TODO: o arquivo está ficando em branco, verificar
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
+        with Exportador(csv_filename) as exportador:
             for obj in b3.fiinfras(detalhe=True):
                 base_fund_data = obj.serialize()
                 data = b3.fiinfra_documents(identificador=obj.acronimo, cnpj=obj.cnpj)
                 for doc in data:
                     row = {**base_fund_data, **doc}
-                    if writer is None:
-                        writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                        writer.writeheader()
-                    writer.writerow(row)
+                    exportador.escreve(row)
 
     elif command == "fiagro-dividends":
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
+        with Exportador(csv_filename) as exportador:
             for obj in b3.fiagros(detalhe=False):
                 base_fund_data = obj.serialize()
                 for dividend in b3.fiagro_dividends(identificador=obj.acronimo):
                     row = {**base_fund_data, **dividend.serialize()}
-                    if writer is None:
-                        writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                        writer.writeheader()
-                    writer.writerow(row)
+                    exportador.escreve(row)
                     # TODO: include stock_dividends?
 
     elif command == "fiagro-subscriptions":
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
+        with Exportador(csv_filename) as exportador:
             for obj in b3.fiagros(detalhe=True):
                 base_fund_data = obj.serialize()
                 data = b3.fiagro_subscriptions(cnpj=obj.cnpj, identificador=obj.acronimo)
                 for subscription in data:
                     row = {**base_fund_data, **subscription}
-                    if writer is None:
-                        writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                        writer.writeheader()
-                    writer.writerow(row)
+                    exportador.escreve(row)
 
     elif command == "fiagro-documents":
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
+        with Exportador(csv_filename) as exportador:
             for obj in b3.fiagros(detalhe=True):
                 base_fund_data = obj.serialize()
                 data = b3.fiagro_documents(identificador=obj.acronimo, cnpj=obj.cnpj)
                 for doc in data:
                     row = {**base_fund_data, **doc}
-                    if writer is None:
-                        writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                        writer.writeheader()
-                    writer.writerow(row)
+                    exportador.escreve(row)
 
     elif command == "fip-dividends":
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
+        with Exportador(csv_filename) as exportador:
             for obj in b3.fips(detalhe=False):
                 base_fund_data = obj.serialize()
                 for dividend in b3.fip_dividends(identificador=obj.acronimo):
                     row = {**base_fund_data, **dividend.serialize()}
-                    if writer is None:
-                        writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                        writer.writeheader()
-                    writer.writerow(row)
+                    exportador.escreve(row)
                     # TODO: include stock_dividends?
 
     elif command == "fip-documents":
         # TODO: o arquivo está ficando em branco, verificar
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
+        with Exportador(csv_filename) as exportador:
             for obj in b3.fips(detalhe=True):
                 base_fund_data = obj.serialize()
                 for doc in b3.fip_documents(identificador=obj.acronimo, cnpj=obj.cnpj):
                     row = {**base_fund_data, **doc}
-                    if writer is None:
-                        writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                        writer.writeheader()
-                    writer.writerow(row)
+                    exportador.escreve(row)
 
     elif command == "fip-subscriptions":
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
+        with Exportador(csv_filename) as exportador:
             for obj in b3.fips(detalhe=True):
                 base_fund_data = obj.serialize()
                 for subscription in b3.fip_subscriptions(cnpj=obj.cnpj, identificador=obj.acronimo):
                     row = {**base_fund_data, **subscription}
-                    if writer is None:
-                        writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                        writer.writeheader()
-                    writer.writerow(row)
+                    exportador.escreve(row)
 
     elif command == "debentures":
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
-            for row in b3.debentures():
-                if writer is None:
-                    writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                    writer.writeheader()
-                writer.writerow(row)
+        exporta(b3.debentures(), csv_filename)
 
     elif command == "negociacao-balcao":
         today = datetime.datetime.now().date()
         start_date = datetime.date(today.year, 1, 1)
         end_date = today + datetime.timedelta(days=1)
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
+        with Exportador(csv_filename) as exportador:
             for date in day_range(start_date, end_date + datetime.timedelta(days=1)):
-                for row in b3.negociacao_balcao(date):
-                    row = asdict(row)
-                    if writer is None:
-                        writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                        writer.writeheader()
-                    writer.writerow(row)
+                exportador.escreve_varios(b3.negociacao_balcao(date))
 
     elif command == "negociacao-bolsa":
         frequencia = args.frequencia
         data = args.data
 
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
-            for negociacao in b3.negociacao_bolsa(frequencia, data):
-                row = asdict(negociacao)
-                if writer is None:
-                    writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                    writer.writeheader()
-                writer.writerow(row)
+        exporta(b3.negociacao_bolsa(frequencia, data, codigos=args.codigo), csv_filename, classe=NegociacaoBolsa)
+
+    elif command == "negociacao-bolsa-base":
+        with BaseNegociacaoBolsa(args.base_filename) as base:
+            for particao, quantidade in b3.atualiza_negociacao_bolsa(base, args.data_inicial, args.data_final):
+                if not args.quiet:
+                    print(f"{particao}: {quantidade} negociações carregadas", flush=True)
+
+    elif command == "negociacao-bolsa-historico":
+        with BaseNegociacaoBolsa(args.base_filename) as base:
+            negociacoes = base.historico(args.codigo, inicio=args.data_inicial, fim=args.data_final)
+            exporta(negociacoes, csv_filename, classe=NegociacaoBolsa)
 
     elif args.command == "intradiaria-baixar":
         data = args.data
@@ -2164,178 +2595,88 @@ if __name__ == "__main__":
         response = b3.session.get(url, stream=True)
         response.raise_for_status()
         with zip_filename.open("wb") as fobj:
-            for chunk in response.iter_content(chunk_size):
-                fobj.write(chunk)
+            salva_resposta(response, fobj, chunk_size=chunk_size)
 
     elif args.command == "intradiaria-converter":
         zip_filename = args.zip_filename
         zip_filename.parent.mkdir(parents=True, exist_ok=True)
         csv_filename = args.csv_filename
-        codigo_ativo = set(args.codigo_ativo) if args.codigo_ativo else None
-
-        with csv_filename.open(mode="w") as fobj, zip_filename.open(mode="rb") as zip_fobj:
-            writer = None
-            for item in b3._le_zip_intradiaria(zip_fobj):
-                row = item.serialize()
-                if writer is None:
-                    writer = csv.DictWriter(fobj, fieldnames=list(row.keys()))
-                    writer.writeheader()
-                if codigo_ativo is None or item.codigo_negociacao in codigo_ativo:
-                    writer.writerow(row)
+
+        with zip_filename.open(mode="rb") as zip_fobj:
+            negociacoes = b3._le_zip_intradiaria(zip_fobj, codigo_negociacao=args.codigo_ativo)
+            exporta(negociacoes, csv_filename, classe=NegociacaoIntradiaria)
 
     elif command == "clearing-acoes-custodiadas":
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
-            for item in b3.clearing_acoes_custodiadas(data_inicial=args.data_inicial):
-                row = item.serialize()
-                if writer is None:
-                    writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                    writer.writeheader()
-                writer.writerow(row)
+        exporta(b3.clearing_acoes_custodiadas(data_inicial=args.data_inicial), csv_filename)
 
     elif command == "clearing-creditos-de-proventos":
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
-            for item in b3.clearing_creditos_de_proventos(data_inicial=args.data_inicial, filtro_emissor=args.emissor):
-                row = item.serialize()
-                if writer is None:
-                    writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                    writer.writeheader()
-                writer.writerow(row)
+        exporta(
+            b3.clearing_creditos_de_proventos(data_inicial=args.data_inicial, filtro_emissor=args.emissor), csv_filename
+        )
 
     elif command == "clearing-custodia-fungivel":
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
-            for item in b3.clearing_custodia_fungivel(data=args.data):
-                row = item.serialize()
-                if writer is None:
-                    writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                    writer.writeheader()
-                writer.writerow(row)
+        exporta(b3.clearing_custodia_fungivel(data=args.data), csv_filename)
 
     elif command == "clearing-emprestimos-registrados":
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
-            for item in b3.clearing_emprestimos_registrados(
+        exporta(
+            b3.clearing_emprestimos_registrados(
                 data_inicial=args.data_inicial, data_final=args.data_final, codigo_negociacao=args.codigo_negociacao
-            ):
-                row = item.serialize()
-                if writer is None:
-                    writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                    writer.writeheader()
-                writer.writerow(row)
+            ),
+            csv_filename,
+        )
 
     elif command == "clearing-emprestimos-negociados":
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
-            for item in b3.clearing_emprestimos_negociados(
+        exporta(
+            b3.clearing_emprestimos_negociados(
                 data=args.data,
                 filtro_tomador=args.tomador,
                 filtro_doador=args.doador,
                 filtro_mercado=args.mercado,
                 codigo_negociacao=args.codigo_negociacao,
-            ):
-                row = item.serialize()
-                if writer is None:
-                    writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                    writer.writeheader()
-                writer.writerow(row)
+            ),
+            csv_filename,
+        )
 
     elif command == "clearing-emprestimos-em-aberto":
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
-            for item in b3.clearing_emprestimos_em_aberto(
+        exporta(
+            b3.clearing_emprestimos_em_aberto(
                 data_inicial=args.data_inicial,
                 data_final=args.data_final,
                 filtro_mercado=args.mercado,
                 codigo_negociacao=args.codigo_negociacao,
-            ):
-                row = item.serialize()
-                if writer is None:
-                    writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                    writer.writeheader()
-                writer.writerow(row)
+            ),
+            csv_filename,
+        )
 
     elif command == "clearing-opcoes-flexiveis":
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
-            for item in b3.clearing_opcoes_flexiveis(data=args.data, codigo_negociacao=args.codigo_negociacao):
-                row = item.serialize()
-                if writer is None:
-                    writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                    writer.writeheader()
-                writer.writerow(row)
+        exporta(b3.clearing_opcoes_flexiveis(data=args.data, codigo_negociacao=args.codigo_negociacao), csv_filename)
 
     elif command == "clearing-prazo-deposito-titulos":
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
-            for item in b3.clearing_prazo_deposito_titulos(data=args.data):
-                row = item.serialize()
-                if writer is None:
-                    writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                    writer.writeheader()
-                writer.writerow(row)
+        exporta(b3.clearing_prazo_deposito_titulos(data=args.data), csv_filename)
 
     elif command == "clearing-posicoes-em-aberto":
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
-            for item in b3.clearing_posicoes_em_aberto(data=args.data):
-                row = item.serialize()
-                if writer is None:
-                    writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                    writer.writeheader()
-                writer.writerow(row)
+        exporta(b3.clearing_posicoes_em_aberto(data=args.data), csv_filename)
 
     elif command == "clearing-swap":
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
-            for item in b3.clearing_swap(data=args.data):
-                row = item.serialize()
-                if writer is None:
-                    writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                    writer.writeheader()
-                writer.writerow(row)
+        exporta(b3.clearing_swap(data=args.data), csv_filename)
 
     elif command == "clearing-termo-eletronico":
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
-            for row in b3.clearing_termo_eletronico(data=args.data):
-                if writer is None:
-                    writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                    writer.writeheader()
-                writer.writerow(row)
+        exporta(b3.clearing_termo_eletronico(data=args.data), csv_filename)
 
     elif command == "valor-indice":
         indice = args.indice
         ano = args.ano
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
-            for row in b3.valor_indice(indice=indice, ano=ano):
-                row = row.serialize()
-                if writer is None:
-                    writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                    writer.writeheader()
-                writer.writerow(row)
+        exporta(b3.valor_indice(indice=indice, ano=ano), csv_filename)
 
     elif command == "carteira-indice":
         indice = args.indice
         periodo = args.periodo
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
-            for row in b3.carteira_indice(indice=indice, periodo=periodo):
-                row = row.serialize()
-                if writer is None:
-                    writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                    writer.writeheader()
-                writer.writerow(row)
+        exporta(b3.carteira_indice(indice=indice, periodo=periodo), csv_filename)
 
     elif command == "ultimas-cotacoes":
         codigo_negociacao = args.codigo_negociacao
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
-            for row in b3.ultimas_cotacoes(codigo_negociacao=codigo_negociacao):
-                row = row.serialize()
-                if writer is None:
-                    writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                    writer.writeheader()
-                writer.writerow(row)
+        exporta(b3.ultimas_cotacoes(codigo_negociacao=codigo_negociacao), csv_filename)
+
+    if args.concorrencia_adaptativa:
+        print(LIMITADOR_CONCORRENCIA.relatorio(), file=sys.stderr)
+    finaliza_estatisticas(args, comando=command)
@@ -3,10 +3,10 @@ import datetime
 import io
 import json
 from calendar import monthrange
-from dataclasses import asdict, dataclass
+from dataclasses import dataclass
 from decimal import Decimal
 
-from .utils import create_session, dicts_to_str, parse_br_date
+from .utils import create_session, dicts_to_str, parse_br_date, serializa_dataclass
 
 
 @dataclass
@@ -15,8 +15,7 @@ class TaxaIntervalo:
     data_final: datetime.date
     valor: Decimal
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
 
 
 @dataclass
@@ -24,8 +23,7 @@ class Taxa:
     data: datetime.date
     valor: Decimal
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
 
 
 class BancoCentral:
@@ -151,6 +149,12 @@ class BancoCentral:
         série (pode ser demorado).
         :param datetime.date fim: (opcional) Data de fim dos dados. Se não especificado, pegará até o final da série.
         """
+        url, params = self._url_serie_temporal(nome_ou_codigo, inicio, fim)
+        response = self.session.get(url, params=params)
+        return self._converte_serie_temporal(response.json())
+
+    def _url_serie_temporal(self, nome_ou_codigo: str | int, inicio: datetime.date = None, fim: datetime.date = None):
+        """Devolve a URL e os parâmetros da requisição de uma série temporal do SGS"""
         if isinstance(nome_ou_codigo, str):
             codigo = self.series.get(nome_ou_codigo)
             if codigo is None:
@@ -163,8 +167,10 @@ class BancoCentral:
             params["dataInicial"] = inicio.strftime("%d/%m/%Y")
         if fim is not None:
             params["dataFinal"] = fim.strftime("%d/%m/%Y")
-        response = self.session.get(url, params=params)
-        return [Taxa(data=parse_br_date(row["data"]), valor=Decimal(row["valor"])) for row in response.json()]
+        return url, params
+
+    def _converte_serie_temporal(self, dados: list[dict]) -> list[Taxa]:
+        return [Taxa(data=parse_br_date(row["data"]), valor=Decimal(row["valor"])) for row in dados]
 
     def _novoselic_csv_request(self, filtro: dict, ordenacao: list[dict]):
         response = self.session.post(
@@ -249,10 +255,14 @@ class BancoCentral:
 
 if __name__ == "__main__":
     import argparse
+    from pathlib import Path
 
+    from .exportacao import exporta
+    from .instrumentacao import adiciona_argumentos_estatisticas, finaliza_estatisticas, inicia_estatisticas
     from .utils import parse_iso_date
 
     parser = argparse.ArgumentParser()
+    adiciona_argumentos_estatisticas(parser)
     subparsers = parser.add_subparsers(dest="command", required=True)
 
     subparser_ajustar_selic = subparsers.add_parser("ajustar-selic")
@@ -272,6 +282,12 @@ if __name__ == "__main__":
         default="txt",
         help="Formato de saída",
     )
+    subparser_serie_temporal.add_argument(
+        "--arquivo",
+        "-o",
+        type=Path,
+        help="Salva a série no arquivo em vez de imprimir (formato definido pela extensão: .csv, .tsv, .jsonl etc.)",
+    )
     subparser_serie_temporal.add_argument(
         "serie",
         choices=list(BancoCentral.series.keys()),
@@ -279,6 +295,7 @@ if __name__ == "__main__":
     )
 
     args = parser.parse_args()
+    inicia_estatisticas(args)
     bc = BancoCentral()
 
     if args.command == "ajustar-selic":
@@ -298,5 +315,11 @@ if __name__ == "__main__":
         fim = args.data_final
         nome_serie = args.serie
         fmt = args.formato
-        data = [asdict(tx) for tx in bc.serie_temporal(nome_serie, inicio=inicio, fim=fim)]
-        print(dicts_to_str(data, fmt))
+        if args.arquivo:
+            args.arquivo.parent.mkdir(parents=True, exist_ok=True)
+            exporta(bc.serie_temporal(nome_serie, inicio=inicio, fim=fim), args.arquivo)
+        else:
+            data = [tx.serialize() for tx in bc.serie_temporal(nome_serie, inicio=inicio, fim=fim)]
+            print(dicts_to_str(data, fmt))
+
+    finaliza_estatisticas(args, comando=args.command)
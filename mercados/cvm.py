@@ -1,28 +1,50 @@
 import csv
 import datetime
 import io
+import multiprocessing
+import os
 import re
+import shutil
 import tempfile
 import uuid
 import zipfile
-from dataclasses import asdict, dataclass
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from decimal import Decimal
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
 from typing import Optional
 from urllib.parse import urljoin
 
 from lxml.html import document_fromstring
 
+from .armazenamento import BaseSQLite
+from .instrumentacao import ETAPAS
 from .utils import (
     BRT,
     REGEXP_CNPJ_SEPARATORS,
     REGEXP_SPACES,
+    TAMANHO_CHUNK_DOWNLOAD,
+    CacheHTTP,
+    abre_arquivo_remoto,
+    baixa_arquivo,
+    blocos_de_linhas,
+    conversor_data,
+    converte_colunas,
     create_session,
     download_files,
+    empacotador,
+    last_day_of_month,
+    mapeia_em_paralelo,
+    meses,
     parse_date,
     parse_iso_date,
     parse_iso_month,
+    serializa_dataclass,
     slug,
+    versao_compacta,
 )
 
 REGEXP_ASSUNTO = re.compile("^<spanOrder>(.*)</spanOrder>(.*)$", flags=re.DOTALL)
@@ -34,6 +56,7 @@ REGEXP_SEM_PARAMETROS = re.compile(r"^[a-zA-Z0-9_]+\(\)$", flags=re.DOTALL)
 REGEXP_PARAMETROS = re.compile(r"^([a-zA-Z0-9_]+)\((.*?)\)$", flags=re.DOTALL)
 REGEXP_PARAMETROS_INTERNA = re.compile(r"'(.*?)'|(\d+)", flags=re.DOTALL)
 REGEXP_INFO_FUNCTION = re.compile('''class='fi-info'[^>]*onmouseover="([^>]*)"''', flags=re.DOTALL)
+TAMANHO_BLOCO_INFORME_DIARIO = 4 * 1024 * 1024  # Bytes do CSV convertidos por tarefa em `informe_diario_fundo_periodo`
 
 
 @dataclass
@@ -64,8 +87,122 @@ class InformeDiarioFundo:
             valor_carteira=Decimal(row["vl_total"]) if row["vl_total"] else None,
         )
 
-    def serialize(self):
-        return asdict(self)
+    @classmethod
+    def from_rows(cls, cabecalho: list[str], linhas) -> list:
+        """Equivalente a chamar `from_dict` para cada linha do CSV, porém convertendo coluna a coluna (ver
+        `converte_colunas`): em um mês de informes, cada data e cada CNPJ se repetem milhares de vezes"""
+        cabecalho = [nome.lower() for nome in cabecalho]
+        colunas = converte_colunas(
+            cabecalho,
+            linhas,
+            {
+                "cnpj_fundo": _converte_cnpj,
+                "cnpj_fundo_classe": _converte_cnpj,
+                "dt_comptc": conversor_data("iso-date"),
+                "captc_dia": _converte_decimal,
+                "resg_dia": _converte_decimal,
+                "vl_patrim_liq": _converte_decimal,
+                "vl_quota": _converte_decimal,
+                "vl_total": _converte_decimal,
+                "nr_cotst": _converte_inteiro,
+            },
+        )
+        cnpjs = colunas["cnpj_fundo"] if "cnpj_fundo" in colunas else colunas["cnpj_fundo_classe"]
+        tipos = colunas.get("tp_fundo") or colunas.get("tp_fundo_classe") or [None] * len(cnpjs)
+        # Argumentos posicionais, na ordem dos campos
+        return [
+            cls(*valores)
+            for valores in zip(
+                cnpjs,
+                colunas["dt_comptc"],
+                colunas["captc_dia"],
+                colunas["resg_dia"],
+                colunas["vl_patrim_liq"],
+                colunas["vl_quota"],
+                colunas["vl_total"],
+                tipos,
+                colunas["nr_cotst"],
+            )
+        ]
+
+    serialize = serializa_dataclass
+
+
+InformeDiarioFundoCompacta = versao_compacta(InformeDiarioFundo)
+TAMANHO_LOTE_INFORME_DIARIO = 10_000  # Linhas do CSV convertidas de uma vez por `InformeDiarioFundo.from_rows`
+
+
+@lru_cache(maxsize=64 * 1024)
+def _converte_cnpj(valor: str) -> str:
+    return REGEXP_CNPJ_SEPARATORS.sub("", valor).strip()
+
+
+@lru_cache(maxsize=16 * 1024)
+def _converte_decimal(valor: Optional[str]) -> Optional[Decimal]:
+    return Decimal(valor) if valor else None
+
+
+def _converte_inteiro(valor: Optional[str]) -> Optional[int]:
+    return int(valor) if valor else None  # Não existe em alguns registros de 2004
+
+
+def _le_bloco_informe_diario(filename: Path, inicio: int, fim: int, cabecalho: list[str], compacto: bool):
+    """Converte as linhas entre os bytes `inicio` e `fim` de um CSV (já descompactado) de informe diário"""
+    classe = InformeDiarioFundoCompacta if compacto else InformeDiarioFundo
+    with open(filename, mode="rb") as fobj:
+        fobj.seek(inicio)
+        conteudo = fobj.read(fim - inicio).decode("iso-8859-1")
+    yield from classe.from_rows(cabecalho, csv.reader(io.StringIO(conteudo, newline=None), delimiter=";"))
+
+
+def _converte_bloco_informe_diario(filename: Path, inicio: int, fim: int, cabecalho: list[str], compacto: bool):
+    """Executa `_le_bloco_informe_diario` em outro processo, devolvendo os informes empacotados em tuplas (ver
+    `empacotador`), bem mais baratas de transferir entre processos que os objetos"""
+    empacota, _ = empacotador(InformeDiarioFundoCompacta if compacto else InformeDiarioFundo)
+    return empacota(_le_bloco_informe_diario(filename, inicio, fim, cabecalho, compacto))
+
+
+class BaseInformeDiarioFundo(BaseSQLite):
+    """Base local (SQLite) com os informes diários dos fundos, particionada por mês e indexada por `fundo_cnpj`
+
+    Cada mês é uma partição (carregada por `CVM.atualiza_informe_diario_fundo`, que baixa apenas os meses que faltam)
+    e `cota_historica` consulta o índice `(fundo_cnpj, data_competencia)`, lendo apenas os registros do fundo no
+    período, sem acessar a rede:
+
+        with BaseInformeDiarioFundo("informes.sqlite") as base:
+            list(cvm.atualiza_informe_diario_fundo(base, datetime.date(2019, 9, 1)))
+            for informe in base.cota_historica("18302338000163", inicio=datetime.date(2020, 1, 1)):
+                print(informe.data_competencia, informe.valor_cota)
+    """
+
+    def __init__(self, filename: Path | str):
+        super().__init__(
+            filename, InformeDiarioFundo, tabela="informe_diario_fundo", indice=("fundo_cnpj", "data_competencia")
+        )
+
+    @staticmethod
+    def particao(ano_mes: datetime.date):
+        """Nome da partição e intervalo de datas de um mês"""
+        inicio = ano_mes.replace(day=1)
+        return inicio.strftime("%Y-%m"), inicio, last_day_of_month(inicio.year, inicio.month)
+
+    def carrega(self, ano_mes: datetime.date, informes) -> int:
+        """Substitui os informes do mês `ano_mes` por `informes`"""
+        nome, inicio, fim = self.particao(ano_mes)
+        return self.carrega_particao(
+            nome, informes, "data_competencia BETWEEN ? AND ?", (inicio.isoformat(), fim.isoformat())
+        )
+
+    def cota_historica(self, cnpj: str, inicio: datetime.date = None, fim: datetime.date = None):
+        """Informes diários do fundo `cnpj` (com ou sem pontuação) entre `inicio` e `fim`, ordenados por data"""
+        filtros, parametros = ["fundo_cnpj = ?"], [REGEXP_CNPJ_SEPARATORS.sub("", cnpj).strip()]
+        if inicio is not None:
+            filtros.append("data_competencia >= ?")
+            parametros.append(inicio.isoformat())
+        if fim is not None:
+            filtros.append("data_competencia <= ?")
+            parametros.append(fim.isoformat())
+        return self.consulta(" AND ".join(filtros), tuple(parametros), ordem="data_competencia")
 
 
 @dataclass
@@ -78,8 +215,7 @@ class ContaBalancete:
     retificadora: Optional[bool] = None
     conta_superior: Optional[int] = None
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
 
 
 @dataclass
@@ -119,8 +255,7 @@ class ItemBalanceteFundo:
             raise ValueError(f"Item de balancete não pode ser extraído - campos extras: {', '.join(row_copy.keys())}")
         return obj
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
 
 
 @dataclass
@@ -130,14 +265,55 @@ class Noticia:
     data: datetime.date
     descricao: str
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
+
+
+def membro_mensal(zf: zipfile.ZipFile, esperado: str) -> str:
+    """Nome do CSV a ser lido em um ZIP da CVM: o único arquivo do ZIP mensal ou `esperado`, nos ZIPs anuais"""
+    if len(zf.filelist) == 1:
+        return zf.filelist[0].filename
+    for info in zf.filelist:
+        if info.filename == esperado:
+            return info.filename
+    filenames = ", ".join(sorted(info.filename for info in zf.filelist))
+    raise RuntimeError(f"CSV {esperado} não encontrado no ZIP - arquivos disponíveis: {filenames}")
 
 
 class CVM:
-    def __init__(self):
+    def __init__(
+        self,
+        cache_dir: Path | str = None,
+        cache_tamanho_maximo: int = None,
+        compacto: bool = False,
+        leitura_parcial: bool = True,
+    ):
+        """
+        :param cache_dir: (opcional) pasta onde os arquivos ZIP do portal de dados abertos serão guardados, evitando
+        que sejam baixados novamente (são revalidados com o servidor antes de serem reutilizados)
+        :param cache_tamanho_maximo: (opcional) tamanho máximo do cache, em bytes. Os arquivos usados há mais tempo
+        são removidos quando o limite é ultrapassado.
+        :param compacto: caso `True`, os informes diários são devolvidos como `InformeDiarioFundoCompacta` (versão com
+        `__slots__`, que ocupa bem menos memória)
+        :param leitura_parcial: caso `True` (padrão), dos ZIPs históricos anuais (com um CSV por mês) são baixados
+        apenas o diretório central e o CSV do mês desejado, usando requisições HTTP `Range`. Não é usado caso
+        `cache_dir` seja especificado (o ZIP inteiro é baixado uma vez e guardado no cache, servindo aos demais meses).
+        """
         # TODO: trocar user agent
         self.session = create_session()
+        self.cache = CacheHTTP(cache_dir, tamanho_maximo=cache_tamanho_maximo) if cache_dir is not None else None
+        self.compacto = compacto
+        self.leitura_parcial = leitura_parcial
+
+    def _abre_zip_anual(self, url: str):
+        """Abre um ZIP histórico anual, baixando apenas as partes lidas caso `leitura_parcial` seja possível
+
+        Caso o cache esteja sendo usado ou o servidor não aceite requisições `Range`, o ZIP é baixado por inteiro.
+        """
+        if self.leitura_parcial and self.cache is None:
+            fobj = abre_arquivo_remoto(self.session, url)
+            if fobj is not None:
+                return fobj
+        return baixa_arquivo(self.session, url, cache=self.cache)
 
     def noticias(self):
         url = "https://www.gov.br/cvm/pt-br/assuntos/noticias"
@@ -171,21 +347,19 @@ class CVM:
 
     def _le_zip_informe_diario(self, zip_filename, data):
         zf = zipfile.ZipFile(zip_filename)
-        if len(zf.filelist) == 1:
-            # A partir de 2021 os arquivos ZIP são mensais e existe apenas 1 CSV por ZIP
-            inner_filename = zf.filelist[0].filename
-        else:
-            # Antes de 2021 os ZIPs contém 12 CSVs, um para cada mês. Baixamos o ZIP inteiro e selecionamos apenas o
-            # CSV do mês de interesse.
-            expected_filename = f"inf_diario_fi_{data.year}{data.month:02d}.csv"
-            result = [info.filename for info in zf.filelist if info.filename == expected_filename]
-            if not result:
-                filenames = ", ".join(sorted(info.filename for info in zf.filelist))
-                raise RuntimeError(f"CSV de informe mensal não encontrado no ZIP - arquivos disponíveis: {filenames}")
-            inner_filename = result[0]
-        with io.TextIOWrapper(zf.open(inner_filename, mode="r"), encoding="iso-8859-1") as fobj:
-            for row in csv.DictReader(fobj, delimiter=";"):
-                yield InformeDiarioFundo.from_dict({key.lower(): value for key, value in row.items()})
+        # A partir de 2021 os arquivos ZIP são mensais e existe apenas 1 CSV por ZIP. Antes disso, os ZIPs contém 12
+        # CSVs, um para cada mês, e selecionamos apenas o CSV do mês de interesse (com `_abre_zip_anual`, apenas ele é
+        # baixado).
+        inner_filename = membro_mensal(zf, f"inf_diario_fi_{data.year}{data.month:02d}.csv")
+        classe = InformeDiarioFundoCompacta if self.compacto else InformeDiarioFundo
+        with io.TextIOWrapper(ETAPAS.arquivo(zf.open(inner_filename, mode="r")), encoding="iso-8859-1") as fobj:
+            reader = csv.reader(fobj, delimiter=";")
+            cabecalho = next(reader, None)
+            while cabecalho is not None:
+                lote = list(islice(reader, TAMANHO_LOTE_INFORME_DIARIO))
+                if not lote:
+                    break
+                yield from classe.from_rows(cabecalho, lote)
 
     def informe_diario_fundo(self, ano_mes: datetime.date | str):
         """
@@ -194,13 +368,120 @@ class CVM:
         Nota: `ano_mes` pode ser uma string nos formatos YYYY-MM ou YYYY-MM-DD ou um `datetime.date`. Nos casos em que
         o dia é especificado, ele é ignorado.
         """
-        # TODO: guardar em cache esse arquivo!
         if isinstance(ano_mes, str):
             ano_mes = parse_iso_month(ano_mes)
+        with self._abre_zip_informe_diario(ano_mes) as zip_fobj:
+            yield from self._le_zip_informe_diario(zip_fobj, ano_mes)
+
+    def _abre_zip_informe_diario(self, ano_mes: datetime.date):
         url = self.url_informe_diario_fundo(ano_mes)
-        response = self.session.get(url)
-        zip_fobj = io.BytesIO(response.content)
-        yield from self._le_zip_informe_diario(zip_fobj, ano_mes)
+        if ano_mes.year < 2021:
+            return self._abre_zip_anual(url)
+        return baixa_arquivo(self.session, url, cache=self.cache)
+
+    def _extrai_csv_informe_diario(self, ano_mes: datetime.date, pasta: Path) -> Path:
+        """Baixa o ZIP de informe diário do mês e descompacta o CSV em `pasta`"""
+        filename = Path(pasta) / f"inf_diario_fi_{ano_mes.year}{ano_mes.month:02d}.csv"
+        with self._abre_zip_informe_diario(ano_mes) as zip_fobj:
+            zf = zipfile.ZipFile(zip_fobj)
+            inner_filename = membro_mensal(zf, filename.name)
+            with ETAPAS.arquivo(zf.open(inner_filename, mode="r")) as origem, filename.open(mode="wb") as destino:
+                shutil.copyfileobj(origem, destino, TAMANHO_CHUNK_DOWNLOAD)
+        return filename
+
+    def informe_diario_fundo_periodo(
+        self,
+        inicio: datetime.date | str,
+        fim: datetime.date | str = None,
+        workers: int = None,
+        downloads: int = 4,
+        tamanho_bloco: int = TAMANHO_BLOCO_INFORME_DIARIO,
+    ):
+        """
+        Baixa e converte os informes diários de todos os fundos para os meses entre `inicio` e `fim` (inclusive)
+
+        Os mesmos informes de chamar `informe_diario_fundo` para cada mês, na mesma ordem, porém: até `downloads`
+        meses são baixados ao mesmo tempo (em threads, com o CSV descompactado em uma pasta temporária) e cada CSV é
+        dividido em blocos de ~`tamanho_bloco` bytes, convertidos em paralelo por `workers` processos (padrão: número
+        de CPUs; com 1, a conversão é feita no próprio processo). Apenas `2 * workers` blocos ficam pendentes, então a
+        memória usada não depende do tamanho do período.
+
+        :param inicio: primeiro mês (string no formato YYYY-MM ou `datetime.date`, cujo dia é ignorado)
+        :param fim: (opcional) último mês (padrão: mês atual)
+        """
+        if isinstance(inicio, str):
+            inicio = parse_iso_month(inicio)
+        if isinstance(fim, str):
+            fim = parse_iso_month(fim)
+        elif fim is None:
+            fim = datetime.date.today()
+        workers = workers or os.cpu_count() or 1
+        _, desempacota = empacotador(InformeDiarioFundoCompacta if self.compacto else InformeDiarioFundo)
+        pendentes = deque()
+
+        def proximo_bloco():
+            futuro, filename = pendentes.popleft()
+            informes = desempacota(futuro.result())
+            if filename is not None:  # Último bloco do mês: o CSV não é mais necessário
+                filename.unlink()
+            return informes
+
+        # Com apenas 1 worker a conversão é feita neste processo (só os downloads ficam em paralelo). Os processos são
+        # iniciados com "spawn" porque, com "fork", herdariam locks das threads de download e do pool de conexões.
+        processos = None
+        if workers > 1:
+            processos = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+        with tempfile.TemporaryDirectory(prefix="mercados-") as pasta:
+            extraidos = mapeia_em_paralelo(
+                lambda ano_mes: self._extrai_csv_informe_diario(ano_mes, pasta),
+                meses(inicio, fim),
+                max_workers=downloads,
+            )
+            try:
+                for filename in extraidos:
+                    with filename.open(mode="rb") as fobj:
+                        linha = fobj.readline()
+                    cabecalho = [
+                        campo.lower() for campo in next(csv.reader([linha.decode("iso-8859-1")], delimiter=";"))
+                    ]
+                    blocos = blocos_de_linhas(filename, tamanho_bloco, inicio=len(linha))
+                    for indice, (inicio_bloco, fim_bloco) in enumerate(blocos):
+                        argumentos = (filename, inicio_bloco, fim_bloco, cabecalho, self.compacto)
+                        if processos is None:
+                            yield from _le_bloco_informe_diario(*argumentos)
+                            continue
+                        futuro = processos.submit(_converte_bloco_informe_diario, *argumentos)
+                        pendentes.append((futuro, filename if indice == len(blocos) - 1 else None))
+                        if len(pendentes) >= 2 * workers:
+                            yield from proximo_bloco()
+                    if processos is None or not blocos:
+                        filename.unlink()
+                while pendentes:
+                    yield from proximo_bloco()
+            finally:
+                extraidos.close()
+                if processos is not None:
+                    processos.shutdown(wait=True, cancel_futures=True)
+
+    def atualiza_informe_diario_fundo(
+        self,
+        base: BaseInformeDiarioFundo,
+        inicio: datetime.date,
+        fim: datetime.date = None,
+        recarregar: bool = False,
+    ):
+        """Carrega em `base` os informes diários dos meses entre `inicio` e `fim` (padrão: mês atual)
+
+        Meses já carregados não são baixados novamente, exceto o mês atual e o anterior (cujos arquivos ainda recebem
+        novos informes) ou caso `recarregar=True`. Devolve, conforme carrega, `(particao, quantidade)` de cada mês.
+        """
+        hoje = datetime.date.today()
+        em_aberto = (hoje.replace(day=1) - datetime.timedelta(days=1)).replace(day=1)
+        for ano_mes in meses(inicio, fim or hoje):
+            particao, _, _ = base.particao(ano_mes)
+            if not recarregar and ano_mes < em_aberto and base.particao_carregada(particao):
+                continue
+            yield particao, base.carrega(ano_mes, self.informe_diario_fundo(ano_mes))
 
     def contas_fundos(self):
         response = self.session.get("https://cvmweb.cvm.gov.br/SWB/Sistemas/SCW/PadroesXML/ListaPlanoContasCOFI.aspx")
@@ -246,36 +527,39 @@ class CVM:
         else:
             return f"https://dados.cvm.gov.br/dados/FIE/DOC/BALANCETE/DADOS/HIST/balancete_fie_{ano_mes.year}.zip"
 
-    def _le_zip_balancete(self, zip_filename):
+    def _le_zip_balancete(self, zip_filename, nome_membro: str = None):
         zf = zipfile.ZipFile(zip_filename)
-        if len(zf.filelist) != 1:
-            filenames = ", ".join(sorted(info.filename for info in zf.filelist))
-            raise RuntimeError(f"Esperado apenas um arquivo dentro do ZIP de balancete, encontrados: {filenames}")
-        for file_info in zf.filelist:
-            with io.TextIOWrapper(zf.open(file_info.filename, mode="r"), encoding="iso-8859-1") as fobj:
-                for row in csv.DictReader(fobj, delimiter=";"):
-                    obj = ItemBalanceteFundo.from_dict(row)
-                    if obj is not None:
-                        yield obj
+        if nome_membro is None:
+            if len(zf.filelist) != 1:
+                filenames = ", ".join(sorted(info.filename for info in zf.filelist))
+                raise RuntimeError(f"Esperado apenas um arquivo dentro do ZIP de balancete, encontrados: {filenames}")
+            nome_membro = zf.filelist[0].filename
+        else:
+            nome_membro = membro_mensal(zf, nome_membro)
+        with io.TextIOWrapper(ETAPAS.arquivo(zf.open(nome_membro, mode="r")), encoding="iso-8859-1") as fobj:
+            for row in csv.DictReader(fobj, delimiter=";"):
+                obj = ItemBalanceteFundo.from_dict(row)
+                if obj is not None:
+                    yield obj
 
     def balancete_fundo_investimento(self, ano_mes: datetime.date | str):
-        # TODO: guardar em cache esse arquivo!
         if isinstance(ano_mes, str):
             ano_mes = parse_iso_month(ano_mes)
         url = self.url_balancete_fundo_investimento(ano_mes)
-        response = self.session.get(url)
-        zip_fobj = io.BytesIO(response.content)
-        yield from self._le_zip_balancete(zip_fobj)
+        with baixa_arquivo(self.session, url, cache=self.cache) as zip_fobj:
+            yield from self._le_zip_balancete(zip_fobj)
 
     def balancete_fundo_estruturado(self, ano_mes: datetime.date | str):
-        # TODO: guardar em cache esse arquivo!
         if isinstance(ano_mes, str):
             ano_mes = parse_iso_month(ano_mes)
         url = self.url_balancete_fundo_estruturado(ano_mes)
-        response = self.session.get(url)
-        zip_fobj = io.BytesIO(response.content)
-        # TODO: deveria extrair de maneira diferente o ZIP anual e o mensal?
-        yield from self._le_zip_balancete(zip_fobj)
+        if ano_mes >= datetime.date(2024, 1, 1):
+            with baixa_arquivo(self.session, url, cache=self.cache) as zip_fobj:
+                yield from self._le_zip_balancete(zip_fobj)
+        else:
+            # O ZIP anual possui um CSV por mês: apenas o do mês desejado é lido (e baixado, com `_abre_zip_anual`)
+            with self._abre_zip_anual(url) as zip_fobj:
+                yield from self._le_zip_balancete(zip_fobj, f"balancete_fie_{ano_mes.year}{ano_mes.month:02d}.csv")
 
     def __cadastro_fundos(self):
         # TODO: criar dataclass e finalizar implementação
@@ -371,7 +655,7 @@ class DocumentoEmpresa:
     detalhe_publicacao: str = None
 
     def serialize(self):
-        return {"uuid": self.uuid, **asdict(self)}
+        return {"uuid": self.uuid, **serializa_dataclass(self)}
 
     @property
     def uuid(self):
@@ -583,7 +867,14 @@ class RAD:
 if __name__ == "__main__":
     import argparse
 
+    from .exportacao import Exportador, exporta
+    from .instrumentacao import adiciona_argumentos_estatisticas, finaliza_estatisticas, inicia_estatisticas
+
     parser = argparse.ArgumentParser(description="Captura e trata dados da CVM")
+    parser.add_argument(
+        "--cache-dir", type=Path, help="Pasta para guardar em cache os arquivos ZIP do portal de dados abertos"
+    )
+    adiciona_argumentos_estatisticas(parser)
     subparsers = parser.add_subparsers(dest="command", required=True)
 
     parser_noticias = subparsers.add_parser("noticias", help="Baixa notícias do site da CVM a partir de hoje")
@@ -591,14 +882,55 @@ if __name__ == "__main__":
     parser_noticias.add_argument("csv_filename", type=Path, help="Nome do CSV para salvar os dados")
 
     parser_informe_diario_fundo = subparsers.add_parser(
-        "informe-diario-fundo", help="Baixa informes diários dos fundos para um determinado mês"
+        "informe-diario-fundo", help="Baixa informes diários dos fundos para um determinado mês (ou período)"
+    )
+    parser_informe_diario_fundo.add_argument(
+        "--mes-final",
+        "-f",
+        type=parse_iso_month,
+        help="Último mês no formato YYYY-MM: baixa e converte em paralelo todos os meses desde `ano_mes`",
+    )
+    parser_informe_diario_fundo.add_argument(
+        "--workers", "-w", type=int, help="Processos usados na conversão dos CSVs do período (padrão: número de CPUs)"
     )
     parser_informe_diario_fundo.add_argument(
         "ano_mes",
         type=parse_iso_month,
         help="Mês de referência do informe no formato YYYY-MM ou YYYY-MM-DD (dia é ignorado)",
     )
-    parser_informe_diario_fundo.add_argument("csv_filename", type=Path, help="Nome do CSV para salvar os dados")
+    parser_informe_diario_fundo.add_argument(
+        "csv_filename",
+        type=Path,
+        help="Arquivo a ser salvo: .csv, .tsv, .jsonl (+ .gz ou .zst), .parquet, .arrow ou .colunar",
+    )
+
+    parser_informe_diario_fundo_base = subparsers.add_parser(
+        "informe-diario-fundo-base",
+        help="Carrega os informes diários do período em uma base SQLite local (baixa apenas os meses que faltam)",
+    )
+    parser_informe_diario_fundo_base.add_argument(
+        "--mes-final", "-f", type=parse_iso_month, help="Último mês no formato YYYY-MM (padrão: mês atual)"
+    )
+    parser_informe_diario_fundo_base.add_argument(
+        "--recarregar", "-r", action="store_true", help="Baixa novamente os meses que já foram carregados"
+    )
+    parser_informe_diario_fundo_base.add_argument(
+        "mes_inicial", type=parse_iso_month, help="Primeiro mês no formato YYYY-MM"
+    )
+    parser_informe_diario_fundo_base.add_argument("base_filename", type=Path, help="Arquivo SQLite da base")
+
+    parser_cota_historica = subparsers.add_parser(
+        "cota-historica", help="Exporta, a partir da base local, os informes diários de um fundo"
+    )
+    parser_cota_historica.add_argument("--data-inicial", "-i", type=parse_iso_date, help="Data inicial (YYYY-MM-DD)")
+    parser_cota_historica.add_argument("--data-final", "-f", type=parse_iso_date, help="Data final (YYYY-MM-DD)")
+    parser_cota_historica.add_argument("cnpj", type=str, help="CNPJ do fundo (com ou sem pontuação)")
+    parser_cota_historica.add_argument("base_filename", type=Path, help="Arquivo SQLite da base")
+    parser_cota_historica.add_argument(
+        "csv_filename",
+        type=Path,
+        help="Arquivo a ser salvo: .csv, .tsv, .jsonl (+ .gz ou .zst), .parquet, .arrow ou .colunar",
+    )
 
     parser_contas_fundos = subparsers.add_parser(
         "contas-fundos", help="Baixa descrições das contas usadas nos balancetes de fundos"
@@ -645,37 +977,29 @@ if __name__ == "__main__":
     parser_rad_busca.add_argument("csv_filename", type=Path, help="Nome do CSV para salvar os dados")
 
     args = parser.parse_args()
+    inicia_estatisticas(args)
 
     if args.command == "noticias":
         csv_filename = args.csv_filename
         csv_filename.parent.mkdir(parents=True, exist_ok=True)
         data_minima = args.data_minima
 
-        cvm = CVM()
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
+        cvm = CVM(cache_dir=args.cache_dir)
+        with Exportador(csv_filename) as exportador:
             for noticia in cvm.noticias():
                 if noticia.data < data_minima:
                     break
-                row = asdict(noticia)
-                if writer is None:
-                    writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                    writer.writeheader()
-                writer.writerow(row)
+                exportador.escreve(noticia)
 
     elif args.command == "rad-empresas":
         csv_filename = args.csv_filename
         csv_filename.parent.mkdir(parents=True, exist_ok=True)
 
         rad = RAD()
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
+        with Exportador(csv_filename) as exportador:
             for key, value in rad.empresas().items():
                 row = {"codigo": key, "nome": value}
-                if writer is None:
-                    writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                    writer.writeheader()
-                writer.writerow(row)
+                exportador.escreve(row)
 
     elif args.command == "rad-busca":
         csv_filename = args.csv_filename
@@ -685,73 +1009,61 @@ if __name__ == "__main__":
         fim = args.data_final
 
         rad = RAD()
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
-            for documento in rad.busca(data_inicio=inicio, data_fim=fim, empresas=empresas):
-                row = documento.serialize()
-                if writer is None:
-                    writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                    writer.writeheader()
-                writer.writerow(row)
+        exporta(rad.busca(data_inicio=inicio, data_fim=fim, empresas=empresas), csv_filename)
 
     elif args.command == "informe-diario-fundo":
         ano_mes = args.ano_mes
         csv_filename = args.csv_filename
         csv_filename.parent.mkdir(parents=True, exist_ok=True)
 
-        cvm = CVM()
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
-            for informe in cvm.informe_diario_fundo(ano_mes):
-                row = asdict(informe)
-                if writer is None:
-                    writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                    writer.writeheader()
-                writer.writerow(row)
+        cvm = CVM(cache_dir=args.cache_dir)
+        if args.mes_final is None:
+            informes = cvm.informe_diario_fundo(ano_mes)
+        else:
+            informes = cvm.informe_diario_fundo_periodo(ano_mes, args.mes_final, workers=args.workers)
+        exporta(informes, csv_filename, classe=InformeDiarioFundo)
+
+    elif args.command == "informe-diario-fundo-base":
+        cvm = CVM(cache_dir=args.cache_dir)
+        with BaseInformeDiarioFundo(args.base_filename) as base:
+            carregados = cvm.atualiza_informe_diario_fundo(
+                base, args.mes_inicial, args.mes_final, recarregar=args.recarregar
+            )
+            for particao, quantidade in carregados:
+                print(f"{particao}: {quantidade} informes carregados", flush=True)
+
+    elif args.command == "cota-historica":
+        csv_filename = args.csv_filename
+        csv_filename.parent.mkdir(parents=True, exist_ok=True)
+
+        with BaseInformeDiarioFundo(args.base_filename) as base:
+            informes = base.cota_historica(args.cnpj, inicio=args.data_inicial, fim=args.data_final)
+            exporta(informes, csv_filename, classe=InformeDiarioFundo)
 
     elif args.command == "contas-fundos":
         csv_filename = args.csv_filename
         csv_filename.parent.mkdir(parents=True, exist_ok=True)
 
-        cvm = CVM()
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
-            for item in cvm.contas_fundos():
-                row = asdict(item)
-                if writer is None:
-                    writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                    writer.writeheader()
-                writer.writerow(row)
+        cvm = CVM(cache_dir=args.cache_dir)
+        exporta(cvm.contas_fundos(), csv_filename)
 
     elif args.command == "balancete-fundo-investimento":
         ano_mes = args.ano_mes
         csv_filename = args.csv_filename
         csv_filename.parent.mkdir(parents=True, exist_ok=True)
 
-        cvm = CVM()
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
-            for item in cvm.balancete_fundo_investimento(ano_mes):
-                row = asdict(item)
-                if writer is None:
-                    writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                    writer.writeheader()
-                writer.writerow(row)
+        cvm = CVM(cache_dir=args.cache_dir)
+        exporta(cvm.balancete_fundo_investimento(ano_mes), csv_filename)
 
     elif args.command == "balancete-fundo-estruturado":
         ano_mes = args.ano_mes
         csv_filename = args.csv_filename
         csv_filename.parent.mkdir(parents=True, exist_ok=True)
 
-        cvm = CVM()
-        with csv_filename.open(mode="w") as csv_fobj:
-            writer = None
-            for item in cvm.balancete_fundo_estruturado(ano_mes):
-                row = asdict(item)
-                if writer is None:
-                    writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                    writer.writeheader()
-                writer.writerow(row)
+        cvm = CVM(cache_dir=args.cache_dir)
+        exporta(cvm.balancete_fundo_estruturado(ano_mes), csv_filename)
+
+    finaliza_estatisticas(args, comando=args.command)
 
 # TODO: adicionar ITR (Informe Trimestral de Resultados)
 # TODO: adicionar Carteira dos fundos (CDA - Composição e Diversificação das Aplicações)
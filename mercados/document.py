@@ -2,7 +2,7 @@ import copy
 import datetime
 import re
 import warnings
-from dataclasses import asdict, dataclass
+from dataclasses import dataclass
 from dataclasses import fields as class_fields
 from decimal import Decimal
 from typing import List, Optional
@@ -17,6 +17,7 @@ from .utils import (
     parse_date,
     parse_decimal,
     parse_int,
+    serializa_dataclass,
     slug,
 )
 
@@ -270,8 +271,7 @@ class InformeRendimentos:
 
         return result
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
 
 
 @dataclass
@@ -426,8 +426,7 @@ class OfertaPublica:
             },
         )
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
 
 
 @dataclass
@@ -525,8 +524,7 @@ class DocumentMeta:
         assert not row, f"Valores não extraídos: {row=}"
         return obj
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
 
 
 @dataclass
@@ -677,8 +675,7 @@ class InformeFII:
             patrimonio_por_cota=parse_br_decimal(resumo.pop("ValorPatrCotas")),
         )
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
 
 
 @dataclass
@@ -690,8 +687,7 @@ class InformeMensalFII:
     cotistas: int = None
     cotistas_pessoa_fisica: int = None
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
 
 
 @dataclass
@@ -710,8 +706,7 @@ class CotistaFundo:
         assert not row, f"Dados sobraram e não foram extraídos para {cls.__name__}: {row}"
         return obj
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
 
 
 @dataclass
@@ -813,5 +808,4 @@ class InformeDiarioFundo:
             resultado.append(obj)
         return resultado
 
-    def serialize(self):
-        return asdict(self)
+    serialize = serializa_dataclass
@@ -0,0 +1,607 @@
+"""Exportação dos objetos retornados pelos coletores para arquivos CSV, TSV, JSONL ou colunares
+
+`Exportador` (ou a função `exporta`) recebe qualquer iterável de dataclasses (ou dicionários) e escreve o formato
+definido pela extensão do arquivo, com compressão opcional (`.gz` ou `.zst`, sendo que zstd depende do `zstandard`,
+instale com `pip install mercados[zstd]`). Os valores são extraídos com uma função criada uma única vez por classe (em
+vez de `dataclasses.asdict`, que copia recursivamente cada objeto) e escritos em lotes.
+
+Nos formatos colunares (`EscritorColunar`), os tipos das colunas são obtidos a partir das anotações da dataclass
+(`int`, `Decimal`, `datetime.date` etc.), então os dados são lidos de volta sem precisar converter texto:
+
+- `parquet` e `arrow` (Arrow IPC/Feather): dependem do `pyarrow` (dependência opcional, instale com
+  `pip install mercados[colunar]`) e podem ser lidos por pandas, polars, DuckDB etc.;
+- `colunar`: formato próprio, sem dependências, lido com `le_colunar`/`le_registros_colunar`. É um arquivo ZIP com
+  um `esquema.json` e, para cada lote de registros, um membro por coluna com os valores em binário (inteiros de 64
+  bits, datas em dias desde 1970-01-01 etc.; `Decimal` é guardado como texto, preservando todas as casas).
+
+Exemplo:
+
+    exporta(cvm.informe_diario_fundo(ano_mes), "informes.csv.gz")
+    exporta(cvm.informe_diario_fundo(ano_mes), "informes.parquet", classe=InformeDiarioFundo)
+"""
+
+import csv
+import datetime
+import gzip
+import json
+import sys
+import typing
+from array import array
+from dataclasses import fields, is_dataclass
+from decimal import Context, Decimal
+from functools import lru_cache
+from itertools import accumulate, islice, repeat
+from operator import attrgetter, is_
+from pathlib import Path
+from zipfile import ZIP_DEFLATED, ZipFile
+
+from .instrumentacao import ETAPAS
+from .utils import campo_simples, como_asdict, serializa_dataclass
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+FORMATOS_TEXTO = ("csv", "tsv", "jsonl")
+FORMATOS_COLUNARES = ("colunar", "parquet", "arrow")
+FORMATOS = FORMATOS_TEXTO + FORMATOS_COLUNARES
+EXTENSOES_COLUNARES = {".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow", ".colunar": "colunar"}
+EXTENSOES = {".csv": "csv", ".tsv": "tsv", ".jsonl": "jsonl", ".ndjson": "jsonl", **EXTENSOES_COLUNARES}
+COMPRESSOES = {".gz": "gzip", ".zst": "zstd"}
+TIPOS = {
+    bool: "booleano",  # Precisa vir antes de `int`, já que `bool` é subclasse de `int`
+    int: "inteiro",
+    float: "real",
+    Decimal: "decimal",
+    datetime.datetime: "datahora",  # Precisa vir antes de `datetime.date` (subclasse)
+    datetime.date: "data",
+    str: "texto",
+}
+ESCALA_DECIMAL_ARROW = 12  # Casas decimais das colunas `Decimal` em Parquet/Arrow (`decimal128(38, 12)`)
+EPOCA = datetime.datetime(1970, 1, 1)
+EPOCA_ORDINAL = EPOCA.toordinal()
+MICROSSEGUNDO = datetime.timedelta(microseconds=1)
+CONTEXTO_DECIMAL = Context(prec=38)  # Precisão máxima de `decimal128`
+TAMANHO_LOTE = 100_000
+TAMANHO_LOTE_TEXTO = 10_000
+TAMANHO_BUFFER = 1024 * 1024
+
+
+def tipo_coluna(anotacao) -> str:
+    """Converte a anotação de um campo da dataclass para o tipo da coluna (`Optional[X]` equivale a `X`)
+
+    Tipos não suportados (listas, dicionários, `Path` etc.) são exportados como texto.
+
+    >>> tipo_coluna(Decimal)
+    'decimal'
+    >>> tipo_coluna(typing.Optional[datetime.date])
+    'data'
+    >>> tipo_coluna(typing.List[str])
+    'texto'
+    """
+    argumentos = [arg for arg in typing.get_args(anotacao) if arg is not type(None)]
+    if typing.get_origin(anotacao) is typing.Union and len(argumentos) == 1:
+        anotacao = argumentos[0]
+    for classe, tipo in TIPOS.items():
+        if isinstance(anotacao, type) and issubclass(anotacao, classe):
+            return tipo
+    return "texto"
+
+
+def esquema(classe) -> list:
+    """Lista de `(nome, tipo)` das colunas, na ordem dos campos da dataclass"""
+    anotacoes = typing.get_type_hints(classe)
+    return [(campo.name, tipo_coluna(anotacoes[campo.name])) for campo in fields(classe)]
+
+
+def formato_por_extensao(filename) -> typing.Optional[str]:
+    """Formato correspondente à extensão do arquivo, ignorando a extensão de compressão (ou `None`, se desconhecida)
+
+    >>> formato_por_extensao("dados/informes.parquet")
+    'parquet'
+    >>> formato_por_extensao("informes.csv.gz")
+    'csv'
+    >>> formato_por_extensao("informes.txt") is None
+    True
+    """
+    filename = Path(filename)
+    if filename.suffix.lower() in COMPRESSOES:
+        filename = filename.with_suffix("")
+    return EXTENSOES.get(filename.suffix.lower())
+
+
+def compressao_por_extensao(filename) -> typing.Optional[str]:
+    """
+    >>> compressao_por_extensao("informes.jsonl.zst")
+    'zstd'
+    >>> compressao_por_extensao("informes.csv") is None
+    True
+    """
+    return COMPRESSOES.get(Path(filename).suffix.lower())
+
+
+@lru_cache(maxsize=256)
+def extrator_campos(classe):
+    """Cria (uma única vez por classe) uma função que retorna a tupla com os valores dos campos de um objeto
+
+    Retorna `(nomes, funcao)`. Os valores são os mesmos de `asdict`, mas sem cópias: apenas campos que podem ter
+    dataclasses aninhadas (listas, dicionários etc.) são convertidos.
+
+    >>> from dataclasses import dataclass
+    >>> @dataclass
+    ... class Ponto:
+    ...     x: int
+    ...     y: typing.Optional[int] = None
+    >>> nomes, extrai = extrator_campos(Ponto)
+    >>> nomes, extrai(Ponto(1, 2))
+    (('x', 'y'), (1, 2))
+    """
+    nomes = tuple(campo.name for campo in fields(classe))
+    try:
+        anotacoes = typing.get_type_hints(classe)
+    except (NameError, TypeError):  # Anotações que não podem ser resolvidas são tratadas como não-simples
+        anotacoes = {}
+    if len(nomes) == 1:
+        nome = nomes[0]
+        extrai = lambda registro: (getattr(registro, nome),)  # noqa: E731
+    else:
+        extrai = attrgetter(*nomes)
+    aninhados = [indice for indice, nome in enumerate(nomes) if not campo_simples(anotacoes.get(nome))]
+    if not aninhados:
+        return nomes, extrai
+
+    def extrai_aninhados(registro):
+        valores = list(extrai(registro))
+        for indice in aninhados:
+            valores[indice] = como_asdict(valores[indice])
+        return tuple(valores)
+
+    return nomes, extrai_aninhados
+
+
+def _converte_texto(valor):
+    return valor if valor is None or isinstance(valor, str) else str(valor)
+
+
+class EscritorColunar:
+    """Escreve objetos de uma dataclass em formato colunar, em lotes de `tamanho_lote` registros
+
+    :param filename: arquivo a ser criado
+    :param classe: dataclass dos objetos a serem escritos (define as colunas e seus tipos)
+    :param formato: "colunar", "parquet" ou "arrow" - caso não seja informado, é definido pela extensão do arquivo
+    (sendo "colunar" o padrão)
+    :param compressao: algoritmo usado em Parquet/Arrow ("zstd", "lz4" etc.); o formato "colunar" usa sempre deflate
+    """
+
+    def __init__(self, filename, classe, formato=None, tamanho_lote=TAMANHO_LOTE, compressao="zstd"):
+        self.filename = Path(filename)
+        self.formato = formato or EXTENSOES_COLUNARES.get(self.filename.suffix.lower(), "colunar")
+        if self.formato not in FORMATOS_COLUNARES:
+            raise ValueError(f"Formato inválido: {repr(self.formato)} (opções: {', '.join(FORMATOS_COLUNARES)})")
+        elif self.formato != "colunar" and pyarrow is None:
+            raise ImportError(
+                f"O formato {self.formato} depende do `pyarrow` - instale-o com `pip install mercados[colunar]`"
+            )
+        self.classe = classe
+        self.colunas = esquema(classe)
+        self.tamanho_lote = tamanho_lote
+        self.compressao = compressao
+        self.registros = 0
+        _, self._extrai = extrator_campos(classe)
+        self._lote = []  # Tuplas com os valores de cada registro, transpostas para colunas ao gravar o lote
+        self._lotes = []  # Metadados dos lotes (formato "colunar")
+        self._escritor = None  # `ZipFile` ou escritor do `pyarrow`, criado ao gravar o primeiro lote
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.fecha()
+
+    def escreve(self, registro):
+        """Adiciona um objeto da dataclass ao lote atual"""
+        self._lote.append(self._extrai(registro))
+        self.registros += 1
+        if len(self._lote) == self.tamanho_lote:
+            self._grava_lote()
+
+    def escreve_varios(self, registros):
+        """Adiciona vários objetos da dataclass (mais rápido que chamar `escreve` para cada um)"""
+        registros = iter(registros)
+        while True:
+            faltam = self.tamanho_lote - len(self._lote)
+            antes = len(self._lote)
+            self._lote.extend(map(self._extrai, islice(registros, faltam)))
+            self.registros += len(self._lote) - antes
+            if len(self._lote) < self.tamanho_lote:  # Acabaram os registros
+                break
+            self._grava_lote()
+
+    def fecha(self):
+        if self._lote is None:  # Já fechado
+            return
+        with ETAPAS.etapa("escrita"):
+            self._fecha()
+
+    def _fecha(self):
+        if self._lote or self._escritor is None:
+            self._grava_lote()
+        if self.formato == "colunar":
+            metadados = {
+                "versao": 1,
+                "classe": self.classe.__name__,
+                "colunas": [{"nome": nome, "tipo": tipo} for nome, tipo in self.colunas],
+                "registros": self.registros,
+                "lotes": self._lotes,
+            }
+            self._escritor.writestr("esquema.json", json.dumps(metadados, indent=2))
+        self._escritor.close()
+        self._lote = None
+
+    def _grava_lote(self):
+        with ETAPAS.etapa("escrita"):
+            colunas = list(zip(*self._lote)) if self._lote else [()] * len(self.colunas)
+            if self.formato == "colunar":
+                self._grava_lote_colunar(colunas)
+            else:
+                self._grava_lote_arrow(colunas)
+        self._lote = []
+
+    def _grava_lote_colunar(self, colunas):
+        if self._escritor is None:
+            self.filename.parent.mkdir(parents=True, exist_ok=True)
+            # Nível 1: bem mais rápido que o padrão (6) e, para estes dados, com praticamente o mesmo tamanho
+            self._escritor = ZipFile(self.filename, mode="w", compression=ZIP_DEFLATED, compresslevel=1)
+        numero = len(self._lotes)
+        lote = {"registros": len(self._lote), "colunas": {}}
+        for (nome, tipo), valores in zip(self.colunas, colunas):
+            dados, metadados = codifica_coluna(tipo, valores)
+            self._escritor.writestr(f"lote-{numero:05d}/{nome}", dados)
+            lote["colunas"][nome] = metadados
+        self._lotes.append(lote)
+
+    def _grava_lote_arrow(self, colunas):
+        if self._escritor is None:
+            self._esquema_arrow = pyarrow.schema(
+                [(nome, _tipo_arrow(tipo, valores)) for (nome, tipo), valores in zip(self.colunas, colunas)]
+            )
+            self.filename.parent.mkdir(parents=True, exist_ok=True)
+            if self.formato == "parquet":
+                self._escritor = pyarrow.parquet.ParquetWriter(
+                    self.filename, self._esquema_arrow, compression=self.compressao
+                )
+            else:
+                opcoes = pyarrow.ipc.IpcWriteOptions(compression=self.compressao)
+                self._escritor = pyarrow.ipc.new_file(self.filename, self._esquema_arrow, options=opcoes)
+        arrays = []
+        for (_, tipo), campo, valores in zip(self.colunas, self._esquema_arrow, colunas):
+            if tipo == "decimal":
+                quantum = Decimal(1).scaleb(-ESCALA_DECIMAL_ARROW)
+                valores = [
+                    None if valor is None else valor.quantize(quantum, context=CONTEXTO_DECIMAL) for valor in valores
+                ]
+            elif tipo == "texto":
+                valores = [_converte_texto(valor) for valor in valores]
+            arrays.append(pyarrow.array(valores, type=campo.type))
+        self._escritor.write_batch(pyarrow.record_batch(arrays, schema=self._esquema_arrow))
+
+
+def _tipo_arrow(tipo: str, valores):
+    if tipo == "datahora":  # O fuso horário não está na anotação: usa o do primeiro valor preenchido
+        valor = next((valor for valor in valores if valor is not None), None)
+        deslocamento = valor.utcoffset() if valor is not None else None
+        return pyarrow.timestamp("us", tz=_formata_fuso(deslocamento) if deslocamento is not None else None)
+    return {
+        "booleano": pyarrow.bool_(),
+        "inteiro": pyarrow.int64(),
+        "real": pyarrow.float64(),
+        "decimal": pyarrow.decimal128(38, ESCALA_DECIMAL_ARROW),
+        "data": pyarrow.date32(),
+        "texto": pyarrow.string(),
+    }[tipo]
+
+
+def _formata_fuso(deslocamento: datetime.timedelta) -> str:
+    """
+    >>> _formata_fuso(datetime.timedelta(hours=-3))
+    '-03:00'
+    """
+    segundos = int(deslocamento.total_seconds())
+    sinal = "-" if segundos < 0 else "+"
+    horas, minutos = divmod(abs(segundos) // 60, 60)
+    return f"{sinal}{horas:02d}:{minutos:02d}"
+
+
+def _array(codigo, valores):
+    dados = array(codigo, valores)
+    if sys.byteorder == "big":  # Os arquivos são sempre little-endian
+        dados.byteswap()
+    return dados.tobytes()
+
+
+def _le_array(codigo, dados):
+    valores = array(codigo)
+    valores.frombytes(dados)
+    if sys.byteorder == "big":
+        valores.byteswap()
+    return valores
+
+
+def _tem_nulos(valores) -> bool:
+    # Compara identidade (`None in valores` chamaria `__eq__` de cada valor, o que é lento para `Decimal`)
+    return any(map(is_, valores, repeat(None)))
+
+
+def _codifica_texto(valores):
+    if _tem_nulos(valores):
+        valores = ["" if valor is None else valor for valor in valores]
+    textos = list(map(str, valores))
+    return _array("I", list(map(len, textos))) + "".join(textos).encode("utf-8")
+
+
+def _horario_local(valor: datetime.datetime, fuso) -> datetime.datetime:
+    return (valor.astimezone(fuso) if fuso is not None else valor).replace(tzinfo=None)
+
+
+def codifica_coluna(tipo: str, valores: list):
+    """Codifica os valores de uma coluna de um lote, retornando `(bytes, metadados)`
+
+    Os `bytes` começam com um byte por valor indicando se é nulo, seguidos pelos valores. Caso algum valor não caiba
+    na codificação binária do tipo (como inteiros maiores que 64 bits), a coluna é codificada como texto.
+    """
+    nulos = bytes([valor is None for valor in valores]) if _tem_nulos(valores) else bytes(len(valores))
+    metadados = {"codificacao": tipo}
+    try:
+        if tipo == "booleano":
+            dados = bytes(bool(valor) for valor in valores)
+        elif tipo == "inteiro":
+            dados = _array("q", [0 if valor is None else valor for valor in valores])
+        elif tipo == "real":
+            dados = _array("d", [0.0 if valor is None else valor for valor in valores])
+        elif tipo == "data":
+            dados = _array("i", [0 if valor is None else valor.toordinal() - EPOCA_ORDINAL for valor in valores])
+        elif tipo == "datahora":
+            # Guarda o horário local (em microssegundos desde 1970) e o deslocamento do fuso do primeiro valor
+            fuso = next((valor.tzinfo for valor in valores if valor is not None), None)
+            deslocamento = fuso.utcoffset(None) if fuso is not None else None
+            dados = _array(
+                "q",
+                [0 if valor is None else (_horario_local(valor, fuso) - EPOCA) // MICROSSEGUNDO for valor in valores],
+            )
+            metadados["fuso"] = deslocamento.total_seconds() if deslocamento is not None else None
+        else:
+            # `Decimal` também é guardado como texto: preserva todas as casas decimais e é bem mais rápido que
+            # convertê-lo para inteiro escalado (`as_tuple`/`scaleb`), com tamanho parecido após a compressão
+            dados = _codifica_texto(valores)
+            metadados["codificacao"] = "texto"
+    except OverflowError:
+        dados = _codifica_texto(valores)
+        metadados = {"codificacao": "texto"}
+    return nulos + dados, metadados
+
+
+def decodifica_coluna(tipo: str, metadados: dict, quantidade: int, dados: bytes) -> list:
+    """Operação inversa de `codifica_coluna`"""
+    nulos, dados = dados[:quantidade], dados[quantidade:]
+    codificacao = metadados["codificacao"]
+    if codificacao == "booleano":
+        valores = [bool(valor) for valor in dados]
+    elif codificacao == "inteiro":
+        valores = _le_array("q", dados).tolist()
+    elif codificacao == "real":
+        valores = _le_array("d", dados).tolist()
+    elif codificacao == "data":
+        cache, fromordinal = {}, datetime.date.fromordinal
+        valores = []
+        for dias in _le_array("i", dados):
+            try:
+                valores.append(cache[dias])
+            except KeyError:
+                valor = cache[dias] = fromordinal(dias + EPOCA_ORDINAL)
+                valores.append(valor)
+    elif codificacao == "datahora":
+        fuso = metadados["fuso"]
+        fuso = datetime.timezone(datetime.timedelta(seconds=fuso)) if fuso is not None else None
+        valores = [(EPOCA + valor * MICROSSEGUNDO).replace(tzinfo=fuso) for valor in _le_array("q", dados)]
+    else:  # Texto (inclusive `Decimal` e os valores que não couberam na codificação binária)
+        tamanhos = _le_array("I", dados[: 4 * quantidade])
+        texto = dados[4 * quantidade :].decode("utf-8")
+        fins = list(accumulate(tamanhos))
+        valores = [texto[inicio:fim] for inicio, fim in zip([0] + fins, fins)]
+        if tipo != "texto":
+            converte = {"inteiro": int, "decimal": Decimal}.get(tipo, str)
+            valores = [converte(valor) if valor else None for valor in valores]
+    if any(nulos):
+        valores = [None if nulo else valor for valor, nulo in zip(valores, nulos)]
+    return valores
+
+
+def le_colunar(filename) -> dict:
+    """Lê um arquivo no formato "colunar", retornando um dicionário com a lista de valores de cada coluna"""
+    with ZipFile(filename) as zf:
+        metadados = json.loads(zf.read("esquema.json"))
+        colunas = {coluna["nome"]: [] for coluna in metadados["colunas"]}
+        for numero, lote in enumerate(metadados["lotes"]):
+            for coluna in metadados["colunas"]:
+                nome = coluna["nome"]
+                dados = zf.read(f"lote-{numero:05d}/{nome}")
+                colunas[nome].extend(decodifica_coluna(coluna["tipo"], lote["colunas"][nome], lote["registros"], dados))
+    return colunas
+
+
+def le_registros_colunar(filename, classe):
+    """Lê um arquivo no formato "colunar", retornando objetos da dataclass `classe` (a mesma usada na escrita)"""
+    colunas = le_colunar(filename)
+    nomes = [campo.name for campo in fields(classe)]
+    if list(colunas.keys()) != nomes:
+        raise ValueError(f"As colunas do arquivo não correspondem aos campos de {classe.__name__}")
+    for valores in zip(*colunas.values()):
+        yield classe(*valores)
+
+
+def abre_arquivo_texto(filename, compressao: str = None):
+    """Abre um arquivo texto (UTF-8) para escrita, com compressão opcional ("gzip" ou "zstd")"""
+    if compressao is None:
+        return open(filename, mode="w", encoding="utf-8", newline="", buffering=TAMANHO_BUFFER)
+    elif compressao == "gzip":
+        return gzip.open(filename, mode="wt", encoding="utf-8", newline="", compresslevel=6)
+    elif compressao == "zstd":
+        if zstandard is None:
+            raise ImportError("A compressão zstd depende do `zstandard` - instale-o com `pip install mercados[zstd]`")
+        return zstandard.open(filename, mode="wt", cctx=zstandard.ZstdCompressor(level=3), encoding="utf-8", newline="")
+    raise ValueError(f"Compressão inválida: {repr(compressao)} (opções: {', '.join(COMPRESSOES.values())})")
+
+
+def _valor_json(valor):
+    if isinstance(valor, (datetime.date, datetime.datetime)):
+        return valor.isoformat()
+    return str(valor)  # `Decimal` (sem perder casas decimais), `Path` etc.
+
+
+class Exportador:
+    """Escreve objetos (dataclasses ou dicionários) em CSV, TSV, JSONL ou formato colunar
+
+    O cabeçalho é definido pelo primeiro registro. Em CSV e TSV os valores são escritos como em `csv.DictWriter`
+    (`None` vira vazio); em JSONL, datas e `Decimal` viram texto. Caso a classe tenha um `serialize` que altere os
+    campos (como `FundoB3`), ele é usado no lugar da extração direta dos atributos.
+
+    :param filename: arquivo a ser criado
+    :param formato: um dos `FORMATOS` - caso não seja informado, é definido pela extensão do arquivo (sendo "csv" o
+    padrão)
+    :param compressao: "gzip" ou "zstd" (apenas formatos texto) - caso não seja informada, é definida pela extensão
+    do arquivo (`.gz` ou `.zst`)
+    :param classe: dataclass dos registros (opcional; nos formatos colunares, permite criar o arquivo mesmo que não
+    haja registros)
+    """
+
+    def __init__(self, filename, formato=None, compressao=None, classe=None, tamanho_lote=TAMANHO_LOTE_TEXTO):
+        self.filename = Path(filename)
+        self.formato = formato or formato_por_extensao(self.filename) or "csv"
+        if self.formato not in FORMATOS:
+            raise ValueError(f"Formato inválido: {repr(self.formato)} (opções: {', '.join(FORMATOS)})")
+        self.compressao = compressao if compressao is not None else compressao_por_extensao(self.filename)
+        if self.compressao is not None and self.formato in FORMATOS_COLUNARES:
+            raise ValueError(f"O formato {self.formato} já é comprimido (não use a extensão .gz/.zst)")
+        self.classe = classe
+        self.tamanho_lote = tamanho_lote
+        self.registros = 0
+        self._cabecalho = None
+        self._extratores = {}
+        self._lote = []
+        self._fobj = self._writer = self._colunar = None
+        self._fechado = False
+        self.filename.parent.mkdir(parents=True, exist_ok=True)
+        if self.formato in FORMATOS_COLUNARES:
+            if classe is not None:
+                self._colunar = EscritorColunar(self.filename, classe, formato=self.formato)
+        else:
+            self._fobj = abre_arquivo_texto(self.filename, self.compressao)
+            if self.formato != "jsonl":
+                self._writer = csv.writer(self._fobj, dialect="excel-tab" if self.formato == "tsv" else "excel")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.fecha()
+
+    def escreve(self, registro):
+        if self.formato in FORMATOS_COLUNARES:
+            if self._colunar is None:
+                if not is_dataclass(registro):
+                    raise ValueError(f"O formato {self.formato} aceita apenas dataclasses")
+                self._colunar = EscritorColunar(self.filename, type(registro), formato=self.formato)
+            self._colunar.escreve(registro)
+            self.registros += 1
+            return
+
+        extrai = self._extratores.get(type(registro))
+        if extrai is None:
+            extrai = self._extratores[type(registro)] = self._cria_extrator(registro)
+        self._lote.append(extrai(registro))
+        self.registros += 1
+        if len(self._lote) == self.tamanho_lote:
+            self._grava_lote()
+
+    def escreve_varios(self, registros):
+        for registro in registros:
+            self.escreve(registro)
+
+    def fecha(self):
+        if self._fechado:
+            return
+        self._fechado = True
+        if self._colunar is not None:
+            self._colunar.fecha()
+        if self._fobj is not None and not self._fobj.closed:
+            self._grava_lote()
+            with ETAPAS.etapa("escrita"):
+                self._fobj.close()
+        if ETAPAS.ativa:
+            tamanho = self.filename.stat().st_size if self.filename.is_file() else 0
+            ETAPAS.conta("escrita", registros=self.registros, bytes_=tamanho)
+            ETAPAS.conta("conversao", registros=self.registros)
+
+    def _cria_extrator(self, registro):
+        """Cria a função que converte um registro desse tipo na tupla de valores, na ordem do cabeçalho"""
+        if isinstance(registro, dict):
+            if self._cabecalho is None:
+                self._inicia_cabecalho(list(registro.keys()))
+            return self._extrator_dicionario()
+
+        nomes, extrai = extrator_campos(type(registro))
+        if getattr(type(registro), "serialize", serializa_dataclass) is not serializa_dataclass:
+            # `serialize` personalizado: é preciso chamá-lo para cada registro
+            if self._cabecalho is None:
+                self._inicia_cabecalho(list(registro.serialize().keys()))
+            extrai_dicionario = self._extrator_dicionario()
+            return lambda registro: extrai_dicionario(registro.serialize())
+        if self._cabecalho is None:
+            self._inicia_cabecalho(list(nomes))
+        if tuple(self._cabecalho) == nomes:
+            return extrai
+        extrai_dicionario = self._extrator_dicionario()
+        return lambda registro: extrai_dicionario(dict(zip(nomes, extrai(registro))))
+
+    def _extrator_dicionario(self):
+        cabecalho = self._cabecalho
+        chaves = set(cabecalho)
+
+        def extrai(registro):
+            if registro.keys() != chaves:
+                extras = registro.keys() - chaves
+                if extras:
+                    raise ValueError(f"Registro contém campos que não estão no cabeçalho: {', '.join(sorted(extras))}")
+            return tuple(map(registro.get, cabecalho))
+
+        return extrai
+
+    def _inicia_cabecalho(self, cabecalho):
+        self._cabecalho = cabecalho
+        if self._writer is not None:
+            self._writer.writerow(cabecalho)
+
+    def _grava_lote(self):
+        if not self._lote:
+            return
+        with ETAPAS.etapa("escrita"):
+            if self._writer is not None:
+                self._writer.writerows(self._lote)
+            else:
+                cabecalho, codifica = self._cabecalho, json.JSONEncoder(ensure_ascii=False, default=_valor_json).encode
+                self._fobj.write("".join(codifica(dict(zip(cabecalho, valores))) + "\n" for valores in self._lote))
+        self._lote = []
+
+
+def exporta(registros, filename, formato=None, compressao=None, classe=None) -> int:
+    """Escreve os registros no arquivo (ver `Exportador`), retornando a quantidade de registros escritos"""
+    with Exportador(filename, formato=formato, compressao=compressao, classe=classe) as exportador:
+        exportador.escreve_varios(registros)
+    return exportador.registros
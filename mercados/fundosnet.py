@@ -1,20 +1,41 @@
+import csv
 import datetime
+import glob
+import heapq
 import re
+import sqlite3
+import threading
 import time
+from dataclasses import dataclass
 from functools import cached_property
+from itertools import chain
+from pathlib import Path
 from urllib.parse import urljoin
 
+import requests
 from lxml.html import document_fromstring
 
 from . import choices
 from .document import DocumentMeta
-from .utils import create_session
+from .utils import LIMITADOR_CONCORRENCIA, create_session, mapeia_em_paralelo, salva_resposta, serializa_dataclass
 
 REGEXP_CSRF_TOKEN = re.compile("""csrf_token ?= ?["']([^"']+)["']""")
 REGEXP_CERTIFICADO_DESCRICAO = re.compile(
     r"^(.*) (CR|CRI|CRA|DEB|OTS) Emissão:(.*) Série(?:\(s\))?:(.*) ([0-9]{2}/[0-9]{4}) (.*)$"
 )
 REGEXP_XML_ENCODING = re.compile('encoding="([^"]+)"')
+# Campo de ordenação da busca -> atributo correspondente em `DocumentMeta`
+CAMPOS_ORDENACAO = {
+    "denominacaoSocial": "fundo",
+    "CategoriaDescricao": "categoria",
+    "tipoDescricao": "tipo",
+    "especieDocumento": "especie",
+    "dataReferencia": "datahora_referencia",
+    "dataEntrega": "datahora_entrega",
+    "situacaoDocumento": "situacao",
+    "versao": "versao",
+    "modalidade": "modalidade",
+}
 
 
 def parse_certificado_descricao(value):
@@ -30,6 +51,32 @@ def assert_in(nome_variavel, valor, valores_possiveis):
         raise ValueError(f"Valor inválido para `{nome_variavel}`: {repr(valor)} (esperado: {valores})")
 
 
+def particiona_periodo(inicio: datetime.date, fim: datetime.date, dias: int):
+    """Divide o período (inclusivo) em intervalos consecutivos de até `dias` dias
+
+    >>> particiona_periodo(datetime.date(2024, 1, 1), datetime.date(2024, 1, 10), 4)
+    [(datetime.date(2024, 1, 1), datetime.date(2024, 1, 4)), (datetime.date(2024, 1, 5), datetime.date(2024, 1, 8)), (datetime.date(2024, 1, 9), datetime.date(2024, 1, 10))]
+    """
+    intervalos = []
+    while inicio <= fim:
+        fim_intervalo = min(inicio + datetime.timedelta(days=dias - 1), fim)
+        intervalos.append((inicio, fim_intervalo))
+        inicio = fim_intervalo + datetime.timedelta(days=1)
+    return intervalos
+
+
+def decodifica_xml(content: bytes) -> str:
+    """Decodifica um XML usando o encoding declarado na primeira linha (ou UTF-8, caso não exista)
+
+    >>> decodifica_xml('<?xml version="1.0" encoding="iso-8859-1"?>\\n<a>ção</a>'.encode("iso-8859-1"))
+    '<?xml version="1.0" encoding="iso-8859-1"?>\\n<a>ção</a>'
+    """
+    first_line = content.split(b"\n", maxsplit=1)[0].decode("ascii")
+    result = REGEXP_XML_ENCODING.findall(first_line)
+    encoding = result[0] if result else "utf-8"
+    return content.decode(encoding)
+
+
 def format_document_path(pattern: str, doc: DocumentMeta, content_type: str):
     doc_id = int(doc.id)
     doc_id8 = f"{int(doc_id):08d}"
@@ -61,6 +108,130 @@ def format_document_path(pattern: str, doc: DocumentMeta, content_type: str):
     )
 
 
+def arquivo_baixado(pasta: Path, modelo: str, documento: DocumentMeta) -> Path | None:
+    """Procura, em `pasta`, o arquivo de um documento já baixado usando o modelo de nome `modelo`
+
+    Como a extensão depende do `Content-Type` (conhecido apenas após a requisição), qualquer extensão é aceita - exceto
+    `.part`, usada nos downloads não finalizados.
+    """
+    base = Path(pasta) / format_document_path(modelo, documento, None)
+    if base.exists():
+        return base
+    for filename in base.parent.glob(f"{glob.escape(base.name)}.*"):
+        if filename.suffix != ".part":
+            return filename
+    return None
+
+
+@dataclass
+class ResultadoDownload:
+    documento_id: int
+    url: str
+    situacao: str  # "baixado", "existente" ou "falha"
+    arquivo: Path = None
+    erro: str = None
+
+    serialize = serializa_dataclass
+
+
+class EstadoSincronizacao:
+    """Guarda, em um arquivo SQLite, o que já foi sincronizado do FundosNet
+
+    São guardados a marca d'água (`datahora_entrega` até a qual todos os documentos já foram processados) e os pares
+    `(id, versao)` dos documentos já processados, separados por `chave` (para que buscas com filtros diferentes não
+    compartilhem o estado).
+    """
+
+    def __init__(self, filename: Path | str, chave: str = ""):
+        self.filename = Path(filename)
+        self.filename.parent.mkdir(parents=True, exist_ok=True)
+        self.chave = chave
+        self._busca_concluida = None  # `(mais_recente, entregues)` da última busca de `FundosNet.sincroniza`
+        self.conexao = sqlite3.connect(self.filename)
+        self.conexao.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS marca_dagua (
+                chave TEXT PRIMARY KEY,
+                datahora_entrega TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS documento_visto (
+                chave TEXT NOT NULL,
+                id INTEGER NOT NULL,
+                versao INTEGER NOT NULL,
+                PRIMARY KEY (chave, id, versao)
+            );
+            """
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.conexao.commit()
+        self.conexao.close()
+
+    def marca_dagua(self) -> datetime.datetime | None:
+        """`datahora_entrega` até a qual todos os documentos foram processados (ou `None`, caso ainda não exista)"""
+        row = self.conexao.execute("SELECT datahora_entrega FROM marca_dagua WHERE chave = ?", (self.chave,)).fetchone()
+        return datetime.datetime.fromisoformat(row[0]) if row else None
+
+    def visto(self, documento: DocumentMeta) -> bool:
+        row = self.conexao.execute(
+            "SELECT 1 FROM documento_visto WHERE chave = ? AND id = ? AND versao = ?",
+            (self.chave, documento.id, documento.versao),
+        ).fetchone()
+        return row is not None
+
+    def registra(self, documento: DocumentMeta):
+        """Registra o documento como processado (use `commit` para persistir)
+
+        A marca d'água não é alterada aqui: ela só avança em `finaliza`, pois os documentos chegam fora de ordem de
+        entrega e um documento registrado não garante que os anteriores também tenham sido.
+        """
+        self.conexao.execute(
+            "INSERT OR IGNORE INTO documento_visto (chave, id, versao) VALUES (?, ?, ?)",
+            (self.chave, documento.id, documento.versao),
+        )
+
+    def avanca_marca_dagua(self, datahora_entrega: datetime.datetime):
+        """Altera a marca d'água para `datahora_entrega`, caso seja maior que a atual (use `commit` para persistir)"""
+        marca = self.marca_dagua()
+        if marca is None or datahora_entrega > marca:
+            self.conexao.execute(
+                "INSERT OR REPLACE INTO marca_dagua (chave, datahora_entrega) VALUES (?, ?)",
+                (self.chave, datahora_entrega.isoformat()),
+            )
+
+    def _conclui_busca(self, mais_recente: datetime.datetime | None, entregues: list[DocumentMeta]):
+        self._busca_concluida = (mais_recente, entregues)
+
+    def finaliza(self):
+        """Avança a marca d'água de acordo com a última busca concluída de `FundosNet.sincroniza` e persiste o estado
+
+        A marca d'água vai até o documento mais recente encontrado ou, caso algum documento devolvido ainda não tenha
+        sido registrado, até o mais antigo deles (para que seja buscado novamente na próxima sincronização). Caso a
+        busca não tenha sido concluída, a marca d'água não muda.
+        """
+        if self._busca_concluida is not None:
+            mais_recente, entregues = self._busca_concluida
+            self._busca_concluida = None
+            pendentes = [
+                documento.datahora_entrega
+                for documento in entregues
+                if documento.datahora_entrega is not None and not self.visto(documento)
+            ]
+            nova_marca = min(pendentes) if pendentes else mais_recente
+            if nova_marca is not None:
+                self.avanca_marca_dagua(nova_marca)
+        self.commit()
+
+    def commit(self):
+        self.conexao.commit()
+
+
 # TODO: implementar crawler/parser para antes de 2016
 # <https://cvmweb.cvm.gov.br/SWB/Sistemas/SCW/CPublica/ResultListaPartic.aspx?TPConsulta=9>
 
@@ -73,33 +244,36 @@ class FundosNet:
 
     base_url = "https://fnet.bmfbovespa.com.br/fnet/publico/"
 
-    def __init__(self, timeout=5, verify_ssl=False):
+    def __init__(self, timeout=5, verify_ssl=False, concorrencia_adaptativa=False):
+        """
+        :param concorrencia_adaptativa: caso `True`, as requisições simultâneas ao FundosNet (de todas as instâncias)
+        são limitadas por `LIMITADOR_CONCORRENCIA`, que se ajusta aos erros 5xx/429, timeouts e à latência
+        """
         self.timeout = timeout
         self.verify_ssl = verify_ssl
+        self.concorrencia_adaptativa = concorrencia_adaptativa
         self.session = create_session()
+        if concorrencia_adaptativa:
+            self.session.limitador_concorrencia = LIMITADOR_CONCORRENCIA
         self.session.headers["CSRFToken"] = self.csrf_token
         self.draw = 0
 
     def baixa_xml(self, url, timeout=10.0, max_tries=5, wait_between_errors=0.5):
         """Baixa um XML do FundosNet a partir da URL e decodifica-o corretamente
 
-        Serão feitas, no total, `max_tries` tentativas, pois em alguns casos a CloudFlare retorna um erro HTTP 5xx.
+        Serão feitas, no total, até `max_tries` tentativas (ver `PoliticaRetentativas`), pois em alguns casos a
+        CloudFlare retorna um erro HTTP 5xx.
         """
-        tried = 0
-        while tried < max_tries:
-            # Forçar o cabeçalho `Accept` faz com que a resposta não seja enviada em base64
-            response = self.session.get(url, headers={"Accept": "application/xhtml+xml"}, timeout=timeout)
-            tried += 1
-            if response.status_code < 500:
-                break
-            else:
-                time.sleep(wait_between_errors)
+        # Forçar o cabeçalho `Accept` faz com que a resposta não seja enviada em base64
+        response = self.session.get(
+            url,
+            headers={"Accept": "application/xhtml+xml"},
+            timeout=timeout,
+            tentativas=max_tries,
+            espera_minima=wait_between_errors,
+        )
         response.raise_for_status()
-        content = response.content
-        first_line = content.split(b"\n", maxsplit=1)[0].decode("ascii")
-        result = REGEXP_XML_ENCODING.findall(first_line)
-        encoding = result[0] if result else "utf-8"
-        return content.decode(encoding)
+        return decodifica_xml(response.content)
 
     def request(self, method, path, headers=None, params=None, data=None, json=None, xhr=False):
         params = params or {}
@@ -221,8 +395,7 @@ class FundosNet:
             else:
                 break
 
-    # TODO: unify search methods
-    def search(
+    def _parametros_busca(
         self,
         category="Todos",
         type_="Todos",
@@ -233,9 +406,8 @@ class FundosNet:
         end_date=None,
         ordering_field="dataEntrega",
         order="desc",
-        items_per_page=200,
     ):
-        # TODO: traduzir parâmetros e nome do método para Português
+        """Valida os filtros de `search` e monta os parâmetros da requisição de busca"""
         order_choices = ("asc", "desc")
         ordering_field_choices = (
             "denominacaoSocial",
@@ -286,6 +458,62 @@ class FundosNet:
             params["cnpj"] = params["cnpjFundo"] = cnpj
         if situacao:
             params["situacao"] = situacao
+        return params
+
+    # TODO: unify search methods
+    def search(
+        self,
+        category="Todos",
+        type_="Todos",
+        fund_type="Todos",
+        cnpj=None,
+        situacao=None,
+        start_date=None,
+        end_date=None,
+        ordering_field="dataEntrega",
+        order="desc",
+        items_per_page=200,
+        max_workers=1,
+        dias_por_intervalo=None,
+    ):
+        """Busca documentos publicados
+
+        Caso `max_workers > 1` (ou `dias_por_intervalo` seja informado) e o período esteja definido por `start_date` e
+        `end_date`, o período é dividido em intervalos de `dias_por_intervalo` dias (padrão: 31), que são buscados em
+        paralelo - cada thread com sua própria instância de `FundosNet` (sessão, token CSRF e contador `draw`). Os
+        resultados são devolvidos na ordenação pedida e sem documentos repetidos.
+        """
+        # TODO: traduzir parâmetros e nome do método para Português
+        particionar = max_workers > 1 or dias_por_intervalo is not None
+        if particionar and start_date is not None and end_date is not None:
+            yield from self._busca_particionada(
+                filtros={
+                    "category": category,
+                    "type_": type_,
+                    "fund_type": fund_type,
+                    "cnpj": cnpj,
+                    "situacao": situacao,
+                },
+                start_date=start_date,
+                end_date=end_date,
+                ordering_field=ordering_field,
+                order=order,
+                items_per_page=items_per_page,
+                max_workers=max_workers,
+                dias_por_intervalo=dias_por_intervalo or 31,
+            )
+            return
+        params = self._parametros_busca(
+            category=category,
+            type_=type_,
+            fund_type=fund_type,
+            cnpj=cnpj,
+            situacao=situacao,
+            start_date=start_date,
+            end_date=end_date,
+            ordering_field=ordering_field,
+            order=order,
+        )
         result = self.paginate(
             path="pesquisarGerenciadorDocumentosDados",
             params=params,
@@ -295,6 +523,170 @@ class FundosNet:
         for row in result:
             yield DocumentMeta.from_json(row)
 
+    def _busca_particionada(
+        self, filtros, start_date, end_date, ordering_field, order, items_per_page, max_workers, dias_por_intervalo
+    ):
+        order = str(order or "").strip().lower()
+        self._parametros_busca(ordering_field=ordering_field, order=order, **filtros)  # Valida antes de começar
+        intervalos = particiona_periodo(start_date, end_date, dias_por_intervalo)
+        por_data_entrega = ordering_field == "dataEntrega"
+        if por_data_entrega and order == "desc":
+            intervalos.reverse()
+        locais = threading.local()
+
+        def busca_intervalo(intervalo):
+            if max_workers <= 1:
+                fnet = self
+            else:
+                fnet = getattr(locais, "fnet", None)
+                if fnet is None:
+                    fnet = locais.fnet = FundosNet(
+                        timeout=self.timeout,
+                        verify_ssl=self.verify_ssl,
+                        concorrencia_adaptativa=self.concorrencia_adaptativa,
+                    )
+            resultado = fnet.search(
+                start_date=intervalo[0],
+                end_date=intervalo[1],
+                ordering_field=ordering_field,
+                order=order,
+                items_per_page=items_per_page,
+                **filtros,
+            )
+            return list(resultado)
+
+        resultados = mapeia_em_paralelo(busca_intervalo, intervalos, max_workers=max_workers)
+        if por_data_entrega:
+            # Os intervalos não se sobrepõem, então basta concatená-los na ordem certa
+            documentos = chain.from_iterable(resultados)
+        else:
+            atributo = CAMPOS_ORDENACAO[ordering_field]
+
+            def chave(doc):
+                valor = getattr(doc, atributo)
+                return (valor is not None, valor)
+
+            documentos = heapq.merge(*resultados, key=chave, reverse=order == "desc")
+        vistos = set()
+        for documento in documentos:
+            if documento.id not in vistos:
+                vistos.add(documento.id)
+                yield documento
+
+    def sincroniza(
+        self,
+        estado: EstadoSincronizacao,
+        start_date: datetime.date = None,
+        end_date: datetime.date = None,
+        sobreposicao: datetime.timedelta = datetime.timedelta(days=1),
+        commit_a_cada: int = 1000,
+        confirma: bool = True,
+        **filtros,
+    ):
+        """Busca apenas os documentos novos (ou com nova versão) desde a última sincronização
+
+        A busca começa na marca d'água de `estado` menos `sobreposicao` (para pegar documentos entregues com atraso)
+        ou em `start_date`, caso ainda não exista marca d'água. Os documentos já vistos são descartados e os demais são
+        devolvidos. Os demais parâmetros são repassados para `search`.
+
+        Um documento só é registrado em `estado` depois de processado e a marca d'água só avança em `estado.finaliza`,
+        depois que a busca termina. Com `confirma=True`, o documento é registrado quando o próximo é pedido (se quem
+        consome parar no meio, o documento atual não é registrado) e `estado.finaliza` é chamado ao final. Com
+        `confirma=False` (útil quando o processamento é feito em paralelo, como em `baixa_documentos`), quem consome
+        deve chamar `estado.registra(documento)` para cada documento processado e `estado.finaliza()` quando todos
+        tiverem sido processados.
+        """
+        marca = estado.marca_dagua()
+        if marca is not None:
+            start_date = (marca - sobreposicao).date()
+        if end_date is None:
+            end_date = datetime.datetime.now().date()
+        novos, entregues, mais_recente = 0, [], None
+        for documento in self.search(start_date=start_date, end_date=end_date, **filtros):
+            if documento.datahora_entrega is not None and (
+                mais_recente is None or documento.datahora_entrega > mais_recente
+            ):
+                mais_recente = documento.datahora_entrega
+            if estado.visto(documento):
+                continue
+            yield documento
+            if confirma:
+                estado.registra(documento)
+            else:
+                entregues.append(documento)
+            novos += 1
+            if novos % commit_a_cada == 0:
+                estado.commit()  # Persiste apenas os documentos registrados (a marca d'água não mudou)
+        estado._conclui_busca(mais_recente, entregues)
+        if confirma:
+            estado.finaliza()
+
+    def baixa_documentos(
+        self,
+        documentos,
+        pasta: Path | str,
+        modelo: str = "{doc_id}{extension}",
+        max_workers: int = 4,
+        arquivo_falhas: Path | str = None,
+        timeout: float = 60,
+        estado: EstadoSincronizacao = None,
+    ):
+        """Baixa os arquivos dos `documentos` (iterável de `DocumentMeta`) em `pasta`, devolvendo `ResultadoDownload`s
+
+        Documentos que já possuem arquivo na pasta (ver `arquivo_baixado`) não são baixados novamente, então o processo
+        pode ser interrompido e retomado. Cada arquivo é escrito aos poucos em `<nome>.part` e renomeado apenas quando
+        completo. Caso `arquivo_falhas` seja informado, os documentos que não puderam ser baixados nesta execução são
+        listados nesse CSV (que é sobrescrito).
+
+        Caso `estado` seja informado (e `documentos` venha de `sincroniza(estado, confirma=False)`), apenas os documentos
+        baixados (ou já existentes) são registrados como processados (os que falharam são devolvidos novamente na
+        próxima sincronização) e, depois que todos os downloads terminam, `estado.finaliza()` avança a marca d'água.
+        """
+        pasta = Path(pasta)
+
+        def baixa(documento):
+            existente = arquivo_baixado(pasta, modelo, documento)
+            if existente is not None:
+                return documento, ResultadoDownload(documento.id, documento.url, "existente", arquivo=existente)
+            try:
+                with self.session.get(documento.url, stream=True, verify=self.verify_ssl, timeout=timeout) as response:
+                    response.raise_for_status()
+                    content_type = response.headers.get("Content-Type")
+                    filename = pasta / format_document_path(modelo, documento, content_type)
+                    filename.parent.mkdir(parents=True, exist_ok=True)
+                    parcial = filename.with_name(f"{filename.name}.part")
+                    with parcial.open(mode="wb") as fobj:
+                        salva_resposta(response, fobj)
+                parcial.replace(filename)
+            except (requests.RequestException, OSError) as exc:
+                erro = f"{type(exc).__name__}: {exc}"
+                return documento, ResultadoDownload(documento.id, documento.url, "falha", erro=erro)
+            return documento, ResultadoDownload(documento.id, documento.url, "baixado", arquivo=filename)
+
+        falhas_fobj = writer = None
+        if arquivo_falhas is not None:
+            arquivo_falhas = Path(arquivo_falhas)
+            arquivo_falhas.parent.mkdir(parents=True, exist_ok=True)
+            falhas_fobj = arquivo_falhas.open(mode="w")
+        try:
+            for documento, resultado in mapeia_em_paralelo(baixa, documentos, max_workers=max_workers):
+                if resultado.situacao != "falha" and estado is not None:
+                    estado.registra(documento)
+                if resultado.situacao == "falha" and falhas_fobj is not None:
+                    if writer is None:
+                        writer = csv.DictWriter(falhas_fobj, fieldnames=["documento_id", "url", "erro"])
+                        writer.writeheader()
+                    writer.writerow(
+                        {"documento_id": resultado.documento_id, "url": resultado.url, "erro": resultado.erro}
+                    )
+                    falhas_fobj.flush()
+                yield resultado
+            if estado is not None:
+                estado.finaliza()
+        finally:
+            if falhas_fobj is not None:
+                falhas_fobj.close()
+
     def search_certificate(
         self,
         start_date=None,
@@ -337,11 +729,11 @@ class FundosNet:
 
 if __name__ == "__main__":
     import argparse
-    import csv
-    from dataclasses import asdict
-    from pathlib import Path
+    import sys
 
-    from .utils import day_range, parse_iso_date
+    from .exportacao import Exportador
+    from .instrumentacao import adiciona_argumentos_estatisticas, finaliza_estatisticas, inicia_estatisticas
+    from .utils import parse_iso_date
 
     modelos_nomes_arquivos = {
         "id": "{doc_id}{extension}",
@@ -390,14 +782,47 @@ if __name__ == "__main__":
         metavar="",
         help="Filtra pelo tipo de documento",
     )
-    parser.add_argument("csv_filename", type=Path, help="Arquivo CSV com os documentos encontrados")
+    parser.add_argument(
+        "--workers", "-w", type=int, default=1, help="Quantidade de intervalos de datas buscados em paralelo"
+    )
+    parser.add_argument(
+        "--dias-por-intervalo", type=int, default=31, help="Tamanho (em dias) de cada intervalo de datas da busca"
+    )
+    parser.add_argument("--workers-download", type=int, default=4, help="Quantidade de documentos baixados em paralelo")
+    parser.add_argument(
+        "--concorrencia-adaptativa",
+        action="store_true",
+        help=(
+            "Ajusta a quantidade de requisições simultâneas de acordo com os erros e a latência do FundosNet (mostra "
+            "os limites e latências ao final)"
+        ),
+    )
+    adiciona_argumentos_estatisticas(parser)
+    parser.add_argument(
+        "--arquivo-falhas",
+        type=Path,
+        help=(
+            "CSV onde são listados os documentos que não puderam ser baixados nesta execução (padrão: falhas.csv na "
+            "pasta)"
+        ),
+    )
+    parser.add_argument(
+        "--sincronizar",
+        "-s",
+        type=Path,
+        help=(
+            "Arquivo SQLite com o estado da sincronização: se especificado, a busca começa a partir do último "
+            "documento já visto (ignorando `--data-inicial`) e apenas documentos novos ou com nova versão são salvos"
+        ),
+    )
+    parser.add_argument(
+        "csv_filename",
+        type=Path,
+        help="Arquivo com os documentos encontrados (.csv, .tsv ou .jsonl, com .gz ou .zst opcional)",
+    )
     args = parser.parse_args()
+    inicia_estatisticas(args)
     data_inicial, data_final = args.data_inicial, args.data_final
-    datas_a_pesquisar = [
-        dia
-        for dia in day_range(data_inicial, data_final + datetime.timedelta(days=1))
-        if dia.day == 1 or dia in (data_inicial, data_final)
-    ]
     modelo_nome_arquivo = modelos_nomes_arquivos[args.modelo_nome_arquivo]
     download_path = args.download_path
     if download_path:
@@ -410,24 +835,44 @@ if __name__ == "__main__":
     if args.tipo:
         filters["type_"] = args.tipo
 
-    fnet = FundosNet()
-    with csv_filename.open(mode="w") as csv_fobj:
-        writer = None
-        for inicio, fim in zip(datas_a_pesquisar, datas_a_pesquisar[1:]):
-            fim = fim - datetime.timedelta(days=1) if fim != data_final else fim
-            filters["start_date"] = inicio  # TODO: renomear parâmetro para Português
-            filters["end_date"] = fim  # TODO: renomear parâmetro para Português
+    fnet = FundosNet(concorrencia_adaptativa=args.concorrencia_adaptativa)
+    estado = None
+    if args.sincronizar:
+        estado = EstadoSincronizacao(args.sincronizar, chave=f"{args.categoria or ''}|{args.tipo or ''}")
+    with Exportador(csv_filename) as exportador:
+        filters["start_date"] = data_inicial  # TODO: renomear parâmetro para Português
+        filters["end_date"] = data_final  # TODO: renomear parâmetro para Português
+        filters["max_workers"] = args.workers
+        filters["dias_por_intervalo"] = args.dias_por_intervalo
+        if estado is not None:
+            # Com download, o documento só é registrado como processado depois de baixado (em `baixa_documentos`)
+            resultado = fnet.sincroniza(estado, confirma=not download_path, **filters)
+        else:
             resultado = fnet.search(**filters)
-            for documento in resultado:
-                row = asdict(documento)
-                if writer is None:
-                    writer = csv.DictWriter(csv_fobj, fieldnames=list(row.keys()))
-                    writer.writeheader()
-                writer.writerow(row)
-                if download_path:
-                    response = fnet.session.get(documento.url, verify=False)
-                    content_type = response.headers.get("Content-Type")
-                    filename = download_path / Path(format_document_path(modelo_nome_arquivo, documento, content_type))
-                    filename.parent.mkdir(parents=True, exist_ok=True)
-                    with filename.open(mode="wb") as fobj:
-                        fobj.write(response.content)
+
+        def salva_documentos(documentos):
+            for documento in documentos:
+                exportador.escreve(documento)
+                yield documento
+
+        documentos = salva_documentos(resultado)
+        if not download_path:
+            for _ in documentos:
+                pass
+        else:
+            downloads = fnet.baixa_documentos(
+                documentos,
+                pasta=download_path,
+                modelo=modelo_nome_arquivo,
+                max_workers=args.workers_download,
+                arquivo_falhas=args.arquivo_falhas or download_path / "falhas.csv",
+                estado=estado,
+            )
+            falhas = sum(1 for download in downloads if download.situacao == "falha")
+            if falhas:
+                print(f"{falhas} documento(s) não puderam ser baixados (execute novamente para tentar baixá-los)")
+    if estado is not None:
+        estado.close()
+    if args.concorrencia_adaptativa:
+        print(LIMITADOR_CONCORRENCIA.relatorio(), file=sys.stderr)
+    finaliza_estatisticas(args)
@@ -0,0 +1,600 @@
+"""Instrumentação das requisições HTTP feitas pelos clientes (métricas por endpoint e spans)
+
+Todas as sessões criadas por `create_session` (usadas por `B3`, `CVM`, `RAD`, `FundosNet`, `BancoCentral` etc.) medem
+cada chamada de `request` e a repassam para os coletores registrados em `INSTRUMENTACAO`: duração (incluindo as
+retentativas e suas esperas), status da resposta, quantidade de tentativas e bytes enviados/recebidos. `CacheHTTP`
+informa também os acertos e faltas do cache. Sem coletores registrados (o padrão), nada é medido.
+
+Coletores disponíveis (outros podem ser criados herdando de `Coletor`):
+
+- `RegistroMetricas`: histogramas de latência e contadores por host/endpoint/método, mantidos em memória e exportados
+  no formato texto do Prometheus (`prometheus` e `escreve_prometheus`, este para o "textfile collector" do
+  node_exporter);
+- `ColetorSpans`: spans no modelo do OpenTelemetry (trace/span ids, início/fim em nanossegundos, atributos com as
+  convenções semânticas de HTTP), que podem ser agrupados em spans próprios com `INSTRUMENTACAO.span`.
+
+Exemplo:
+
+    metricas = RegistroMetricas()
+    INSTRUMENTACAO.adiciona(metricas)
+    with INSTRUMENTACAO.span("negociacao-bolsa"):
+        list(B3().negociacao_bolsa("dia", data))
+    print(metricas.prometheus())
+
+Nas respostas com `stream=True`, a duração vai até o recebimento dos cabeçalhos e os bytes recebidos são os do
+`Content-Length` (quando informado).
+
+`ETAPAS` (`EstatisticasEtapas`) mede, separadamente, o tempo de download, descompressão, conversão e escrita dos
+comandos executados com `--stats` (ver `adiciona_argumentos_estatisticas`).
+"""
+
+import contextlib
+import contextvars
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from urllib.parse import urlparse
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+REGEXP_PARAMETRO_URL = re.compile(r"^(?:[0-9]+|[0-9a-fA-F-]{16,}|(?=[^/]*[0-9=])[A-Za-z0-9+_=-]{24,})$")
+_SPAN_ATUAL = contextvars.ContextVar("span_atual", default=None)
+
+
+def endpoint(url: str) -> str:
+    """Caminho de `url` sem a query string e com os segmentos variáveis (números, hashes e parâmetros em base64, como
+    os dos proxies da B3) trocados por `{param}`, para que as métricas sejam agrupadas por endpoint
+
+    >>> endpoint("https://sistemaswebb3-listados.b3.com.br/fundsProxy/fundsCall/GetListedFundsSIG/eyJsYW5ndWFnZSI6InB0LWJyIn0=")
+    '/fundsProxy/fundsCall/GetListedFundsSIG/{param}'
+    >>> endpoint("https://fnet.bmfbovespa.com.br/fnet/publico/exibirDocumento?id=123")
+    '/fnet/publico/exibirDocumento'
+    >>> endpoint("https://dados.cvm.gov.br/dados/FI/DOC/INF_DIARIO/DADOS/inf_diario_fi_202401.zip")
+    '/dados/FI/DOC/INF_DIARIO/DADOS/inf_diario_fi_202401.zip'
+    >>> endpoint("https://api.bcb.gov.br/dados/serie/bcdata.sgs.12/dados")
+    '/dados/serie/bcdata.sgs.12/dados'
+    >>> endpoint("https://exemplo.com.br")
+    '/'
+    """
+    segmentos = urlparse(url).path.split("/")
+    return "/".join("{param}" if REGEXP_PARAMETRO_URL.match(segmento) else segmento for segmento in segmentos) or "/"
+
+
+def _novo_id(bytes_: int) -> str:
+    return os.urandom(bytes_).hex()
+
+
+@dataclass
+class Span:
+    """Operação medida, no modelo de spans do OpenTelemetry (ver `como_dict`)"""
+
+    nome: str
+    trace_id: str
+    span_id: str
+    span_pai_id: str | None
+    inicio: float  # Segundos desde a época (`time.time()`)
+    fim: float | None = None
+    tipo: str = "INTERNAL"  # "INTERNAL" ou "CLIENT" (requisições HTTP)
+    atributos: dict = field(default_factory=dict)
+    erro: str | None = None
+
+    def como_dict(self) -> dict:
+        """Representação no formato JSON do OTLP (com os atributos como dicionário)"""
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.span_pai_id or "",
+            "name": self.nome,
+            "kind": f"SPAN_KIND_{self.tipo}",
+            "startTimeUnixNano": int(self.inicio * 1e9),
+            "endTimeUnixNano": int((self.fim if self.fim is not None else self.inicio) * 1e9),
+            "attributes": self.atributos,
+            "status": (
+                {"code": "STATUS_CODE_ERROR", "message": self.erro}
+                if self.erro is not None
+                else {"code": "STATUS_CODE_UNSET"}
+            ),
+        }
+
+
+@dataclass
+class MedicaoRequisicao:
+    """Resultado de uma chamada a `Sessao.request` (todas as tentativas feitas pela `PoliticaRetentativas`)"""
+
+    metodo: str
+    url: str
+    host: str
+    endpoint: str
+    span: Span
+    duracao: float = 0.0
+    status: int | None = None
+    tentativas: int = 0
+    bytes_enviados: int = 0
+    bytes_recebidos: int = 0
+    erro: str | None = None  # Nome da exceção, caso nenhuma resposta tenha sido obtida
+    relogio_inicio: float = field(default=0.0, repr=False)  # `time.perf_counter()` no início
+
+
+class Coletor:
+    """Recebe as medições de `Instrumentacao` (os métodos podem ser chamados de várias threads ao mesmo tempo)"""
+
+    def requisicao(self, medicao: MedicaoRequisicao):
+        pass
+
+    def cache(self, url: str, resultado: str):
+        """`resultado` é "hit" (arquivo reutilizado sem consultar o servidor), "revalidado" (servidor respondeu 304),
+        "obsoleto" (servidor indisponível, cópia em cache reutilizada) ou "miss" (arquivo baixado)"""
+        pass
+
+    def span(self, span: Span):
+        pass
+
+
+def _tamanho_corpo(corpo) -> int:
+    if corpo is None:
+        return 0
+    elif isinstance(corpo, (bytes, str)):
+        return len(corpo)
+    return 0  # Geradores/arquivos: tamanho desconhecido
+
+
+class Instrumentacao:
+    """Repassa as medições das sessões para os coletores registrados (ver a documentação do módulo)"""
+
+    def __init__(self):
+        self.coletores = []
+        self._lock = threading.Lock()
+
+    def adiciona(self, coletor: Coletor) -> Coletor:
+        with self._lock:
+            self.coletores = self.coletores + [coletor]  # Cópia: as threads podem estar percorrendo a lista atual
+        return coletor
+
+    def remove(self, coletor: Coletor):
+        with self._lock:
+            self.coletores = [item for item in self.coletores if item is not coletor]
+
+    @property
+    def ativa(self) -> bool:
+        return bool(self.coletores)
+
+    def _novo_span(self, nome: str, tipo: str, atributos: dict) -> Span:
+        pai = _SPAN_ATUAL.get()
+        return Span(
+            nome=nome,
+            trace_id=pai.trace_id if pai is not None else _novo_id(16),
+            span_id=_novo_id(8),
+            span_pai_id=pai.span_id if pai is not None else None,
+            inicio=time.time(),
+            tipo=tipo,
+            atributos=atributos,
+        )
+
+    @contextlib.contextmanager
+    def span(self, nome: str, **atributos):
+        """Agrupa as requisições (e outros spans) feitas dentro do bloco `with` num span chamado `nome`
+
+        O span atual é propagado para as threads de `mapeia_em_paralelo`.
+        """
+        span = self._novo_span(nome, "INTERNAL", atributos)
+        token = _SPAN_ATUAL.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.erro = type(exc).__name__
+            raise
+        finally:
+            _SPAN_ATUAL.reset(token)
+            span.fim = time.time()
+            for coletor in self.coletores:
+                coletor.span(span)
+
+    def inicia(self, metodo: str, url: str) -> MedicaoRequisicao:
+        metodo = metodo.upper()
+        caminho = endpoint(url)
+        host = urlparse(url).netloc
+        atributos = {"http.request.method": metodo, "url.full": url, "server.address": host, "url.template": caminho}
+        span = self._novo_span(f"{metodo} {caminho}", "CLIENT", atributos)
+        return MedicaoRequisicao(metodo, url, host, caminho, span, relogio_inicio=time.perf_counter())
+
+    def finaliza(self, medicao: MedicaoRequisicao, response=None, erro: BaseException = None, stream: bool = False):
+        medicao.duracao = time.perf_counter() - medicao.relogio_inicio
+        span = medicao.span
+        span.fim = span.inicio + medicao.duracao
+        if response is not None:
+            medicao.status = response.status_code
+            medicao.bytes_enviados = _tamanho_corpo(response.request.body if response.request is not None else None)
+            tamanho = response.headers.get("Content-Length", "")
+            if tamanho.isdigit():
+                medicao.bytes_recebidos = int(tamanho)
+            elif not stream:
+                medicao.bytes_recebidos = len(response.content)
+            span.atributos["http.response.status_code"] = medicao.status
+            span.atributos["http.response.body.size"] = medicao.bytes_recebidos
+            if medicao.status >= 400:
+                span.erro = str(medicao.status)
+        if erro is not None:
+            medicao.erro = span.erro = type(erro).__name__
+            span.atributos["error.type"] = medicao.erro
+        if medicao.tentativas > 1:
+            span.atributos["http.request.resend_count"] = medicao.tentativas - 1
+        for coletor in self.coletores:
+            coletor.requisicao(medicao)
+            coletor.span(span)
+
+    def cache(self, url: str, resultado: str):
+        for coletor in self.coletores:
+            coletor.cache(url, resultado)
+
+
+INSTRUMENTACAO = Instrumentacao()
+
+
+class HistogramaEndpoint:
+    """Métricas acumuladas de um (host, endpoint, método)"""
+
+    def __init__(self, buckets):
+        self.buckets = [0] * len(buckets)  # Não cumulativos (acumulados apenas na exportação)
+        self.quantidade = 0
+        self.soma = 0.0
+        self.status = Counter()  # Status HTTP (ou nome da exceção) -> quantidade
+        self.retentativas = 0
+        self.bytes_enviados = 0
+        self.bytes_recebidos = 0
+
+
+def _escapa_rotulo(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _rotulos(**rotulos) -> str:
+    return "{" + ",".join(f'{chave}="{_escapa_rotulo(valor)}"' for chave, valor in rotulos.items()) + "}"
+
+
+class RegistroMetricas(Coletor):
+    """Histogramas de latência e contadores de status, retentativas, bytes e cache, mantidos em memória"""
+
+    def __init__(self, buckets=BUCKETS_LATENCIA, prefixo: str = "mercados"):
+        self.buckets = tuple(buckets)
+        self.prefixo = prefixo
+        self._endpoints = {}
+        self._cache = Counter()
+        self._lock = threading.Lock()
+
+    def requisicao(self, medicao: MedicaoRequisicao):
+        chave = (medicao.host, medicao.endpoint, medicao.metodo)
+        with self._lock:
+            histograma = self._endpoints.get(chave)
+            if histograma is None:
+                histograma = self._endpoints[chave] = HistogramaEndpoint(self.buckets)
+            for indice, limite in enumerate(self.buckets):
+                if medicao.duracao <= limite:
+                    histograma.buckets[indice] += 1
+                    break
+            histograma.quantidade += 1
+            histograma.soma += medicao.duracao
+            histograma.status[str(medicao.status) if medicao.status is not None else medicao.erro] += 1
+            histograma.retentativas += max(0, medicao.tentativas - 1)
+            histograma.bytes_enviados += medicao.bytes_enviados
+            histograma.bytes_recebidos += medicao.bytes_recebidos
+
+    def cache(self, url: str, resultado: str):
+        with self._lock:
+            self._cache[resultado] += 1
+
+    def limpa(self):
+        with self._lock:
+            self._endpoints.clear()
+            self._cache.clear()
+
+    def metricas(self) -> dict:
+        """Métricas por endpoint (do que tomou mais tempo no total para o que tomou menos) e contadores do cache"""
+        with self._lock:
+            endpoints = [
+                {
+                    "host": host,
+                    "endpoint": caminho,
+                    "metodo": metodo,
+                    "requisicoes": histograma.quantidade,
+                    "segundos": histograma.soma,
+                    "media": histograma.soma / histograma.quantidade,
+                    "status": dict(histograma.status),
+                    "retentativas": histograma.retentativas,
+                    "bytes_enviados": histograma.bytes_enviados,
+                    "bytes_recebidos": histograma.bytes_recebidos,
+                    "buckets": dict(zip(self.buckets, histograma.buckets)),
+                }
+                for (host, caminho, metodo), histograma in self._endpoints.items()
+            ]
+            cache = dict(self._cache)
+        endpoints.sort(key=lambda item: item["segundos"], reverse=True)
+        return {"endpoints": endpoints, "cache": cache}
+
+    def prometheus(self) -> str:
+        """Métricas no formato texto de exposição do Prometheus"""
+        nome = self.prefixo
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            cache = sorted(self._cache.items())
+            linhas = [
+                f"# HELP {nome}_http_requisicao_segundos Duração das requisições HTTP (incluindo as retentativas)",
+                f"# TYPE {nome}_http_requisicao_segundos histogram",
+            ]
+            for (host, caminho, metodo), histograma in endpoints:
+                acumulado = 0
+                for limite, quantidade in zip(self.buckets, histograma.buckets):
+                    acumulado += quantidade
+                    rotulos = _rotulos(host=host, endpoint=caminho, metodo=metodo, le=repr(float(limite)))
+                    linhas.append(f"{nome}_http_requisicao_segundos_bucket{rotulos} {acumulado}")
+                rotulos = _rotulos(host=host, endpoint=caminho, metodo=metodo, le="+Inf")
+                linhas.append(f"{nome}_http_requisicao_segundos_bucket{rotulos} {histograma.quantidade}")
+                rotulos = _rotulos(host=host, endpoint=caminho, metodo=metodo)
+                linhas.append(f"{nome}_http_requisicao_segundos_sum{rotulos} {histograma.soma!r}")
+                linhas.append(f"{nome}_http_requisicao_segundos_count{rotulos} {histograma.quantidade}")
+            contadores = (
+                ("http_respostas_total", "Requisições por status HTTP (ou exceção, quando não houve resposta)", None),
+                ("http_retentativas_total", "Tentativas repetidas pela política de retentativas", "retentativas"),
+                ("http_bytes_enviados_total", "Bytes enviados no corpo das requisições", "bytes_enviados"),
+                ("http_bytes_recebidos_total", "Bytes recebidos no corpo das respostas", "bytes_recebidos"),
+            )
+            for sufixo, descricao, atributo in contadores:
+                linhas.append(f"# HELP {nome}_{sufixo} {descricao}")
+                linhas.append(f"# TYPE {nome}_{sufixo} counter")
+                for (host, caminho, metodo), histograma in endpoints:
+                    if atributo is not None:
+                        rotulos = _rotulos(host=host, endpoint=caminho, metodo=metodo)
+                        linhas.append(f"{nome}_{sufixo}{rotulos} {getattr(histograma, atributo)}")
+                        continue
+                    for status, quantidade in sorted(histograma.status.items()):
+                        rotulos = _rotulos(host=host, endpoint=caminho, metodo=metodo, status=status)
+                        linhas.append(f"{nome}_{sufixo}{rotulos} {quantidade}")
+            linhas.append(f"# HELP {nome}_cache_total Arquivos solicitados ao CacheHTTP por resultado")
+            linhas.append(f"# TYPE {nome}_cache_total counter")
+            for resultado, quantidade in cache:
+                linhas.append(f"{nome}_cache_total{_rotulos(resultado=resultado)} {quantidade}")
+        return "\n".join(linhas) + "\n"
+
+    def escreve_prometheus(self, filename: Path | str):
+        """Escreve `prometheus()` em `filename` de forma atômica (para o "textfile collector" do node_exporter)"""
+        filename = Path(filename)
+        filename.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(mode="w", dir=filename.parent, prefix=".tmp-", delete=False) as temp:
+            temp.write(self.prometheus())
+        os.replace(temp.name, filename)
+
+
+class ColetorSpans(Coletor):
+    """Guarda os últimos `limite` spans finalizados e, caso `exporta` seja informada, chama-a com cada um deles (como
+    dicionário no formato do OTLP, ver `Span.como_dict`)"""
+
+    def __init__(self, limite: int = 10_000, exporta=None):
+        self.spans = deque(maxlen=limite)
+        self.exporta = exporta
+
+    def span(self, span: Span):
+        self.spans.append(span)
+        if self.exporta is not None:
+            self.exporta(span.como_dict())
+
+
+ETAPAS_PADRAO = ("download", "descompressao", "conversao", "escrita", "espera")
+
+
+class EstatisticasEtapas:
+    """Tempo de relógio e de CPU, registros e bytes de cada etapa do processamento (usado pela opção `--stats`)
+
+    As etapas são marcadas com `etapa` (ou `arquivo`, para as leituras de um arquivo) e o tempo é contado de forma
+    exclusiva: o tempo de uma etapa aninhada (como o download de um trecho do ZIP remoto feito durante a descompressão)
+    é descontado da etapa externa. Entre `inicia` e `finaliza`, o tempo da thread principal que não está em nenhuma
+    outra etapa é contado em "conversao" (leitura dos registros, `from_line`/`from_dict` etc.), assim como o das
+    tarefas executadas por `mapeia_em_paralelo` (enquanto a thread principal aguarda os resultados, o tempo é contado em
+    "espera"). O tempo de CPU é o da thread (`time.thread_time`), então com várias threads os tempos das etapas são
+    somados e podem ultrapassar o tempo total. Fora de `inicia`/`finaliza`, nada é medido.
+    """
+
+    def __init__(self):
+        self.ativa = False
+        self._totais = {}
+        self._inicio = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _pilha(self) -> list:
+        pilha = getattr(self._local, "pilha", None)
+        if pilha is None:
+            pilha = self._local.pilha = []
+        return pilha
+
+    def _entra(self, nome: str):
+        self._pilha().append([nome, time.perf_counter(), time.thread_time(), 0.0, 0.0])
+
+    def _sai(self):
+        pilha = self._pilha()
+        nome, inicio, inicio_cpu, filhos, filhos_cpu = pilha.pop()
+        tempo, cpu = time.perf_counter() - inicio, time.thread_time() - inicio_cpu
+        if pilha:
+            pilha[-1][3] += tempo
+            pilha[-1][4] += cpu
+        self.conta(nome, tempo=tempo - filhos, cpu=cpu - filhos_cpu)
+
+    def conta(self, nome: str, registros: int = 0, bytes_: int = 0, tempo: float = 0.0, cpu: float = 0.0):
+        """Acumula registros, bytes e/ou tempos na etapa `nome`"""
+        if not self.ativa:
+            return
+        with self._lock:
+            totais = self._totais.get(nome)
+            if totais is None:
+                totais = self._totais[nome] = [0.0, 0.0, 0, 0]
+            totais[0] += tempo
+            totais[1] += cpu
+            totais[2] += registros
+            totais[3] += bytes_
+
+    @contextlib.contextmanager
+    def etapa(self, nome: str):
+        """Conta o tempo do bloco `with` na etapa `nome`"""
+        if not self.ativa:
+            yield
+            return
+        self._entra(nome)
+        try:
+            yield
+        finally:
+            self._sai()
+
+    def envolve(self, funcao, nome: str = "conversao"):
+        """Devolve uma função que executa `funcao` dentro da etapa `nome` (ou a própria `funcao`, caso inativa)"""
+        if not self.ativa:
+            return funcao
+
+        def envolvida(*args, **kwargs):
+            with self.etapa(nome):
+                return funcao(*args, **kwargs)
+
+        return envolvida
+
+    def arquivo(self, fobj, nome: str = "descompressao"):
+        """Envolve um arquivo binário (como um membro de ZIP) para que as leituras sejam contadas na etapa `nome`"""
+        return ArquivoMedido(fobj, self, nome) if self.ativa else fobj
+
+    def inicia(self):
+        """Zera as estatísticas e começa a contar (o tempo da thread atual fora das outras etapas vai para "conversao")"""
+        with self._lock:
+            self._totais = {}
+        self._local.pilha = []
+        self._inicio = (time.perf_counter(), time.process_time())
+        self.ativa = True
+        self._entra("conversao")
+
+    def finaliza(self) -> dict:
+        """Para de contar e devolve o tempo total, o tempo de CPU do processo (e de processos filhos, como os de
+        `informe_diario_fundo_periodo`), o pico de memória e, para cada etapa, tempo, CPU, registros, bytes e taxas"""
+        self._sai()
+        self.ativa = False
+        tempo = time.perf_counter() - self._inicio[0]
+        resultado = {
+            "tempo": tempo,
+            "cpu": time.process_time() - self._inicio[1],
+            "cpu_processos_filhos": None,
+            "memoria_maxima": None,
+            "etapas": {},
+        }
+        if resource is not None:
+            resultado["cpu_processos_filhos"] = sum(resource.getrusage(resource.RUSAGE_CHILDREN)[:2])
+            # `ru_maxrss` é dado em KiB no Linux e em bytes no macOS
+            fator = 1 if sys.platform == "darwin" else 1024
+            resultado["memoria_maxima"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * fator
+        with self._lock:
+            totais = dict(self._totais)
+        nomes = [nome for nome in ETAPAS_PADRAO if nome in totais] + sorted(set(totais) - set(ETAPAS_PADRAO))
+        for nome in nomes:
+            tempo_etapa, cpu, registros, bytes_ = totais[nome]
+            resultado["etapas"][nome] = {
+                "tempo": tempo_etapa,
+                "cpu": cpu,
+                "registros": registros,
+                "bytes": bytes_,
+                "registros_por_segundo": registros / tempo_etapa if registros and tempo_etapa > 0 else None,
+                "bytes_por_segundo": bytes_ / tempo_etapa if bytes_ and tempo_etapa > 0 else None,
+            }
+        return resultado
+
+
+class ArquivoMedido(io.BufferedIOBase):
+    """Arquivo binário somente leitura cujas leituras são contadas numa etapa de `EstatisticasEtapas`"""
+
+    def __init__(self, fobj, etapas: EstatisticasEtapas, nome: str):
+        self._fobj = fobj
+        self._etapas = etapas
+        self._nome = nome
+
+    def readable(self):
+        return True
+
+    def _le(self, metodo, tamanho):
+        with self._etapas.etapa(self._nome):
+            dados = metodo(tamanho)
+        self._etapas.conta(self._nome, bytes_=len(dados))
+        return dados
+
+    def read(self, tamanho=-1):
+        return self._le(self._fobj.read, tamanho)
+
+    def read1(self, tamanho=-1):
+        return self._le(getattr(self._fobj, "read1", self._fobj.read), tamanho)
+
+    def close(self):
+        self._fobj.close()
+        super().close()
+
+
+ETAPAS = EstatisticasEtapas()
+
+
+def _formata_bytes(valor) -> str:
+    for unidade in ("B", "KiB", "MiB", "GiB"):
+        if abs(valor) < 1024 or unidade == "GiB":
+            return f"{valor:.1f} {unidade}" if unidade != "B" else f"{valor:.0f} B"
+        valor /= 1024
+
+
+def formata_estatisticas(estatisticas: dict) -> str:
+    """Tabela (texto) com o resultado de `EstatisticasEtapas.finaliza`"""
+    linhas = [
+        f"{'etapa':<14} {'tempo (s)':>10} {'CPU (s)':>9} {'registros':>11} {'bytes':>11} {'reg/s':>11} {'bytes/s':>12}"
+    ]
+    for nome, etapa in estatisticas["etapas"].items():
+        registros_s = f"{etapa['registros_por_segundo']:,.0f}" if etapa["registros_por_segundo"] else "-"
+        bytes_s = f"{_formata_bytes(etapa['bytes_por_segundo'])}/s" if etapa["bytes_por_segundo"] else "-"
+        linhas.append(
+            f"{nome:<14} {etapa['tempo']:>10.3f} {etapa['cpu']:>9.3f} {etapa['registros'] or '-':>11} "
+            f"{_formata_bytes(etapa['bytes']) if etapa['bytes'] else '-':>11} {registros_s:>11} {bytes_s:>12}"
+        )
+    total = f"total: {estatisticas['tempo']:.3f}s, CPU {estatisticas['cpu']:.3f}s"
+    if estatisticas["cpu_processos_filhos"]:
+        total += f" (+ {estatisticas['cpu_processos_filhos']:.3f}s em processos filhos)"
+    if estatisticas["memoria_maxima"] is not None:
+        total += f", pico de memória {_formata_bytes(estatisticas['memoria_maxima'])}"
+    linhas.append(total)
+    return "\n".join(linhas)
+
+
+def adiciona_argumentos_estatisticas(parser):
+    """Adiciona as opções `--stats` e `--stats-json` ao `argparse.ArgumentParser` de uma linha de comando"""
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Mostra ao final (na saída de erro) o tempo, CPU, registros/s e bytes/s de cada etapa e o pico de memória",
+    )
+    parser.add_argument("--stats-json", type=Path, help="Salva as estatísticas de `--stats` neste arquivo JSON")
+
+
+def inicia_estatisticas(args):
+    """Começa a medir as etapas caso `--stats` ou `--stats-json` tenham sido passados"""
+    if args.stats or args.stats_json:
+        ETAPAS.inicia()
+
+
+def finaliza_estatisticas(args, comando: str = None):
+    """Mostra (`--stats`) e/ou salva (`--stats-json`) as estatísticas iniciadas em `inicia_estatisticas`"""
+    if not ETAPAS.ativa:
+        return
+    estatisticas = {"comando": comando, "argumentos": sys.argv[1:], **ETAPAS.finaliza()}
+    if args.stats:
+        print(formata_estatisticas(estatisticas), file=sys.stderr)
+    if args.stats_json:
+        args.stats_json.parent.mkdir(parents=True, exist_ok=True)
+        with args.stats_json.open(mode="w") as fobj:
+            json.dump(estatisticas, fobj, indent=2)
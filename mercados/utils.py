@@ -1,18 +1,34 @@
+import asyncio
+import contextvars
 import csv
 import datetime
+import hashlib
 import io
+import json
+import os
+import random
 import re
 import socket
 import subprocess
+import tempfile
+import threading
+import time
+import typing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from dataclasses import fields as dataclass_fields
 from decimal import Decimal
 from functools import lru_cache
 from pathlib import Path
 from unicodedata import normalize
+from urllib.parse import urlparse
 
 import requests
 import requests.packages.urllib3.util.connection as urllib3_connection
-from requests.adapters import HTTPAdapter, Retry
+from requests.adapters import HTTPAdapter
+
+from .instrumentacao import ETAPAS, INSTRUMENTACAO, Instrumentacao
 
 urllib3_connection.allowed_gai_family = lambda: socket.AF_INET  # Force requests to use IPv4
 MONTHS = "janeiro fevereiro março abril maio junho julho agosto setembro outubro novembro dezembro".split()
@@ -32,6 +48,9 @@ REGEXP_SEPARATOR = re.compile("(_+)")
 REGEXP_WORD_BOUNDARY = re.compile(r"(\w\b)")
 REGEXP_ATTACHMENT_FILENAME = re.compile("""^attachment; filename=['"]?(.*?)["']?$""")
 BRT = datetime.timezone(-datetime.timedelta(hours=3))
+TAMANHO_CHUNK_DOWNLOAD = 256 * 1024
+TAMANHO_DOWNLOAD_EM_MEMORIA = 16 * 1024 * 1024  # Acima disso, o arquivo baixado vai para o disco
+TAMANHO_BLOCO_REMOTO = 1024 * 1024  # Mínimo baixado por requisição `Range` em `abre_arquivo_remoto`
 
 
 @lru_cache(maxsize=1024)
@@ -66,6 +85,18 @@ def day_range(start, stop):
         current += one_day
 
 
+def meses(inicio: datetime.date, fim: datetime.date):
+    """Primeiro dia de cada mês entre `inicio` e `fim` (inclusive; os dias das datas são ignorados)
+
+    >>> [data.isoformat() for data in meses(datetime.date(2023, 11, 15), datetime.date(2024, 2, 1))]
+    ['2023-11-01', '2023-12-01', '2024-01-01', '2024-02-01']
+    """
+    atual, fim = inicio.replace(day=1), fim.replace(day=1)
+    while atual <= fim:
+        yield atual
+        atual = (atual.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
 def dicts_to_str(data: list[dict], fmt: str):
     """Convert a list of dictionaries to a string representation in a specific format.
 
@@ -171,18 +202,554 @@ def slug(text, separator="_", permitted_chars="ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefg
     return text.strip(separator)
 
 
-def create_session():
+class LimitadorTaxa:
+    """Limita a quantidade de requisições por segundo feitas a cada host (compartilhado entre threads)"""
+
+    def __init__(self, requisicoes_por_segundo: float):
+        self.intervalo = 1.0 / requisicoes_por_segundo
+        self._proxima = {}
+        self._lock = threading.Lock()
+
+    def aguarda(self, url: str):
+        host = urlparse(url).netloc
+        with self._lock:
+            agora = time.monotonic()
+            proxima = max(self._proxima.get(host, agora), agora)
+            self._proxima[host] = proxima + self.intervalo
+        espera = proxima - agora
+        if espera > 0:
+            time.sleep(espera)
+
+
+STATUS_RETENTAVEIS = frozenset((429, 500, 502, 503, 504, 520, 521, 522, 523, 524))  # 52x: erros da CloudFlare
+METODOS_IDEMPOTENTES = frozenset(("GET", "HEAD", "OPTIONS", "PUT", "DELETE"))
+
+
+class CircuitoAberto(requests.exceptions.ConnectionError):
+    """O host falhou seguidamente e, por algum tempo, as requisições a ele são recusadas sem acessar a rede"""
+
+
+class EstadoHost:
+    """Orçamento de retentativas e estado do circuito de um host (ver `PoliticaRetentativas`)"""
+
+    def __init__(self, orcamento: float):
+        self.lock = threading.Lock()
+        self.orcamento = orcamento
+        self.falhas_consecutivas = 0
+        self.aberto_ate = None  # `time.monotonic()` até quando o circuito fica aberto
+        self.testando = False  # Circuito meio-aberto: uma requisição de teste está em andamento
+
+
+class PoliticaRetentativas:
+    """Retentativas com espera exponencial aleatória ("decorrelated jitter"), orçamento de retentativas e circuit
+    breaker, por host e compartilhados entre threads e clientes (`POLITICA_RETENTATIVAS` é usada por todas as sessões)
+
+    - São repetidas as respostas com status em `STATUS_RETENTAVEIS` e, nos métodos idempotentes, os erros de conexão e
+      timeouts. A espera antes de cada nova tentativa é sorteada entre `espera_minima` e 3x a espera anterior (limitada
+      a `espera_maxima` e respeitando o cabeçalho `Retry-After`), para que os workers não repitam todos ao mesmo tempo.
+    - Cada requisição acrescenta `proporcao_orcamento` ao orçamento do host (limitado a `orcamento_maximo`) e cada
+      retentativa consome 1: com o host degradado, as retentativas ficam limitadas a essa proporção das requisições.
+    - Após `limite_falhas` falhas seguidas, o circuito do host abre e, por `tempo_aberto` segundos, as requisições falham
+      imediatamente com `CircuitoAberto`. Depois disso, uma requisição de teste é liberada: caso funcione, o circuito
+      fecha; caso contrário, abre novamente.
+
+    Os clientes assíncronos (`mercados.assincrono`) usam a mesma política por meio de `executa_assincrono`.
+    """
+
+    def __init__(
+        self,
+        tentativas: int = 5,
+        espera_minima: float = 0.5,
+        espera_maxima: float = 20.0,
+        proporcao_orcamento: float = 0.2,
+        orcamento_maximo: float = 10.0,
+        limite_falhas: int = 10,
+        tempo_aberto: float = 30.0,
+    ):
+        self.tentativas = tentativas
+        self.espera_minima = espera_minima
+        self.espera_maxima = espera_maxima
+        self.proporcao_orcamento = proporcao_orcamento
+        self.orcamento_maximo = orcamento_maximo
+        self.limite_falhas = limite_falhas
+        self.tempo_aberto = tempo_aberto
+        self.aleatorio = random.Random()
+        self.dorme = time.sleep
+        self.dorme_assincrono = asyncio.sleep
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def estado(self, host: str) -> EstadoHost:
+        with self._lock:
+            estado = self._hosts.get(host)
+            if estado is None:
+                estado = self._hosts[host] = EstadoHost(self.orcamento_maximo)
+            return estado
+
+    def _libera(self, host: str, estado: EstadoHost):
+        with estado.lock:
+            if estado.aberto_ate is None:
+                return
+            if estado.testando or time.monotonic() < estado.aberto_ate:
+                raise CircuitoAberto(f"Requisições para {host} suspensas após {estado.falhas_consecutivas} falhas")
+            estado.testando = True
+
+    def _registra(self, estado: EstadoHost, sucesso: bool):
+        with estado.lock:
+            meio_aberto, estado.testando = estado.testando, False
+            if sucesso:
+                estado.falhas_consecutivas, estado.aberto_ate = 0, None
+                return
+            estado.falhas_consecutivas += 1
+            if meio_aberto or estado.falhas_consecutivas >= self.limite_falhas:
+                estado.aberto_ate = time.monotonic() + self.tempo_aberto
+
+    def _pode_repetir(self, estado: EstadoHost) -> bool:
+        with estado.lock:
+            if estado.orcamento < 1:
+                return False
+            estado.orcamento -= 1
+            return True
+
+    def _inicia(self, url: str):
+        host = urlparse(url).netloc
+        estado = self.estado(host)
+        with estado.lock:
+            estado.orcamento = min(self.orcamento_maximo, estado.orcamento + self.proporcao_orcamento)
+        return host, estado
+
+    def _repete_erro(self, estado: EstadoHost, method: str, ultima: bool) -> bool:
+        """Registra a falha de conexão/timeout e informa se a requisição deve ser repetida"""
+        self._registra(estado, sucesso=False)
+        return not ultima and method.upper() in METODOS_IDEMPOTENTES and self._pode_repetir(estado)
+
+    def _repete_resposta(self, estado: EstadoHost, response, ultima: bool):
+        """Registra a resposta e devolve `None`, caso não deva ser repetida, ou o tempo pedido em `Retry-After`"""
+        falhou = response.status_code in STATUS_RETENTAVEIS
+        self._registra(estado, sucesso=not falhou)
+        if not falhou or ultima or not self._pode_repetir(estado):
+            return None
+        valor = response.headers.get("Retry-After", "")
+        return int(valor) if valor.isdigit() else 0
+
+    def _proxima_espera(self, espera: float, espera_minima: float) -> float:
+        return min(self.espera_maxima, self.aleatorio.uniform(espera_minima, espera * 3))
+
+    def executa(self, method: str, url: str, requisita, tentativas: int = None, espera_minima: float = None):
+        """Chama `requisita()` (que faz a requisição `method` para `url`) até obter uma resposta que não precise ser
+        repetida, devolvendo a última resposta obtida ou levantando a última exceção quando as tentativas acabam"""
+        host, estado = self._inicia(url)
+        tentativas = tentativas or self.tentativas
+        espera_minima = self.espera_minima if espera_minima is None else espera_minima
+        espera = espera_minima
+        for tentativa in range(1, tentativas + 1):
+            self._libera(host, estado)
+            ultima = tentativa == tentativas
+            retry_after = 0
+            try:
+                response = requisita()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if not self._repete_erro(estado, method, ultima):
+                    raise
+            except BaseException:  # Outros erros não são repetidos, mas liberam a requisição de teste do circuito
+                self._registra(estado, sucesso=False)
+                raise
+            else:
+                retry_after = self._repete_resposta(estado, response, ultima)
+                if retry_after is None:
+                    return response
+                response.close()
+            espera = self._proxima_espera(espera, espera_minima)
+            self.dorme(min(self.espera_maxima, max(espera, retry_after)))
+
+    async def executa_assincrono(
+        self, method: str, url: str, requisita, erros, tentativas: int = None, espera_minima: float = None
+    ):
+        """Versão de `executa` para clientes assíncronos: `requisita()` devolve um awaitable e os erros de conexão e
+        timeouts (que dependem da biblioteca usada) são informados em `erros`. Orçamento e circuito são os mesmos."""
+        host, estado = self._inicia(url)
+        tentativas = tentativas or self.tentativas
+        espera_minima = self.espera_minima if espera_minima is None else espera_minima
+        espera = espera_minima
+        for tentativa in range(1, tentativas + 1):
+            self._libera(host, estado)
+            ultima = tentativa == tentativas
+            retry_after = 0
+            try:
+                response = await requisita()
+            except erros:
+                if not self._repete_erro(estado, method, ultima):
+                    raise
+            except BaseException:
+                self._registra(estado, sucesso=False)
+                raise
+            else:
+                retry_after = self._repete_resposta(estado, response, ultima)
+                if retry_after is None:
+                    return response
+            espera = self._proxima_espera(espera, espera_minima)
+            await self.dorme_assincrono(min(self.espera_maxima, max(espera, retry_after)))
+
+
+POLITICA_RETENTATIVAS = PoliticaRetentativas()
+
+
+def percentil(valores, p: float):
+    """Percentil `p` (0 a 100) de `valores` pelo método do posto mais próximo (`None` caso não haja valores)
+
+    >>> percentil([0.3, 0.1, 0.2, 0.4], 50)
+    0.2
+    >>> percentil(range(1, 101), 99)
+    99
+    >>> percentil([], 90) is None
+    True
+    """
+    ordenados = sorted(valores)
+    if not ordenados:
+        return None
+    posicao = max(0, -(-len(ordenados) * p // 100) - 1)  # Arredonda para cima
+    return ordenados[int(posicao)]
+
+
+@dataclass
+class EventoReducao:
+    """Redução do limite de requisições simultâneas de um host (ver `LimitadorConcorrencia`)"""
+
+    datahora: datetime.datetime
+    host: str
+    motivo: str
+    limite_anterior: float
+    limite: float
+
+
+class EstadoConcorrencia:
+    """Limite de requisições simultâneas, requisições em andamento e janela de latências/falhas de um host"""
+
+    def __init__(self, limite: float, janela: int):
+        self.condicao = threading.Condition()
+        self.limite = limite
+        self.em_andamento = 0
+        self.latencias = deque(maxlen=janela)  # Das respostas bem-sucedidas
+        self.falhas = deque(maxlen=janela)  # `True` para as requisições que falharam
+        self.requisicoes = 0
+        self.reducoes = 0
+        self.ultima_reducao = None
+
+
+class LimitadorConcorrencia:
+    """Limita a quantidade de requisições simultâneas a cada host, ajustando o limite com AIMD (aumento aditivo,
+    redução multiplicativa), compartilhado entre threads e clientes (`LIMITADOR_CONCORRENCIA`)
+
+    - As requisições que excedem o limite do host aguardam até que uma das que estão em andamento termine.
+    - Cada resposta bem-sucedida de uma requisição feita com o limite todo ocupado aumenta o limite em
+      `incremento / limite` (até `maximo`), ou seja, cerca de `incremento` a cada "rodada" de requisições, desde que a
+      taxa de falhas da janela esteja abaixo de `taxa_falhas_maxima` e a latência não passe de `tolerancia_latencia`
+      vezes o percentil 10 das latências da janela.
+    - Respostas com status em `STATUS_RETENTAVEIS` (5xx, 429), timeouts e erros de conexão multiplicam o limite por
+      `fator_reducao` (até `minimo`), no máximo uma vez a cada `intervalo_reducao` segundos (as falhas das requisições
+      que já estavam em andamento não reduzem o limite novamente). Cada redução é registrada em `eventos`.
+
+    O tempo medido é o da requisição até o recebimento da resposta (com `stream=True`, até os cabeçalhos): cada
+    tentativa feita pela `PoliticaRetentativas` ocupa uma vaga, mas a espera entre as tentativas não. Use
+    `estatisticas` para consultar os limites atuais, as latências e a taxa de falhas de cada host.
+    """
+
+    def __init__(
+        self,
+        inicial: float = 4,
+        minimo: float = 1,
+        maximo: float = 64,
+        incremento: float = 1.0,
+        fator_reducao: float = 0.5,
+        tolerancia_latencia: float = 3.0,
+        taxa_falhas_maxima: float = 0.05,
+        intervalo_reducao: float = 1.0,
+        janela: int = 200,
+    ):
+        self.inicial = inicial
+        self.minimo = minimo
+        self.maximo = maximo
+        self.incremento = incremento
+        self.fator_reducao = fator_reducao
+        self.tolerancia_latencia = tolerancia_latencia
+        self.taxa_falhas_maxima = taxa_falhas_maxima
+        self.intervalo_reducao = intervalo_reducao
+        self.janela = janela
+        self.relogio = time.monotonic
+        self.eventos = deque(maxlen=1000)
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def estado(self, host: str) -> EstadoConcorrencia:
+        with self._lock:
+            estado = self._hosts.get(host)
+            if estado is None:
+                estado = self._hosts[host] = EstadoConcorrencia(self.inicial, self.janela)
+            return estado
+
+    def _saudavel(self, estado: EstadoConcorrencia, latencia: float) -> bool:
+        if sum(estado.falhas) > self.taxa_falhas_maxima * len(estado.falhas):
+            return False
+        if len(estado.latencias) < 10:  # Poucas amostras para estimar a latência normal do host
+            return True
+        return latencia <= self.tolerancia_latencia * percentil(estado.latencias, 10)
+
+    def _registra(self, host: str, estado: EstadoConcorrencia, latencia: float, motivo: str, saturado: bool):
+        agora = self.relogio()
+        evento = None
+        with estado.condicao:
+            estado.em_andamento -= 1
+            estado.requisicoes += 1
+            estado.falhas.append(motivo is not None)
+            if motivo is None:
+                if saturado and self._saudavel(estado, latencia):
+                    estado.limite = min(self.maximo, estado.limite + self.incremento / estado.limite)
+                estado.latencias.append(latencia)
+            elif estado.ultima_reducao is None or agora - estado.ultima_reducao >= self.intervalo_reducao:
+                anterior = estado.limite
+                estado.limite = max(self.minimo, estado.limite * self.fator_reducao)
+                estado.ultima_reducao = agora
+                estado.reducoes += 1
+                evento = EventoReducao(datetime.datetime.now(tz=BRT), host, motivo, anterior, estado.limite)
+            estado.condicao.notify_all()
+        if evento is not None:
+            self.eventos.append(evento)
+
+    def executa(self, url: str, requisita):
+        """Aguarda uma vaga no host de `url`, chama `requisita()` e ajusta o limite do host de acordo com o resultado"""
+        host = urlparse(url).netloc
+        estado = self.estado(host)
+        with estado.condicao:
+            while estado.em_andamento >= int(estado.limite):
+                estado.condicao.wait()
+            estado.em_andamento += 1
+            saturado = estado.em_andamento >= int(estado.limite)
+        inicio = self.relogio()
+        try:
+            response = requisita()
+        except requests.exceptions.Timeout:
+            self._registra(host, estado, self.relogio() - inicio, "timeout", saturado)
+            raise
+        except requests.exceptions.ConnectionError:
+            self._registra(host, estado, self.relogio() - inicio, "erro de conexão", saturado)
+            raise
+        except BaseException:  # Erro que não indica sobrecarga do host: apenas libera a vaga
+            with estado.condicao:
+                estado.em_andamento -= 1
+                estado.condicao.notify_all()
+            raise
+        status = response.status_code
+        motivo = f"HTTP {status}" if status in STATUS_RETENTAVEIS else None
+        self._registra(host, estado, self.relogio() - inicio, motivo, saturado)
+        return response
+
+    def estatisticas(self) -> dict:
+        """Limite atual, requisições em andamento, reduções, taxa de falhas e percentis de latência (em segundos, da
+        janela mais recente) de cada host"""
+        with self._lock:
+            hosts = dict(self._hosts)
+        resultado = {}
+        for host, estado in sorted(hosts.items()):
+            with estado.condicao:
+                latencias, falhas = list(estado.latencias), list(estado.falhas)
+                resultado[host] = {
+                    "limite": int(estado.limite),
+                    "em_andamento": estado.em_andamento,
+                    "requisicoes": estado.requisicoes,
+                    "reducoes": estado.reducoes,
+                }
+            resultado[host]["taxa_falhas"] = sum(falhas) / len(falhas) if falhas else 0.0
+            for p in (50, 90, 99):
+                resultado[host][f"latencia_p{p}"] = percentil(latencias, p)
+        return resultado
+
+    def relatorio(self) -> str:
+        """Resumo textual de `estatisticas` e das últimas reduções de limite (para ser mostrado ao final dos comandos)"""
+        linhas = []
+        for host, stats in self.estatisticas().items():
+            latencias = "/".join(
+                "-" if stats[chave] is None else f"{stats[chave]:.3f}"
+                for chave in ("latencia_p50", "latencia_p90", "latencia_p99")
+            )
+            linhas.append(
+                f"{host}: limite {stats['limite']}, {stats['requisicoes']} requisições, "
+                f"{stats['taxa_falhas']:.1%} de falhas, {stats['reducoes']} reduções, latência p50/p90/p99 {latencias}s"
+            )
+        for evento in list(self.eventos)[-10:]:
+            linhas.append(
+                f"  {evento.datahora.isoformat(timespec='seconds')} {evento.host}: {evento.motivo}, limite "
+                f"{evento.limite_anterior:.1f} -> {evento.limite:.1f}"
+            )
+        return "\n".join(linhas)
+
+
+LIMITADOR_CONCORRENCIA = LimitadorConcorrencia()
+
+
+class Sessao(requests.Session):
+    """`requests.Session` usada por todos os clientes, permitindo controlar o ritmo das requisições por host
+
+    Os adaptadores (pools de conexões) montados por `RegistroConexoes` são compartilhados com as demais sessões e não
+    são fechados em `close`: apenas cabeçalhos e cookies são exclusivos de cada sessão. As requisições são repetidas de
+    acordo com `politica` (ver `PoliticaRetentativas`); `tentativas` e `espera_minima` podem ser alteradas em cada
+    chamada de `request`. Caso `limitador_concorrencia` seja definido, cada tentativa aguarda uma vaga no host (ver
+    `LimitadorConcorrencia`). Cada chamada de `request` é medida por `instrumentacao` (ver `mercados.instrumentacao`).
+    """
+
+    limitador_taxa: LimitadorTaxa = None
+    limitador_concorrencia: LimitadorConcorrencia = None
+    politica: PoliticaRetentativas = None
+    instrumentacao: Instrumentacao = None
+
+    def request(self, method, url, *args, tentativas: int = None, espera_minima: float = None, **kwargs):
+        instrumentacao = self.instrumentacao
+        medicao = instrumentacao.inicia(method, url) if instrumentacao is not None and instrumentacao.ativa else None
+
+        def envia():
+            if medicao is not None:
+                medicao.tentativas += 1
+            return super(Sessao, self).request(method, url, *args, **kwargs)
+
+        def requisita():
+            if self.limitador_taxa is not None:
+                self.limitador_taxa.aguarda(url)
+            if self.limitador_concorrencia is None:
+                return envia()
+            return self.limitador_concorrencia.executa(url, envia)
+
+        stream = kwargs.get("stream", False)
+        try:
+            with ETAPAS.etapa("download"):
+                if self.politica is None:
+                    response = requisita()
+                else:
+                    response = self.politica.executa(
+                        method, url, requisita, tentativas=tentativas, espera_minima=espera_minima
+                    )
+        except Exception as exc:
+            if medicao is not None:
+                instrumentacao.finaliza(medicao, erro=exc)
+            raise
+        if medicao is not None:
+            instrumentacao.finaliza(medicao, response=response, stream=stream)
+        if ETAPAS.ativa and not stream:  # Com `stream=True`, os bytes são contados ao ler o corpo (`salva_resposta`)
+            ETAPAS.conta("download", bytes_=len(response.content))
+        return response
+
+    def close(self):
+        for adaptador in self.adapters.values():
+            if not getattr(adaptador, "compartilhado", False):
+                adaptador.close()
+
+
+class RegistroConexoes:
+    """Adaptadores HTTP (e seus pools de conexões) compartilhados por todas as sessões criadas no processo
+
+    Sem o registro, cada cliente (`B3()`, `CVM()`, `FundosNet()` etc.) teria seus próprios pools e as conexões
+    (incluindo o handshake TLS) não seriam reaproveitadas entre eles. O tamanho dos pools pode ser alterado para todos
+    os hosts ou para um host específico (com `configura`), valendo para as sessões criadas a partir de então.
+
+    :param pool_connections: quantidade de hosts cujos pools são mantidos por adaptador
+    :param pool_maxsize: quantidade de conexões mantidas abertas para cada host (deve acompanhar a quantidade de
+    requisições simultâneas; as que excederem o limite são abertas e descartadas ao final)
+    """
+
+    def __init__(self, pool_connections: int = 16, pool_maxsize: int = 32):
+        self._configuracoes = {None: {"pool_connections": pool_connections, "pool_maxsize": pool_maxsize}}
+        self._adaptadores = {}
+        self._lock = threading.Lock()
+
+    def configura(self, host: str = None, pool_connections: int = None, pool_maxsize: int = None):
+        """Altera o tamanho dos pools de `host` (ex.: "arquivos.b3.com.br") ou, caso não seja informado, o padrão"""
+        with self._lock:
+            atual = self._configuracoes.get(host, self._configuracoes[None])
+            self._configuracoes[host] = {
+                "pool_connections": pool_connections or atual["pool_connections"],
+                "pool_maxsize": pool_maxsize or atual["pool_maxsize"],
+            }
+            self._adaptadores.pop(host, None)  # As próximas sessões recebem um adaptador com a nova configuração
+
+    def adaptador(self, host: str = None) -> HTTPAdapter:
+        with self._lock:
+            adaptador = self._adaptadores.get(host)
+            if adaptador is None:
+                configuracao = self._configuracoes.get(host, self._configuracoes[None])
+                # Sem retentativas no adaptador: são feitas pela `PoliticaRetentativas` da sessão
+                adaptador = HTTPAdapter(**configuracao)
+                adaptador.compartilhado = True
+                self._adaptadores[host] = adaptador
+            return adaptador
+
+    def monta(self, session: requests.Session):
+        """Monta na sessão os adaptadores compartilhados (o padrão e os dos hosts configurados)"""
+        with self._lock:
+            hosts = [host for host in self._configuracoes if host is not None]
+        padrao = self.adaptador()
+        session.mount("http://", padrao)
+        session.mount("https://", padrao)
+        for host in hosts:
+            adaptador = self.adaptador(host)
+            session.mount(f"http://{host}/", adaptador)
+            session.mount(f"https://{host}/", adaptador)
+
+
+REGISTRO_CONEXOES = RegistroConexoes()
+
+
+def mapeia_em_paralelo(funcao, itens, max_workers: int = 8):
+    """Aplica `funcao` a cada item usando até `max_workers` threads e devolve os resultados na ordem dos itens
+
+    Os itens são consumidos aos poucos (no máximo `2 * max_workers` ficam pendentes), então `itens` pode ser um
+    iterador longo ou infinito.
+
+    >>> list(mapeia_em_paralelo(lambda x: x * 2, range(5), max_workers=3))
+    [0, 2, 4, 6, 8]
+    """
+    if max_workers is None or max_workers <= 1:
+        yield from map(funcao, itens)
+        return
+    pendentes = deque()
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    funcao = ETAPAS.envolve(funcao)  # Com `--stats`, o tempo das tarefas nas threads conta como "conversao"
+
+    def aguarda():
+        with ETAPAS.etapa("espera"):
+            return pendentes.popleft().result()
+
+    try:
+        for item in itens:
+            # Cada tarefa roda numa cópia do contexto atual (propaga o span de `INSTRUMENTACAO.span`)
+            pendentes.append(executor.submit(contextvars.copy_context().run, funcao, item))
+            if len(pendentes) >= 2 * max_workers:
+                yield aguarda()
+        while pendentes:
+            yield aguarda()
+    finally:
+        for future in pendentes:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+CABECALHOS_PADRAO = {
+    "User-Agent": "Mozilla/5.0 mercados/python",
+    "Accept": "application/json,text/html,application/xhtml+xml,application/xml,application/pdf,text/csv,application/zip,application/x-zip-compressed",
+}
+
+
+def create_session(
+    registro: RegistroConexoes = None, politica: PoliticaRetentativas = None, instrumentacao: Instrumentacao = None
+):
+    """Cria uma sessão com cabeçalhos próprios, mas que usa os pools de conexões de `registro`, as retentativas de
+    `politica` e os coletores de métricas de `instrumentacao` (padrões: `REGISTRO_CONEXOES`, `POLITICA_RETENTATIVAS` e
+    `INSTRUMENTACAO`, compartilhados por todos os clientes)"""
     import urllib3  # noqa
 
     urllib3.disable_warnings()
-    session = requests.Session()
-    adapter = HTTPAdapter(max_retries=Retry(total=7, backoff_factor=0.1))
-    session.headers["User-Agent"] = "Mozilla/5.0 mercados/python"
-    session.headers["Accept"] = (
-        "application/json,text/html,application/xhtml+xml,application/xml,application/pdf,text/csv,application/zip,application/x-zip-compressed"
-    )
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
+    session = Sessao()
+    session.headers.update(CABECALHOS_PADRAO)
+    session.politica = politica or POLITICA_RETENTATIVAS
+    session.instrumentacao = instrumentacao or INSTRUMENTACAO
+    (registro or REGISTRO_CONEXOES).monta(session)
     return session
 
 
@@ -212,7 +779,14 @@ def parse_br_decimal(value):
     >>> print(parse_br_decimal(""))
     None
     """
-    value = str(value or "").strip()
+    if type(value) is str:
+        return _converte_br_decimal(value)
+    return _converte_br_decimal(str(value or ""))
+
+
+@lru_cache(maxsize=16 * 1024)
+def _converte_br_decimal(value: str):
+    value = value.strip()
     if not value:
         return None
     # TODO: melhorar mensagem de erro quando não consegue converter decimal (o valor original não é mostrado, o que
@@ -232,7 +806,14 @@ def parse_decimal(value):
     >>> print(parse_br_decimal(""))
     None
     """
-    value = str(value or "").strip()
+    if type(value) is str:
+        return _converte_decimal(value)
+    return _converte_decimal(str(value or ""))
+
+
+@lru_cache(maxsize=16 * 1024)
+def _converte_decimal(value: str):
+    value = value.strip()
     if not value:
         return None
     # TODO: melhorar mensagem de erro quando não consegue converter decimal (o valor original não é mostrado, o que
@@ -240,38 +821,108 @@ def parse_decimal(value):
     return Decimal(value.replace(",", ""))
 
 
-def parse_date(fmt, value, full=False):
-    value = str(value or "").strip()
-    if not value or value == "0001-01-01":
+# Formatos aceitos por `parse_date`: (prefixo adicionado ao valor, formato do `strptime`, tipo do objeto devolvido)
+FORMATOS_DATA = {
+    "1": ("01/01/", "%d/%m/%Y", "date"),
+    "2": ("01/", "%d/%m/%Y", "date"),
+    "3": ("", "%d/%m/%Y", "date"),
+    "br-date": ("", "%d/%m/%Y", "date"),
+    "4": ("", "%d/%m/%Y %H:%M", "datetime"),
+    "iso-datetime-tz": ("", None, "datetime"),  # `T` ou espaço separando data e hora
+    "iso-date": ("", "%Y-%m-%d", "date"),
+    "yyyymmdd": ("", "%Y%m%d", "date"),
+}
+
+
+def _data_rapida(fmt: str, value: str):
+    """Converte os casos mais comuns (dígitos nas posições esperadas) sem `strptime`; devolve `None` nos demais"""
+    if len(value) == 10 and fmt == "%Y-%m-%d" and value[4] == value[7] == "-":
+        ano, mes, dia = value[:4], value[5:7], value[8:]
+    elif len(value) == 10 and fmt == "%d/%m/%Y" and value[2] == value[5] == "/":
+        dia, mes, ano = value[:2], value[3:5], value[6:]
+    elif len(value) == 8 and fmt == "%Y%m%d":
+        ano, mes, dia = value[:4], value[4:6], value[6:]
+    else:
         return None
-    if fmt == "1":
-        value = f"01/01/{value}"
-        fmt = "%d/%m/%Y"
-        obj_type = "date"
-    elif fmt == "2":
-        value = f"01/{value}"
-        fmt = "%d/%m/%Y"
-        obj_type = "date"
-    elif fmt in ("3", "br-date"):
-        fmt = "%d/%m/%Y"
-        obj_type = "date"
-    elif fmt == "4":
-        fmt = "%d/%m/%Y %H:%M"
-        obj_type = "datetime"
-    elif fmt == "iso-datetime-tz":
-        if "T" in value:
-            fmt = "%Y-%m-%dT%H:%M:%S%z"
+    if not (ano.isdigit() and mes.isdigit() and dia.isdigit()):
+        return None
+    return datetime.datetime(int(ano), int(mes), int(dia), tzinfo=BRT)
+
+
+@lru_cache(maxsize=None)
+def conversor_data(fmt: str, full: bool = False):
+    """Gera (uma única vez por formato) a função que converte strings no formato `fmt` (ver `FORMATOS_DATA`)
+
+    O formato é resolvido apenas na criação e cada conversor guarda os últimos valores convertidos: em um arquivo, as
+    mesmas datas se repetem em milhares de linhas (um mês de informes diários tem ~22 datas distintas).
+
+    >>> converte = conversor_data("br-date")
+    >>> converte("02/01/2025"), converte(" 02/01/2025 "), converte("")
+    (datetime.date(2025, 1, 2), datetime.date(2025, 1, 2), None)
+    >>> conversor_data("iso-date", full=True)("2025-01-02")
+    datetime.datetime(2025, 1, 2, 0, 0, tzinfo=datetime.timezone(datetime.timedelta(days=-1, seconds=75600)))
+
+    Formatos que não estão em `FORMATOS_DATA` são usados diretamente no `strptime` (e devolvem `datetime`); valores
+    vazios são sempre `None`, qualquer que seja o formato:
+
+    >>> conversor_data("%d.%m.%Y")("02.01.2025").date(), conversor_data("")(""), conversor_data(None)(None)
+    (datetime.date(2025, 1, 2), None, None)
+    """
+    prefixo, formato, tipo = FORMATOS_DATA.get(fmt) or ("", fmt or "", "datetime")
+    devolve_data = tipo == "date" and not full
+
+    @lru_cache(maxsize=16 * 1024)
+    def converte_str(value: str):
+        value = value.strip()
+        if not value or value == "0001-01-01":
+            return None
+        value = prefixo + value
+        if formato is not None:
+            obj = _data_rapida(formato, value) or datetime.datetime.strptime(value, formato).replace(tzinfo=BRT)
         else:
-            fmt = "%Y-%m-%d %H:%M:%S%z"
-        obj_type = "datetime"
-    elif fmt == "iso-date":
-        fmt = "%Y-%m-%d"
-        obj_type = "date"
-    obj = datetime.datetime.strptime(value, fmt).replace(tzinfo=BRT)
-    if full or obj_type == "datetime":
-        return obj
-    elif obj_type == "date":
-        return obj.date()
+            obj = datetime.datetime.strptime(
+                value, "%Y-%m-%dT%H:%M:%S%z" if "T" in value else "%Y-%m-%d %H:%M:%S%z"
+            ).replace(tzinfo=BRT)
+        return obj.date() if devolve_data else obj
+
+    def converte(value):
+        return converte_str(value if type(value) is str else str(value or ""))
+
+    converte.cache_info = converte_str.cache_info
+    return converte
+
+
+def parse_date(fmt, value, full=False):
+    return conversor_data(fmt, full)(value)
+
+
+def converte_colunas(cabecalho: list[str], linhas, conversores: dict):
+    """Converte as `linhas` (sequências de strings, como as de `csv.reader`) coluna a coluna, devolvendo um dicionário
+    com a lista de valores convertidos de cada coluna (colunas sem conversor em `conversores` são mantidas)
+
+    Converter a coluna inteira evita criar um dicionário por linha e permite converter cada valor distinto uma única
+    vez (em um mês de informes diários, por exemplo, ~22 datas se repetem em centenas de milhares de linhas).
+    Como no `csv.DictReader`, linhas vazias são ignoradas e as linhas com menos campos que o cabeçalho são completadas
+    com `None`.
+
+    >>> converte_colunas(["data", "valor"], [["2025-01-02", "1,5"], ["2025-01-02"]], {"valor": parse_br_decimal})
+    {'data': ['2025-01-02', '2025-01-02'], 'valor': [Decimal('1.5'), None]}
+    """
+    quantidade = len(cabecalho)
+    linhas = [
+        linha if len(linha) == quantidade else (list(linha) + [None] * quantidade)[:quantidade]
+        for linha in linhas
+        if linha
+    ]
+    colunas = {}
+    for nome, valores in zip(cabecalho, zip(*linhas) if linhas else [()] * quantidade):
+        conversor = conversores.get(nome)
+        if conversor is None:
+            colunas[nome] = list(valores)
+        else:
+            convertidos = {valor: conversor(valor) for valor in set(valores)}
+            colunas[nome] = list(map(convertidos.__getitem__, valores))
+    return colunas
 
 
 def parse_iso_date(value):
@@ -499,14 +1150,423 @@ def clean_xml_dict(d):
     return result
 
 
+def salva_resposta(response, fobj, chunk_size=TAMANHO_CHUNK_DOWNLOAD):
+    """Escreve em `fobj` o conteúdo de uma resposta feita com `stream=True`, sem carregá-la inteira na memória"""
+    total = 0
+    with response, ETAPAS.etapa("download"):
+        for chunk in response.iter_content(chunk_size):
+            fobj.write(chunk)
+            total += len(chunk)
+    ETAPAS.conta("download", bytes_=total)
+
+
+def blocos_de_linhas(filename: Path | str, tamanho_bloco: int, inicio: int = 0) -> list[tuple[int, int]]:
+    """Divide o arquivo, a partir do byte `inicio`, em intervalos `(inicio, fim)` de ~`tamanho_bloco` bytes que
+    terminam sempre em uma quebra de linha (para que cada bloco possa ser lido de forma independente)
+
+    >>> import tempfile
+    >>> with tempfile.NamedTemporaryFile() as fobj:
+    ...     _ = fobj.write(b"a,b\\n1,2\\n3,4\\n5,6\\n")
+    ...     fobj.flush()
+    ...     blocos_de_linhas(fobj.name, 5, inicio=4)
+    [(4, 12), (12, 16)]
+    """
+    blocos = []
+    tamanho = os.path.getsize(filename)
+    with open(filename, mode="rb") as fobj:
+        while inicio < tamanho:
+            fobj.seek(min(inicio + tamanho_bloco, tamanho))
+            fobj.readline()
+            fim = fobj.tell()
+            blocos.append((inicio, fim))
+            inicio = fim
+    return blocos
+
+
 def download_files(urls: list[str], filenames: list[Path], quiet=False):
     session = create_session()
     for url, filename in zip(urls, filenames):
         filename = Path(filename)
-        filename.mkdir(parents=True, exist_ok=True)
-        response = session.get(url)
+        filename.parent.mkdir(parents=True, exist_ok=True)
+        response = session.get(url, stream=True)
         with filename.open(mode="wb") as fobj:
-            fobj.write(response.content)
+            salva_resposta(response, fobj)
+
+
+class CacheHTTP:
+    """Cache em disco para arquivos baixados via HTTP (como os ZIPs dos portais de dados abertos)
+
+    Cada URL é salva em `pasta` com o nome igual ao hash SHA-256 da URL, junto com um arquivo `.json` de metadados
+    (URL, ETag, Last-Modified e tamanho). Quando um arquivo já está no cache, o servidor é consultado com os cabeçalhos
+    `If-None-Match`/`If-Modified-Since` e o arquivo só é baixado novamente caso tenha sido alterado. Caso
+    `tamanho_maximo` (em bytes) seja especificado, os arquivos usados há mais tempo são removidos até que o total do
+    cache caiba no limite.
+    """
+
+    def __init__(self, pasta: Path | str, tamanho_maximo: int = None, revalidar: bool = True):
+        self.pasta = Path(pasta)
+        self.tamanho_maximo = tamanho_maximo
+        self.revalidar = revalidar
+        self.pasta.mkdir(parents=True, exist_ok=True)
+
+    def caminho(self, url: str) -> Path:
+        return self.pasta / hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def metadados(self, url: str) -> dict | None:
+        filename = self.caminho(url)
+        meta_filename = filename.with_suffix(".json")
+        if not filename.exists() or not meta_filename.exists():
+            return None
+        with meta_filename.open() as fobj:
+            return json.load(fobj)
+
+    def abre(self, session, url: str, **kwargs):
+        """Devolve um objeto de arquivo binário (aberto para leitura) com o conteúdo de `url`
+
+        O arquivo é baixado caso ainda não exista no cache ou tenha sido alterado no servidor. Respostas de erro e
+        respostas vazias não são salvas no cache (o conteúdo delas é devolvido diretamente).
+        """
+        filename = self.caminho(url)
+        meta = self.metadados(url)
+        if meta is not None and not self.revalidar:
+            return self._abre(filename, session, url, "hit")
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        if meta is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+            if "If-None-Match" not in headers and "If-Modified-Since" not in headers:
+                # Sem como revalidar: arquivos históricos não mudam, então reutilizamos o que já temos
+                return self._abre(filename, session, url, "hit")
+        try:
+            response = session.get(url, headers=headers, stream=True, **kwargs)
+        except requests.exceptions.RequestException:
+            if meta is None:
+                raise
+            # Servidor indisponível, mas temos uma cópia (possivelmente desatualizada)
+            return self._abre(filename, session, url, "obsoleto")
+        if response.status_code == 304 and meta is not None:
+            response.close()
+            return self._abre(filename, session, url, "revalidado")
+        self._registra(session, url, "miss")
+        if response.status_code != 200:
+            return io.BytesIO(response.content)
+
+        # Escreve em arquivo temporário e renomeia para que outro processo nunca leia um arquivo pela metade
+        temporario = self._temporario(lambda fobj: salva_resposta(response, fobj))
+        if os.stat(temporario).st_size == 0:
+            os.unlink(temporario)
+            return io.BytesIO(b"")
+        os.replace(temporario, filename)
+        meta = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "tamanho": filename.stat().st_size,
+        }
+        os.replace(self._temporario(lambda fobj: json.dump(meta, fobj), mode="w"), filename.with_suffix(".json"))
+        self._remove_excedente(manter=filename)
+        return filename.open(mode="rb")
+
+    def _temporario(self, escreve, mode="wb") -> str:
+        """Chama `escreve(fobj)` com um arquivo temporário na pasta do cache e devolve seu nome (em caso de erro, o
+        arquivo é removido antes de a exceção ser repassada)"""
+        temp = tempfile.NamedTemporaryFile(mode=mode, dir=self.pasta, prefix=".tmp-", delete=False)
+        try:
+            with temp:
+                escreve(temp)
+        except BaseException:
+            os.unlink(temp.name)
+            raise
+        return temp.name
+
+    def _abre(self, filename: Path, session, url: str, resultado: str):
+        self._registra(session, url, resultado)
+        # A data de modificação do arquivo é usada para saber quais foram usados há mais tempo (LRU)
+        os.utime(filename)
+        return filename.open(mode="rb")
+
+    def _registra(self, session, url: str, resultado: str):
+        instrumentacao = getattr(session, "instrumentacao", None)
+        if instrumentacao is not None and instrumentacao.ativa:
+            instrumentacao.cache(url, resultado)
+
+    def arquivos(self) -> list[Path]:
+        """Lista os arquivos em cache, do usado há mais tempo para o mais recente"""
+        filenames = [
+            filename
+            for filename in self.pasta.iterdir()
+            if filename.is_file() and not filename.suffix and not filename.name.startswith(".")
+        ]
+        return sorted(filenames, key=lambda filename: filename.stat().st_mtime)
+
+    def tamanho(self) -> int:
+        return sum(filename.stat().st_size for filename in self.arquivos())
+
+    def remove(self, filename: Path):
+        filename.with_suffix(".json").unlink(missing_ok=True)
+        filename.unlink(missing_ok=True)
+
+    def _remove_excedente(self, manter: Path = None):
+        if self.tamanho_maximo is None:
+            return
+        filenames = self.arquivos()
+        total = sum(filename.stat().st_size for filename in filenames)
+        for filename in filenames:
+            if total <= self.tamanho_maximo:
+                break
+            elif filename == manter:
+                continue
+            total -= filename.stat().st_size
+            self.remove(filename)
+
+    def limpa(self):
+        for filename in self.arquivos():
+            self.remove(filename)
+
+
+def baixa_arquivo(session, url: str, cache: CacheHTTP = None, **kwargs):
+    """Baixa `url` e devolve um objeto de arquivo binário, aberto para leitura, com o conteúdo da resposta
+
+    O download é feito em partes e escrito em um arquivo temporário (que fica em memória enquanto for pequeno), de
+    forma que o uso de memória não cresce com o tamanho do arquivo. Caso `cache` seja especificado, o arquivo é lido
+    (ou salvo) no cache em disco.
+    """
+    if cache is not None:
+        return cache.abre(session, url, **kwargs)
+    response = session.get(url, stream=True, **kwargs)
+    fobj = tempfile.SpooledTemporaryFile(max_size=TAMANHO_DOWNLOAD_EM_MEMORIA)
+    salva_resposta(response, fobj)
+    fobj.seek(0)
+    return fobj
+
+
+class ArquivoHTTP(io.RawIOBase):
+    """Arquivo remoto somente leitura, com o conteúdo baixado sob demanda usando requisições HTTP `Range`
+
+    Permite abrir um ZIP remoto com `zipfile.ZipFile` e ler apenas o diretório central (no fim do arquivo) e os bytes
+    comprimidos dos membros desejados, em vez de baixar o arquivo inteiro. Use `abre_arquivo_remoto`, que verifica se
+    o servidor aceita `Range` e adiciona um buffer (evitando uma requisição por leitura pequena).
+    """
+
+    def __init__(self, session, url: str, tamanho: int, **kwargs):
+        self.session = session
+        self.url = url
+        self.tamanho = tamanho
+        self.kwargs = kwargs
+        self.posicao = 0
+        self.requisicoes = 0
+        self.bytes_baixados = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.posicao
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.posicao = offset
+        elif whence == io.SEEK_CUR:
+            self.posicao += offset
+        elif whence == io.SEEK_END:
+            self.posicao = self.tamanho + offset
+        else:
+            raise ValueError(f"Valor inválido para `whence`: {repr(whence)}")
+        if self.posicao < 0:
+            raise ValueError("Posição negativa")
+        return self.posicao
+
+    def readinto(self, buffer):
+        if self.posicao >= self.tamanho or len(buffer) == 0:
+            return 0
+        fim = min(self.posicao + len(buffer), self.tamanho) - 1
+        response = self.session.get(self.url, headers={"Range": f"bytes={self.posicao}-{fim}"}, **self.kwargs)
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise RuntimeError(f"Servidor ignorou o cabeçalho Range (status {response.status_code}) para {self.url}")
+        dados = response.content
+        quantidade = len(dados)
+        buffer[:quantidade] = dados
+        self.posicao += quantidade
+        self.requisicoes += 1
+        self.bytes_baixados += quantidade
+        return quantidade
+
+
+def abre_arquivo_remoto(session, url: str, tamanho_bloco: int = None, **kwargs):
+    """Abre `url` como arquivo binário somente leitura baixado sob demanda (ver `ArquivoHTTP`)
+
+    Devolve `None` caso o servidor não aceite requisições `Range` (o arquivo então precisa ser baixado por inteiro,
+    com `baixa_arquivo`). Cada leitura que não estiver no buffer baixa ao menos `tamanho_bloco` bytes (padrão:
+    `TAMANHO_BLOCO_REMOTO`).
+    """
+    response = session.get(url, headers={"Range": "bytes=0-0"}, **kwargs)
+    content_range = response.headers.get("Content-Range", "")
+    if response.status_code != 206 or not content_range.startswith("bytes ") or content_range.endswith("/*"):
+        response.close()
+        return None
+    tamanho = int(content_range.rsplit("/", maxsplit=1)[1])
+    arquivo = ArquivoHTTP(session, url, tamanho, **kwargs)
+    return io.BufferedReader(arquivo, buffer_size=tamanho_bloco or TAMANHO_BLOCO_REMOTO)
+
+
+def versao_compacta(cls, nome: str = None):
+    """Cria uma cópia da dataclass `cls` usando `__slots__` (sem `__dict__` em cada objeto, ocupando menos memória)
+
+    A nova classe tem os mesmos campos, valores padrão e métodos (`from_dict`, `serialize` etc.), mas não é subclasse
+    de `cls`.
+
+    >>> @dataclass
+    ... class Ponto:
+    ...     x: int
+    ...     y: int = 0
+    >>> PontoCompacto = versao_compacta(Ponto, "PontoCompacto")
+    >>> PontoCompacto(1)
+    PontoCompacto(x=1, y=0)
+    >>> hasattr(PontoCompacto(1), "__dict__")
+    False
+    """
+    nome = nome or f"{cls.__name__}Compacta"
+    # Os métodos gerados pelo `@dataclass` original são descartados para serem gerados novamente
+    ignorar = {
+        "__dict__",
+        "__weakref__",
+        "__init__",
+        "__repr__",
+        "__eq__",
+        "__hash__",
+        "__match_args__",
+        "__dataclass_fields__",
+        "__dataclass_params__",
+    }
+    namespace = {key: value for key, value in vars(cls).items() if key not in ignorar}
+    namespace["__qualname__"] = nome
+    namespace["__annotations__"] = dict(cls.__annotations__)
+    return dataclass(slots=True)(type(nome, cls.__bases__, namespace))
+
+
+TIPOS_SIMPLES = frozenset((bool, int, float, str, Decimal, datetime.date, datetime.datetime, datetime.time))
+
+
+def campo_simples(anotacao) -> bool:
+    """Indica se o campo guarda um valor "simples", que `asdict` copiaria sem recursão (`Optional[X]` é aceito)
+
+    >>> campo_simples(typing.Optional[Decimal]), campo_simples(list[str])
+    (True, False)
+    """
+    return tipo_sem_optional(anotacao) in TIPOS_SIMPLES
+
+
+def tipo_sem_optional(anotacao):
+    """Tipo `X` de uma anotação `Optional[X]` (outras anotações são devolvidas sem alteração)"""
+    argumentos = [arg for arg in typing.get_args(anotacao) if arg is not type(None)]
+    if typing.get_origin(anotacao) is typing.Union and len(argumentos) == 1:
+        return argumentos[0]
+    return anotacao
+
+
+def como_asdict(valor):
+    """Converte um valor da mesma forma que `asdict` (dataclasses aninhadas viram dicionários, listas são copiadas)"""
+    if hasattr(type(valor), "__dataclass_fields__"):
+        return serializa_dataclass(valor)
+    elif isinstance(valor, tuple) and hasattr(valor, "_fields"):  # namedtuple
+        return type(valor)(*[como_asdict(item) for item in valor])
+    elif isinstance(valor, (list, tuple)):
+        return type(valor)(como_asdict(item) for item in valor)
+    elif isinstance(valor, dict):
+        return type(valor)((como_asdict(chave), como_asdict(item)) for chave, item in valor.items())
+    return valor
+
+
+@lru_cache(maxsize=None)
+def serializador(cls):
+    """Gera (uma única vez por classe) uma função que converte um objeto da dataclass `cls` em dicionário
+
+    O resultado é igual ao de `dataclasses.asdict`, mas sem cópias recursivas: a função gerada apenas lê os atributos,
+    e somente os campos que podem ter dataclasses aninhadas (listas, dicionários etc.) passam por `como_asdict`.
+
+    >>> @dataclass
+    ... class Ponto:
+    ...     x: int
+    ...     y: typing.Optional[int] = None
+    ...     rotulos: list = None
+    >>> serializador(Ponto)(Ponto(1, rotulos=["a"]))
+    {'x': 1, 'y': None, 'rotulos': ['a']}
+    """
+    try:
+        anotacoes = typing.get_type_hints(cls)
+    except (NameError, TypeError):  # Anotações que não podem ser resolvidas são tratadas como não-simples
+        anotacoes = {}
+    itens = []
+    for campo in dataclass_fields(cls):
+        acesso = f"obj.{campo.name}"
+        if not campo_simples(anotacoes.get(campo.name)):
+            acesso = f"como_asdict({acesso})"
+        itens.append(f"{campo.name!r}: {acesso}")
+    codigo = "def serializa(obj):\n    return {" + ", ".join(itens) + "}\n"
+    namespace = {"como_asdict": como_asdict}
+    exec(codigo, namespace)
+    funcao = namespace["serializa"]
+    funcao.__qualname__ = f"serializador.<{cls.__qualname__}>"
+    return funcao
+
+
+def serializa_dataclass(obj) -> dict:
+    """Equivalente (mais rápido) a `dataclasses.asdict(obj)`
+
+    As dataclasses sem serialização personalizada usam `serialize = serializa_dataclass`, o que permite ao
+    `Exportador` saber, pela classe, que pode ler os atributos diretamente em vez de chamar `serialize`.
+    """
+    return serializador(type(obj))(obj)
+
+
+@lru_cache(maxsize=None)
+def empacotador(cls):
+    """Gera (uma única vez por classe) as funções `(empacota, desempacota)` que convertem listas de objetos da
+    dataclass `cls` em listas de tuplas e vice-versa, para enviá-las de forma barata entre processos
+
+    Fazer pickle de objetos (e de `Decimal`, que é refeito a partir de string) custa bem mais que o de tuplas de
+    tipos nativos, por isso os campos `Decimal` viajam como string e o objeto é recriado só no processo que o recebe.
+
+    >>> @dataclass
+    ... class Preco:
+    ...     codigo: str
+    ...     valor: typing.Optional[Decimal] = None
+    >>> empacota, desempacota = empacotador(Preco)
+    >>> empacota([Preco("A", Decimal("1.50")), Preco("B")])
+    [('A', '1.50'), ('B', None)]
+    >>> desempacota(empacota([Preco("A", Decimal("1.50")), Preco("B")]))
+    [Preco(codigo='A', valor=Decimal('1.50')), Preco(codigo='B', valor=None)]
+    """
+    try:
+        anotacoes = typing.get_type_hints(cls)
+    except (NameError, TypeError):
+        anotacoes = {}
+    campos = [campo.name for campo in dataclass_fields(cls) if campo.init]
+    variaveis = ", ".join(f"c{indice}" for indice in range(len(campos))) + ","
+    ida, volta = [], []
+    for indice, nome in enumerate(campos):
+        if tipo_sem_optional(anotacoes.get(nome)) is Decimal:
+            ida.append(f"None if obj.{nome} is None else str(obj.{nome})")
+            volta.append(f"None if c{indice} is None else Decimal(c{indice})")
+        else:
+            ida.append(f"obj.{nome}")
+            volta.append(f"c{indice}")
+    codigo = (
+        f"def empacota(objs):\n    return [({', '.join(ida)},) for obj in objs]\n"
+        f"def desempacota(tuplas):\n    return [cls({', '.join(volta)}) for {variaveis} in tuplas]\n"
+    )
+    namespace = {"cls": cls, "Decimal": Decimal}
+    exec(codigo, namespace)
+    for nome in ("empacota", "desempacota"):
+        namespace[nome].__qualname__ = f"empacotador.<{cls.__qualname__}>.{nome}"
+    return namespace["empacota"], namespace["desempacota"]
 
 
 def format_dataclass(obj, indent=4):
@@ -0,0 +1,140 @@
+"""Mede os conversores de datas e decimais (com formato pré-resolvido e cache) e a conversão coluna a coluna dos CSVs
+
+Execute a partir da raiz do repositório com: `python -m scripts.benchmark_conversao [--quantidade N]`
+
+Cada conversor é comparado com a conversão sem cache (`__wrapped__` ou, para `parse_date`, a implementação anterior,
+com `strptime` e o formato resolvido a cada chamada) sobre valores com a repetição típica dos arquivos: poucas datas
+distintas e preços que se repetem. O leitor de informes diários é comparado com `csv.DictReader` + `from_dict` (que também
+usa os conversores com cache: a diferença medida é a da conversão coluna a coluna).
+"""
+
+import argparse
+import csv
+import datetime
+import random
+import time
+from itertools import islice
+
+from mercados.b3 import converte_centavos_para_decimal, parse_decimal
+from mercados.cvm import TAMANHO_LOTE_INFORME_DIARIO, InformeDiarioFundo
+from mercados.utils import BRT, _converte_br_decimal, parse_br_decimal, parse_date
+
+
+def parse_date_anterior(fmt, value):
+    value = str(value or "").strip()
+    if not value or value == "0001-01-01":
+        return None
+    formato = {"br-date": "%d/%m/%Y", "iso-date": "%Y-%m-%d", "iso-datetime-tz": "%Y-%m-%dT%H:%M:%S%z"}[fmt]
+    obj = datetime.datetime.strptime(value, formato).replace(tzinfo=BRT)
+    return obj if fmt == "iso-datetime-tz" else obj.date()
+
+
+def parse_br_decimal_anterior(value):
+    return _converte_br_decimal.__wrapped__(str(value or ""))
+
+
+def mede(funcao, valores, repeticoes=3):
+    melhor = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        for valor in valores:
+            funcao(valor)
+        tempo = time.perf_counter() - inicio
+        melhor = tempo if melhor is None else min(melhor, tempo)
+    return melhor
+
+
+def linhas_informe(quantidade):
+    cabecalho = "TP_FUNDO;CNPJ_FUNDO;DT_COMPTC;VL_TOTAL;VL_QUOTA;VL_PATRIM_LIQ;CAPTC_DIA;RESG_DIA;NR_COTST"
+    linhas = [cabecalho]
+    for indice in range(quantidade):
+        fundo, dia = divmod(indice, 22)  # ~22 dias úteis por mês para cada fundo
+        linhas.append(
+            f"FI;{fundo % 10**8:08d}/0001-{fundo % 100:02d};2024-12-{1 + dia:02d};{fundo * 7919 % 100003}.{dia:02d};"
+            f"1.{indice * 104729 % 10**9:09d};{fundo * 31}.50;0.00;{dia % 3}.00;{fundo % 1000}"
+        )
+    return linhas
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--quantidade", "-n", type=int, default=200_000, help="Quantidade de valores/linhas")
+    args = parser.parse_args()
+    n = args.quantidade
+    aleatorio = random.Random(42)
+
+    datas = [datetime.date(2024, 12, 1) + datetime.timedelta(days=aleatorio.randrange(22)) for _ in range(n)]
+    datahoras = [
+        f"{data.isoformat()}T{aleatorio.randrange(9, 18):02d}:{aleatorio.randrange(60):02d}:00-0300" for data in datas
+    ]
+    precos = [f"{aleatorio.randrange(10, 60)}.{aleatorio.randrange(100):02d}" for _ in range(n)]
+    casos = (
+        (
+            "parse_date iso-date",
+            lambda v: parse_date_anterior("iso-date", v),
+            lambda v: parse_date("iso-date", v),
+            [d.isoformat() for d in datas],
+        ),
+        (
+            "parse_date br-date",
+            lambda v: parse_date_anterior("br-date", v),
+            lambda v: parse_date("br-date", v),
+            [d.strftime("%d/%m/%Y") for d in datas],
+        ),
+        (
+            "parse_date iso-datetime-tz",
+            lambda v: parse_date_anterior("iso-datetime-tz", v),
+            lambda v: parse_date("iso-datetime-tz", v),
+            datahoras,
+        ),
+        (
+            "parse_br_decimal",
+            parse_br_decimal_anterior,
+            parse_br_decimal,
+            [preco.replace(".", ",") for preco in precos],
+        ),
+        ("b3.parse_decimal", parse_decimal.__wrapped__, parse_decimal, precos),
+        (
+            "b3.converte_centavos_para_decimal",
+            converte_centavos_para_decimal.__wrapped__,
+            converte_centavos_para_decimal,
+            [preco.replace(".", "") for preco in precos],
+        ),
+    )
+    print(f"{'Conversor':<36} {'anterior (s)':>13} {'atual (s)':>10} {'aceleração':>11}")
+    for nome, anterior, atual, valores in casos:
+        assert all(anterior(valor) == atual(valor) for valor in valores[:1000])
+        antes, depois = mede(anterior, valores), mede(atual, valores)
+        print(f"{nome:<36} {antes:>13.3f} {depois:>10.3f} {antes / depois:>10.1f}x")
+
+    print()
+    linhas = linhas_informe(n)
+    amostra = linhas[:5001]
+    esperado = [InformeDiarioFundo.from_dict(minusculas(row)) for row in csv.DictReader(amostra, delimiter=";")]
+    assert InformeDiarioFundo.from_rows(*_cabecalho_e_dados(amostra)) == esperado
+
+    def por_linha(_):
+        for row in csv.DictReader(linhas, delimiter=";"):
+            InformeDiarioFundo.from_dict(minusculas(row))
+
+    def por_coluna(_):  # Em lotes, como faz `CVM.informe_diario_fundo`
+        cabecalho, reader = _cabecalho_e_dados(linhas)
+        while lote := list(islice(reader, TAMANHO_LOTE_INFORME_DIARIO)):
+            InformeDiarioFundo.from_rows(cabecalho, lote)
+
+    antes, depois = mede(por_linha, [None]), mede(por_coluna, [None])
+    print(f"{'Leitor de CSV':<36} {'DictReader (s)':>15} {'colunas (s)':>12} {'aceleração':>11}")
+    print(f"{'cvm.InformeDiarioFundo':<36} {antes:>15.3f} {depois:>12.3f} {antes / depois:>10.1f}x")
+
+
+def minusculas(row):
+    return {chave.lower(): valor for chave, valor in row.items()}
+
+
+def _cabecalho_e_dados(linhas):
+    reader = csv.reader(linhas, delimiter=";")
+    return next(reader), reader
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Compara a memória ocupada por registro pelas dataclasses de alto volume e suas versões compactas (`__slots__`)
+
+Execute a partir da raiz do repositório com: `python -m scripts.benchmark_memoria [--quantidade N]`
+
+O total por registro inclui os valores dos campos (`Decimal`, `datetime` etc.), que são os mesmos nas duas versões; a
+diferença é o `__dict__` de cada objeto.
+"""
+
+import argparse
+import datetime
+import gc
+import tracemalloc
+from decimal import Decimal
+
+from mercados.b3 import (
+    NegociacaoBalcao,
+    NegociacaoBalcaoCompacta,
+    NegociacaoBolsa,
+    NegociacaoBolsaCompacta,
+    NegociacaoIntradiaria,
+    NegociacaoIntradiariaCompacta,
+)
+from mercados.cvm import InformeDiarioFundo, InformeDiarioFundoCompacta
+from mercados.utils import BRT
+
+DATA = datetime.date(2024, 12, 9)
+
+
+def negociacao_intradiaria(classe, indice):
+    return classe(
+        datahora=datetime.datetime(2024, 12, 9, 10, 0, tzinfo=BRT) + datetime.timedelta(milliseconds=indice),
+        codigo_negocio=indice,
+        codigo_negociacao="PETR4",
+        acao_atualizacao=0,
+        preco=Decimal("36.45"),
+        quantidade=100,
+        pregao_tipo=1,
+        comprador_codigo="1099",
+        vendedor_codigo="308",
+    )
+
+
+def negociacao_bolsa(classe, indice):
+    return classe(
+        quantidade=indice,
+        pontos_strike=None,
+        data=DATA,
+        data_vencimento=None,
+        negociacoes=indice,
+        lote=1,
+        indice_correcao=0,
+        distribuicao=132,
+        codigo_bdi=2,
+        codigo_tipo_mercado=10,
+        prazo_termo=None,
+        codigo_isin="BRPETRACNPR6",
+        codigo_negociacao="PETR4",
+        moeda="R$",
+        nome_pregao="PETROBRAS",
+        tipo_papel="PN N2",
+        preco_abertura=Decimal("36.45"),
+        preco_maximo=Decimal("36.90"),
+        preco_minimo=Decimal("36.10"),
+        preco_medio=Decimal("36.52"),
+        preco_ultimo=Decimal("36.60"),
+        preco_melhor_oferta_compra=Decimal("36.59"),
+        preco_melhor_oferta_venda=Decimal("36.60"),
+        volume=Decimal("1234567.89"),
+        preco_execucao=Decimal("0.00"),
+    )
+
+
+def negociacao_balcao(classe, indice):
+    return classe(
+        codigo=f"CODIGO{indice}",
+        codigo_if="PETR16",
+        instrumento="DEB",
+        datahora=datetime.datetime(2024, 12, 9, 10, 0, tzinfo=BRT),
+        quantidade=Decimal("10"),
+        preco=Decimal("1012.34"),
+        volume=Decimal("10123.40"),
+        origem="Registro",
+        codigo_isin="BRPETRDBS036",
+        data_liquidacao=DATA,
+        emissor="PETROBRAS",
+        situacao="Confirmado",
+        taxa=None,
+    )
+
+
+def informe_diario(classe, indice):
+    return classe(
+        fundo_cnpj="00017024000153",
+        data_competencia=DATA,
+        valor_captado=Decimal("0"),
+        valor_resgatado=Decimal("0"),
+        patrimonio_liquido=Decimal("1234567.89"),
+        valor_cota=Decimal("12.345678901"),
+        valor_carteira=Decimal("1234567.89"),
+        fundo_tipo="FI",
+        cotistas=indice,
+    )
+
+
+def bytes_por_registro(cria, classe, quantidade):
+    gc.collect()
+    tracemalloc.start()
+    inicio = tracemalloc.get_traced_memory()[0]
+    registros = [cria(classe, indice) for indice in range(quantidade)]
+    fim = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert len(registros) == quantidade
+    return (fim - inicio) / quantidade
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--quantidade", "-n", type=int, default=100_000, help="Quantidade de registros criados")
+    args = parser.parse_args()
+
+    casos = (
+        (negociacao_intradiaria, NegociacaoIntradiaria, NegociacaoIntradiariaCompacta),
+        (negociacao_bolsa, NegociacaoBolsa, NegociacaoBolsaCompacta),
+        (negociacao_balcao, NegociacaoBalcao, NegociacaoBalcaoCompacta),
+        (informe_diario, InformeDiarioFundo, InformeDiarioFundoCompacta),
+    )
+    print(f"{'Classe':<24} {'bytes/registro':>15} {'compacta':>10} {'economia':>9}")
+    for cria, classe, compacta in casos:
+        normal = bytes_por_registro(cria, classe, args.quantidade)
+        compacto = bytes_por_registro(cria, compacta, args.quantidade)
+        print(f"{classe.__name__:<24} {normal:>15.0f} {compacto:>10.0f} {1 - compacto / normal:>9.1%}")
+
+
+if __name__ == "__main__":
+    main()
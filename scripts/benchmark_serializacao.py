@@ -0,0 +1,74 @@
+"""Compara o tempo de `dataclasses.asdict` com o serializador gerado por classe (`serializa_dataclass`)
+
+Execute a partir da raiz do repositório com: `python -m scripts.benchmark_serializacao [--quantidade N]`
+
+Os registros são criados pelas mesmas funções de `scripts.benchmark_memoria`; para cada classe, os dois métodos são
+executados sobre a mesma lista e o resultado é conferido antes de medir o tempo.
+"""
+
+import argparse
+import datetime
+import time
+from dataclasses import asdict
+from decimal import Decimal
+
+from mercados.b3 import NegociacaoBalcao, NegociacaoBolsa, NegociacaoIntradiaria
+from mercados.cvm import InformeDiarioFundo
+from mercados.document import CotistaFundo
+from mercados.document import InformeDiarioFundo as InformeDiarioFundoDocumento
+from mercados.utils import serializa_dataclass
+from scripts.benchmark_memoria import DATA, informe_diario, negociacao_balcao, negociacao_bolsa, negociacao_intradiaria
+
+
+def informe_diario_documento(classe, indice):
+    return classe(
+        doc_codigo="123",
+        doc_versao="1",
+        data_competencia=DATA,
+        cotistas=indice,
+        fundo_cnpj="00017024000153",
+        carteira=Decimal("1234567.89"),
+        cota=Decimal("12.345678901"),
+        patrimonio_liquido=Decimal("1234567.89"),
+        captado=Decimal("0"),
+        resgatado=Decimal("0"),
+        cotistas_significativos=[CotistaFundo("PF", "12345678901", Decimal("0.15"))],
+        data_proximo_pl=DATA + datetime.timedelta(days=1),
+    )
+
+
+def mede(funcao, registros, repeticoes=3):
+    melhor = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        for registro in registros:
+            funcao(registro)
+        tempo = time.perf_counter() - inicio
+        melhor = tempo if melhor is None else min(melhor, tempo)
+    return melhor
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--quantidade", "-n", type=int, default=100_000, help="Quantidade de registros serializados")
+    args = parser.parse_args()
+
+    casos = (
+        (negociacao_intradiaria, NegociacaoIntradiaria),
+        (negociacao_bolsa, NegociacaoBolsa),
+        (negociacao_balcao, NegociacaoBalcao),
+        (informe_diario, InformeDiarioFundo),
+        (informe_diario_documento, InformeDiarioFundoDocumento),
+    )
+    print(f"{'Classe':<30} {'asdict (s)':>11} {'gerado (s)':>11} {'aceleração':>11}")
+    for cria, classe in casos:
+        registros = [cria(classe, indice) for indice in range(args.quantidade)]
+        assert all(serializa_dataclass(registro) == asdict(registro) for registro in registros[:100])
+        antes = mede(asdict, registros)
+        depois = mede(serializa_dataclass, registros)
+        nome = f"{classe.__module__.split('.')[-1]}.{classe.__name__}"
+        print(f"{nome:<30} {antes:>11.3f} {depois:>11.3f} {antes / depois:>10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Dados de exemplo usados em mais de um módulo de testes"""
+
+import datetime
+import zipfile
+from decimal import Decimal
+
+from mercados.cvm import InformeDiarioFundo
+
+
+def linha_cotahist(codigo, data="20241209", preco=3456, quantidade="000000000000001200", vencimento="99991231"):
+    campos = [
+        (0, "01"),
+        (2, data),
+        (10, "02"),
+        (12, codigo.ljust(12)),
+        (24, "010"),
+        (27, "PETROBRAS".ljust(12)),
+        (39, "PN      N2".ljust(10)),
+        (49, "   "),
+        (52, "R$  "),
+        (56, f"{preco:013d}"),
+        (69, f"{preco + 10:013d}"),
+        (82, f"{preco - 10:013d}"),
+        (95, f"{preco + 1:013d}"),
+        (108, f"{preco + 2:013d}"),
+        (121, f"{preco:013d}"),
+        (134, f"{preco + 3:013d}"),
+        (147, "00123"),
+        (152, quantidade),
+        (170, f"{preco * 1200:018d}"),
+        (188, "0000000000000"),
+        (201, "0"),
+        (202, vencimento),
+        (210, "0000001"),
+        (217, "0000000000000"),
+        (230, "BRPETRACNPR6"),
+        (242, "132"),
+    ]
+    linha = "".join(valor for _, valor in campos)
+    assert [posicao for posicao, _ in campos] == [
+        sum(len(valor) for _, valor in campos[:indice]) for indice in range(len(campos))
+    ]
+    return linha + "\n"
+
+
+CABECALHO_INTRADIARIA = (
+    "DataReferencia;CodigoInstrumento;AcaoAtualizacao;PrecoNegocio;QuantidadeNegociada;HoraFechamento;"
+    "CodigoIdentificadorNegocio;TipoSessaoPregao;DataNegocio;CodigoParticipanteComprador;CodigoParticipanteVendedor"
+)
+
+
+def linhas_intradiaria(quantidade):
+    codigos = ("PETR4", "VALE3", "ITUB4", "WDOF25")
+    yield CABECALHO_INTRADIARIA + "\n"
+    for indice in range(quantidade):
+        hora = f"{9 + indice % 8:02d}{indice % 60:02d}{(indice * 7) % 60:02d}{indice % 1000:03d}"
+        preco = f"{30 + indice % 5},{indice % 100:02d}0" if indice % 3 else f"{1000 + indice % 7}"
+        yield (
+            f"2024-12-10;{codigos[indice % 4]};0;{preco};{100 * (1 + indice % 9)};{hora};{10 + indice};1;"
+            f"2024-12-09;{1099 + indice % 3};{308 + indice % 5}\n"
+        )
+
+
+def informes(quantidade):
+    for indice in range(quantidade):
+        yield InformeDiarioFundo(
+            fundo_cnpj=f"{indice:014d}",
+            data_competencia=datetime.date(2024, 12, 1 + indice % 28),
+            valor_captado=Decimal("0"),
+            valor_resgatado=Decimal(f"{indice}.5"),
+            patrimonio_liquido=Decimal(f"{1000000 + indice}.89"),
+            valor_cota=Decimal(f"1.{indice:09d}"),
+            valor_carteira=None if indice % 3 else Decimal("123.45"),
+            fundo_tipo="FI" if indice % 2 else None,
+            cotistas=None if indice % 5 == 0 else indice,
+        )
+
+
+def zip_informe_anual(filename, ano, linhas_por_mes=2000):
+    cabecalho = "TP_FUNDO;CNPJ_FUNDO;DT_COMPTC;VL_TOTAL;VL_QUOTA;VL_PATRIM_LIQ;CAPTC_DIA;RESG_DIA;NR_COTST\n"
+    with zipfile.ZipFile(filename, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for mes in range(1, 13):
+            linhas = [
+                f"FI;{indice:08d}/0001-{mes:02d};{ano}-{mes:02d}-{1 + indice % 28:02d};{indice * 7919 % 100003}.{mes:02d};"
+                f"1.{indice * 104729 % 10**9:09d};{indice * 31}.5;0.00;{indice % 97}.00;{indice % 1000}\n"
+                for indice in range(linhas_por_mes)
+            ]
+            zf.writestr(f"inf_diario_fi_{ano}{mes:02d}.csv", cabecalho + "".join(linhas))
@@ -0,0 +1,62 @@
+import functools
+import re
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+REGEXP_RANGE = re.compile(r"^bytes=([0-9]+)-([0-9]+)$")
+
+
+class RequestHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args, **kwargs):
+        pass
+
+    def send_response(self, code, message=None):
+        self.server.status_codes.append(code)
+        super().send_response(code, message)
+
+    def do_GET(self):
+        resultado = REGEXP_RANGE.match(self.headers.get("Range", ""))
+        if not self.server.aceita_range or resultado is None:
+            return super().do_GET()
+        conteudo = (self.server.pasta / self.path.lstrip("/")).read_bytes()
+        inicio, fim = int(resultado.group(1)), min(int(resultado.group(2)), len(conteudo) - 1)
+        parte = conteudo[inicio : fim + 1]
+        self.server.bytes_enviados += len(parte)
+        self.send_response(206)
+        self.send_header("Content-Range", f"bytes {inicio}-{fim}/{len(conteudo)}")
+        self.send_header("Content-Length", str(len(parte)))
+        self.end_headers()
+        self.wfile.write(parte)
+
+
+def inicia_servidor(pasta, aceita_range):
+    pasta.mkdir()
+    handler = functools.partial(RequestHandler, directory=str(pasta))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.pasta = pasta
+    server.aceita_range = aceita_range
+    server.bytes_enviados = 0
+    server.status_codes = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+@pytest.fixture
+def servidor(tmp_path):
+    server = inicia_servidor(tmp_path / "servidor", aceita_range=False)
+    yield server.pasta, f"http://127.0.0.1:{server.server_address[1]}", server.status_codes
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def servidor_range(tmp_path):
+    """Servidor que aceita requisições `Range` (devolve o próprio servidor, que contabiliza os bytes enviados)"""
+    server = inicia_servidor(tmp_path / "servidor", aceita_range=True)
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,158 @@
+import asyncio
+import datetime
+import json
+from decimal import Decimal
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from mercados.assincrono import AsyncB3, AsyncBancoCentral, AsyncFundosNet  # noqa: E402
+from mercados.bcb import Taxa  # noqa: E402
+from mercados.utils import CircuitoAberto, PoliticaRetentativas  # noqa: E402
+
+
+def tabela(pagina, total_paginas, valores):
+    return {
+        "table": {
+            "pageCount": total_paginas,
+            "columns": [{"friendlyNamePt": "Código", "name": "TckrSymb"}, {"friendlyNamePt": None, "name": "Qty"}],
+            "values": [[f"ATIV{pagina}", valor] for valor in valores],
+        }
+    }
+
+
+def test_async_b3_tabela_clearing_percorre_paginas():
+    requisicoes = []
+
+    def responde(request):
+        requisicoes.append(request)
+        if request.method == "GET":
+            return httpx.Response(200, text="<html></html>")
+        pagina = int(request.url.path.split("/")[-2])
+        return httpx.Response(200, text=json.dumps(json.dumps(tabela(pagina, 3, [pagina * 10, pagina * 10 + 1]))))
+
+    async def executa():
+        async with AsyncB3(transport=httpx.MockTransport(responde)) as b3:
+            return [
+                row
+                async for row in b3._tabela_clearing(
+                    url_template="https://arquivos.b3.com.br/bdi/table/Teste/{data}/{data}/{page}/{page_size}",
+                    url_params={"data": "2025-01-02"},
+                    query_params={"sort": "TckrSymb"},
+                )
+            ]
+
+    resultado = asyncio.run(executa())
+    assert resultado == [
+        {"Código": "ATIV1", "Qty": 10},
+        {"Código": "ATIV1", "Qty": 11},
+        {"Código": "ATIV2", "Qty": 20},
+        {"Código": "ATIV2", "Qty": 21},
+        {"Código": "ATIV3", "Qty": 30},
+        {"Código": "ATIV3", "Qty": 31},
+    ]
+    # Primeira requisição é a que guarda os cookies
+    assert [request.method for request in requisicoes] == ["GET", "POST", "POST", "POST"]
+
+
+def test_async_b3_tenta_novamente_erros_do_servidor():
+    status = [520, 520, 200]
+
+    def responde(request):
+        return httpx.Response(status.pop(0), json={"ok": True})
+
+    async def executa():
+        b3 = AsyncB3(transport=httpx.MockTransport(responde))
+        try:
+            return await b3.request("https://exemplo.b3.com.br/", wait_between_errors=0)
+        finally:
+            await b3.fecha()
+
+    assert asyncio.run(executa()) == {"ok": True}
+    assert status == []
+
+
+def test_async_usa_politica_de_retentativas():
+    politica = PoliticaRetentativas(espera_minima=0.5, espera_maxima=4, limite_falhas=3, tempo_aberto=60)
+    esperas = []
+
+    async def dorme(espera):
+        esperas.append(espera)
+
+    politica.dorme_assincrono = dorme
+    respostas = [httpx.ConnectError("recusada"), 503, 200, 520, 520, 520]
+
+    def responde(request):
+        resposta = respostas.pop(0)
+        if isinstance(resposta, Exception):
+            raise resposta
+        return httpx.Response(resposta, headers={"Retry-After": "3"}, json={"ok": True})
+
+    async def executa():
+        b3 = AsyncB3(transport=httpx.MockTransport(responde))
+        b3.politica = politica
+        try:
+            resultado = await b3.request("https://exemplo.b3.com.br/")
+            with pytest.raises(CircuitoAberto):  # 3 falhas seguidas no host (compartilhadas entre as requisições)
+                await b3.request("https://exemplo.b3.com.br/outra")
+            return resultado
+        finally:
+            await b3.fecha()
+
+    assert asyncio.run(executa()) == {"ok": True}
+    assert respostas == []
+    assert esperas[1] >= 3  # Respeita o `Retry-After`
+    assert all(0.5 <= espera <= 4 for espera in esperas)
+
+
+def test_async_banco_central_serie_temporal():
+    def responde(request):
+        assert "accept" not in request.headers
+        assert request.url.params["dataInicial"] == "01/01/2025"
+        return httpx.Response(200, json=[{"data": "02/01/2025", "valor": "0.045513"}])
+
+    async def executa():
+        async with AsyncBancoCentral(transport=httpx.MockTransport(responde)) as bc:
+            return await bc.serie_temporal("CDI", inicio=datetime.date(2025, 1, 1))
+
+    assert asyncio.run(executa()) == [Taxa(data=datetime.date(2025, 1, 2), valor=Decimal("0.045513"))]
+
+
+def test_async_fundosnet_busca_tenta_novamente_erros_do_servidor():
+    politica = PoliticaRetentativas(espera_minima=0)
+    politica.dorme_assincrono = lambda espera: asyncio.sleep(0)
+    status = {"abrirGerenciadorDocumentosCVM": [503, 200], "pesquisarGerenciadorDocumentosDados": [503, 200]}
+    linha = {
+        "id": 1,
+        "altaPrioridade": False,
+        "analisado": "N",
+        "categoriaDocumento": "Informes Periódicos",
+        "dataEntrega": "02/01/2025 10:00",
+        "formatoDataReferencia": "3",
+        "dataReferencia": "02/01/2025",
+        "especieDocumento": "",
+        "descricaoFundo": "Fundo",
+        "nomePregao": "",
+        "informacoesAdicionais": "",
+        "descricaoModalidade": "AP",
+        "situacaoDocumento": "A",
+        "descricaoStatus": "AC",
+        "tipoDocumento": "Informe Mensal",
+        "versao": 1,
+    }
+
+    def responde(request):
+        codigo = status[request.url.path.split("/")[-1]].pop(0)
+        if request.url.path.endswith("abrirGerenciadorDocumentosCVM"):
+            return httpx.Response(codigo, text='<script>var csrf_token = "token";</script>')
+        return httpx.Response(codigo, json={"recordsTotal": 1, "data": [linha]})
+
+    async def executa():
+        fnet = AsyncFundosNet(transport=httpx.MockTransport(responde))
+        fnet.politica = politica
+        async with fnet:
+            return [documento async for documento in fnet.search(start_date=datetime.date(2025, 1, 1))]
+
+    assert [documento.id for documento in asyncio.run(executa())] == [1]
+    assert status == {"abrirGerenciadorDocumentosCVM": [], "pesquisarGerenciadorDocumentosDados": []}
@@ -0,0 +1,220 @@
+import csv
+import datetime
+import json
+import random
+import threading
+import time
+from decimal import Decimal
+
+import requests
+
+from mercados.b3 import (
+    B3,
+    ESCALA_PRECO_INTRADIARIO,
+    BaseNegociacaoBolsa,
+    NegociacaoBolsa,
+    NegociacaoBolsaCompacta,
+    NegociacaoIntradiaria,
+    TabelaNegociacaoBolsa,
+    le_negociacoes_intradiarias,
+    normaliza_codigos,
+)
+from mercados.utils import Sessao
+from tests.auxiliares import linha_cotahist, linhas_intradiaria
+
+
+def cria_b3(monkeypatch, responde, **kwargs):
+    requisicoes = []
+    lock = threading.Lock()
+
+    def request(self, url, url_params=None, params=None, method="GET", decode_json=True, json_data=None, **kwargs):
+        if not decode_json:  # Requisição feita em `B3.__init__` para guardar cookies
+            return None
+        with lock:
+            requisicoes.append((url, dict(url_params or {})))
+        time.sleep(random.random() / 200)
+        return responde(url, url_params)
+
+    monkeypatch.setattr(B3, "request", request)
+    return B3(**kwargs), requisicoes
+
+
+def test_paginate_prefetch_mantem_ordem(monkeypatch):
+    def responde(url, url_params):
+        pagina = url_params["pageNumber"]
+        resultados = [f"{pagina}-{item}" for item in range(3)]
+        return {"page": {"pageNumber": pagina, "totalPages": 7}, "results": resultados}
+
+    b3, requisicoes = cria_b3(monkeypatch, responde, max_workers=4, prefetch=True)
+    resultado = list(b3.paginate("https://exemplo.b3.com.br/", url_params={"language": "pt-br"}))
+    assert resultado == [f"{pagina}-{item}" for pagina in range(1, 8) for item in range(3)]
+    paginas = sorted(url_params["pageNumber"] for _, url_params in requisicoes)
+    assert paginas == list(range(1, 8))
+
+
+def test_tabela_clearing_prefetch_mantem_ordem(monkeypatch):
+    def responde(url, url_params):
+        pagina = int(url.split("/")[-2])
+        return {
+            "table": {
+                "pageCount": 5,
+                "columns": [{"friendlyNamePt": "Página", "name": "Page"}],
+                "values": [[pagina], [pagina]],
+            }
+        }
+
+    for prefetch in (False, True):
+        b3, requisicoes = cria_b3(monkeypatch, responde, max_workers=3, prefetch=prefetch)
+        resultado = list(
+            b3._tabela_clearing(
+                url_template="https://arquivos.b3.com.br/bdi/table/Teste/{data}/{data}/{page}/{page_size}",
+                url_params={"data": "2025-01-02"},
+                query_params={},
+            )
+        )
+        assert resultado == [{"Página": pagina} for pagina in range(1, 6) for _ in range(2)]
+        assert len(requisicoes) == 5
+
+
+def test_tabela_negociacao_bolsa_equivale_a_from_line():
+    linhas = [
+        "00COTAHIST.2024BOVESPA 20241209".ljust(245) + "\n",
+        linha_cotahist("PETR4"),
+        linha_cotahist("PETR4", data="20241210", preco=0, quantidade=" " * 18),
+        linha_cotahist("PETRL350", preco=123456789, vencimento="20250117"),
+        "99COTAHIST.2024BOVESPA 20241209".ljust(245) + "\n",
+    ]
+    tabela = TabelaNegociacaoBolsa.from_lines(linhas)
+    assert len(tabela) == 3
+    assert tabela.colunas["preco_abertura"] == [3456, 0, 123456789]
+    assert tabela.colunas["quantidade"] == [1200, None, 1200]
+    assert tabela.colunas["data"][0] is tabela.colunas["data"][2]  # Datas repetidas são decodificadas uma vez
+    esperado = [NegociacaoBolsa.from_line(linha) for linha in linhas[1:-1]]
+    assert list(tabela.to_records()) == esperado
+    assert [str(obj.preco_abertura) for obj in tabela.to_records()] == ["34.56", "0.00", "1234567.89"]
+
+
+def test_negociacao_bolsa_compacta():
+    linha = linha_cotahist("PETR4")
+    normal, compacta = NegociacaoBolsa.from_line(linha), NegociacaoBolsaCompacta.from_line(linha)
+    assert type(compacta) is NegociacaoBolsaCompacta
+    assert not hasattr(compacta, "__dict__")
+    assert compacta.serialize() == normal.serialize()
+    tabela = TabelaNegociacaoBolsa.from_lines([linha])
+    assert list(tabela.to_records(classe=NegociacaoBolsaCompacta)) == [compacta]
+
+
+def test_negociacao_bolsa_filtra_codigos(monkeypatch):
+    linhas = [linha_cotahist(codigo) for codigo in ("PETR4", "VALE3", "PETR4F", "PETRL350", "VALE3")]
+    b3, _ = cria_b3(monkeypatch, lambda url, url_params: None)
+    monkeypatch.setattr(B3, "_linhas_negociacao_bolsa", lambda self, frequencia, data: iter(linhas))
+    data = datetime.date(2024, 12, 9)
+    assert [obj.codigo_negociacao for obj in b3.negociacao_bolsa("dia", data, codigos="PETR4")] == ["PETR4"]
+    resultado = b3.negociacao_bolsa("dia", data, codigos=["vale3", "PETRL350"])
+    assert [obj.codigo_negociacao for obj in resultado] == ["VALE3", "PETRL350", "VALE3"]
+    assert len(list(b3.negociacao_bolsa("dia", data))) == 5
+    tabela = b3.negociacao_bolsa_tabela("dia", data, codigos=["VALE3"])
+    assert tabela.colunas["codigo_negociacao"] == ["VALE3", "VALE3"]
+
+
+def test_le_negociacoes_intradiarias_equivale_a_from_dict():
+    linhas = list(linhas_intradiaria(500))
+    esperado = [NegociacaoIntradiaria.from_dict(row) for row in csv.DictReader(linhas, delimiter=";")]
+    assert list(le_negociacoes_intradiarias(linhas)) == esperado
+
+    ticks = list(le_negociacoes_intradiarias(linhas, preco_em_ticks=True))
+    assert [obj.preco for obj in ticks] == [int(obj.preco * ESCALA_PRECO_INTRADIARIO) for obj in esperado]
+    assert [obj.datahora for obj in ticks] == [obj.datahora for obj in esperado]
+
+
+def test_le_negociacoes_intradiarias_filtra_codigos():
+    linhas = list(linhas_intradiaria(200))
+    todas = list(le_negociacoes_intradiarias(linhas))
+    filtradas = list(le_negociacoes_intradiarias(linhas, codigos=normaliza_codigos(["PETR4", "WDOF25"])))
+    assert filtradas == [obj for obj in todas if obj.codigo_negociacao in ("PETR4", "WDOF25")]
+    assert list(le_negociacoes_intradiarias(linhas, codigos=set())) == []
+
+
+def test_le_negociacoes_intradiarias_ignora_linhas_vazias():
+    linhas = list(linhas_intradiaria(20))
+    linhas = linhas[:10] + ["\n"] + linhas[10:] + ["\r\n", ""]
+    esperado = [NegociacaoIntradiaria.from_dict(row) for row in csv.DictReader(linhas, delimiter=";")]
+    assert len(esperado) == 20
+    assert list(le_negociacoes_intradiarias(linhas)) == esperado
+    filtradas = list(le_negociacoes_intradiarias(linhas, codigos={"PETR4"}))
+    assert filtradas == [obj for obj in esperado if obj.codigo_negociacao == "PETR4"]
+
+
+def test_base_negociacao_bolsa(monkeypatch, tmp_path):
+    arquivos = {
+        ("ano", datetime.date(2023, 1, 1)): [
+            linha_cotahist("PETR4", data="20230602"),
+            linha_cotahist("VALE3", data="20230602"),
+            linha_cotahist("PETR4", data="20231228", preco=4000),
+        ],
+        ("mês", datetime.date(2024, 1, 1)): [linha_cotahist("PETR4", data="20240110", quantidade=" " * 18)],
+        ("dia", datetime.date(2024, 2, 1)): [linha_cotahist("PETR4", data="20240201")],
+    }
+    baixados = []
+
+    def linhas(self, frequencia, data):
+        baixados.append((frequencia, data))
+        return iter(arquivos.get((frequencia, data), []))
+
+    b3, _ = cria_b3(monkeypatch, lambda url, url_params: None)
+    monkeypatch.setattr(B3, "_linhas_negociacao_bolsa", linhas)
+
+    class Data(datetime.date):
+        @classmethod
+        def today(cls):
+            return cls(2024, 2, 3)
+
+    monkeypatch.setattr(datetime, "date", Data)
+    filename = tmp_path / "cotacoes.sqlite"
+    with BaseNegociacaoBolsa(filename) as base:
+        carregados = list(b3.atualiza_negociacao_bolsa(base, Data(2023, 6, 1)))
+    assert carregados == [("ano:2023", 3), ("mês:2024-01", 1), ("dia:2024-02-01", 1), ("dia:2024-02-02", 0)]
+
+    baixados.clear()
+    with BaseNegociacaoBolsa(filename) as base:
+        assert list(b3.atualiza_negociacao_bolsa(base, Data(2023, 6, 1))) == []
+        assert baixados == []
+        historico = list(base.historico("petr4", inicio=Data(2023, 12, 1)))
+        esperado = [NegociacaoBolsa.from_line(linha) for linha in arquivos[("mês", Data(2024, 1, 1))]]
+        esperado += [NegociacaoBolsa.from_line(linha) for linha in arquivos[("dia", Data(2024, 2, 1))]]
+        assert historico[1:] == esperado
+        assert historico[0].preco_abertura == Decimal("40.00")
+        assert historico[1].quantidade is None
+        assert [obj.codigo_negociacao for obj in base.historico(["PETR4", "VALE3"], fim=Data(2023, 6, 30))] == [
+            "PETR4",
+            "VALE3",
+        ]
+
+        # Recarregar um período substitui as negociações (sem duplicá-las)
+        base.carrega("ano", Data(2023, 1, 1), map(NegociacaoBolsa.from_line, arquivos[("ano", Data(2023, 1, 1))][:1]))
+        assert len(list(base.historico(["PETR4", "VALE3"], fim=Data(2023, 12, 31)))) == 1
+
+
+def test_ultimas_cotacoes_repetidas(monkeypatch):
+    corpo = json.dumps(
+        {
+            "TradgFlr": {
+                "date": "2025-01-02",
+                "scty": {
+                    "symb": "PETR4",
+                    "lstQtn": [{"closPric": 37.5, "dtTm": "10:15:00", "prcFlcn": 0.1}],
+                },
+            }
+        }
+    ).encode("utf-8")
+
+    def request(self, method, url, *args, **kwargs):  # Mesmo corpo para todas as requisições
+        response = requests.Response()
+        response.status_code, response._content = 200, corpo
+        return response
+
+    monkeypatch.setattr(Sessao, "request", request)
+    b3 = B3()
+    primeira, segunda = b3.ultimas_cotacoes("PETR4"), b3.ultimas_cotacoes("PETR4")
+    assert primeira == segunda
+    assert primeira[0].valor == Decimal("37.50")
@@ -0,0 +1,108 @@
+import csv
+import datetime
+from dataclasses import replace
+
+from mercados import utils
+from mercados.cvm import CVM, BaseInformeDiarioFundo, InformeDiarioFundo
+from tests.auxiliares import informes, zip_informe_anual
+
+
+class Data(datetime.date):
+    @classmethod
+    def today(cls):
+        return cls(2025, 3, 10)
+
+
+def test_base_informe_diario_fundo(monkeypatch, tmp_path):
+    por_mes = {
+        mes: [
+            replace(informe, data_competencia=informe.data_competencia.replace(year=2025, month=mes))
+            for informe in informes(200)
+        ]
+        for mes in (1, 2, 3)
+    }
+    baixados = []
+
+    def informe_diario_fundo(self, ano_mes):
+        baixados.append(ano_mes)
+        return iter(por_mes.get(ano_mes.month, []) if ano_mes.year == 2025 else [])
+
+    monkeypatch.setattr(CVM, "informe_diario_fundo", informe_diario_fundo)
+    monkeypatch.setattr(datetime, "date", Data)
+    cvm = CVM()
+    filename = tmp_path / "informes.sqlite"
+    with BaseInformeDiarioFundo(filename) as base:
+        carregados = list(cvm.atualiza_informe_diario_fundo(base, Data(2024, 12, 1)))
+        assert carregados == [("2024-12", 0), ("2025-01", 200), ("2025-02", 200), ("2025-03", 200)]
+
+    baixados.clear()
+    with BaseInformeDiarioFundo(filename) as base:
+        # Apenas o mês atual e o anterior (ainda recebendo informes) são baixados novamente
+        assert [particao for particao, _ in cvm.atualiza_informe_diario_fundo(base, Data(2024, 12, 1))] == [
+            "2025-02",
+            "2025-03",
+        ]
+        assert baixados == [Data(2025, 2, 1), Data(2025, 3, 1)]
+        assert base.particoes() == {"2024-12": 0, "2025-01": 200, "2025-02": 200, "2025-03": 200}
+
+        cnpj = por_mes[1][7].fundo_cnpj
+        esperado = [informe for mes in (1, 2, 3) for informe in por_mes[mes] if informe.fundo_cnpj == cnpj]
+        assert list(base.cota_historica(cnpj)) == esperado
+        formatado = f"{cnpj[:2]}.{cnpj[2:5]}.{cnpj[5:8]}/{cnpj[8:12]}-{cnpj[12:]}"
+        assert list(base.cota_historica(formatado, inicio=Data(2025, 2, 1), fim=Data(2025, 2, 28))) == esperado[1:2]
+
+
+def test_informe_diario_fundo_historico_le_apenas_o_mes(monkeypatch, servidor_range):
+    monkeypatch.setattr(utils, "TAMANHO_BLOCO_REMOTO", 16 * 1024)
+    zip_informe_anual(servidor_range.pasta / "inf_diario_fi_2019.zip", 2019)
+    tamanho = (servidor_range.pasta / "inf_diario_fi_2019.zip").stat().st_size
+    monkeypatch.setattr(
+        CVM, "url_informe_diario_fundo", lambda self, ano_mes: f"{servidor_range.base_url}/inf_diario_fi_2019.zip"
+    )
+
+    parcial = list(CVM().informe_diario_fundo(datetime.date(2019, 5, 1)))
+    assert servidor_range.bytes_enviados < tamanho / 6
+    completo = list(CVM(leitura_parcial=False).informe_diario_fundo(datetime.date(2019, 5, 1)))
+    assert parcial == completo
+    assert len(parcial) == 2000
+    assert {informe.data_competencia.month for informe in parcial} == {5}
+
+
+def test_informe_diario_fundo_periodo(monkeypatch, servidor):
+    pasta, base_url, _ = servidor
+    zip_informe_anual(pasta / "inf_diario_fi_2019.zip", 2019, linhas_por_mes=500)
+    monkeypatch.setattr(CVM, "url_informe_diario_fundo", lambda self, ano_mes: f"{base_url}/inf_diario_fi_2019.zip")
+
+    for compacto, workers in ((False, 2), (True, 2), (False, 1)):
+        cvm = CVM(compacto=compacto)
+        esperado = [informe for mes in (3, 4, 5) for informe in cvm.informe_diario_fundo(datetime.date(2019, mes, 1))]
+        # Blocos pequenos: cada mês é dividido entre vários processos e o resultado continua na ordem original
+        periodo = cvm.informe_diario_fundo_periodo(
+            "2019-03", "2019-05", workers=workers, downloads=2, tamanho_bloco=4096
+        )
+        assert list(periodo) == esperado
+        assert len(esperado) == 1500
+        assert type(esperado[0]).__name__ == ("InformeDiarioFundoCompacta" if compacto else "InformeDiarioFundo")
+
+
+def test_informe_diario_fundo_from_rows_equivale_a_from_dict():
+    linhas = [
+        "TP_FUNDO_CLASSE;CNPJ_FUNDO_CLASSE;ID_SUBCLASSE;DT_COMPTC;VL_TOTAL;VL_QUOTA;VL_PATRIM_LIQ;CAPTC_DIA;RESG_DIA;NR_COTST",
+        "CLASSES - FIF;00.017.024/0001-53;;2025-01-02;1132753.12;34.839566000000;1130873.48;0.00;0.00;1",
+        "CLASSES - FIF;00.017.024/0001-53;;2025-01-03;1133253.12;34.849566000000;1131373.48;10.00;;",
+        "",
+        "CLASSES - FIF;00.068.305/0001-35;;2025-01-02;0;1.0;0",
+    ]
+    # Formato antigo (sem tipo de fundo, como em 201901)
+    antigas = [
+        "CNPJ_FUNDO;DT_COMPTC;VL_TOTAL;VL_QUOTA;VL_PATRIM_LIQ;CAPTC_DIA;RESG_DIA;NR_COTST",
+        "00.017.024/0001-53;2019-01-02;1;2;3;4;5;6",
+    ]
+    for linhas in (linhas, antigas):
+        esperado = [
+            InformeDiarioFundo.from_dict({chave.lower(): valor for chave, valor in row.items()})
+            for row in csv.DictReader(linhas, delimiter=";")
+        ]
+        cabecalho, *dados = csv.reader(linhas, delimiter=";")
+        assert InformeDiarioFundo.from_rows(cabecalho, dados) == esperado
+    assert esperado[0].fundo_cnpj == "00017024000153" and esperado[0].fundo_tipo is None
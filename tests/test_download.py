@@ -0,0 +1,320 @@
+import random
+import threading
+import time
+import zipfile
+
+import pytest
+import requests
+
+from mercados import utils
+from mercados.utils import (
+    CacheHTTP,
+    CircuitoAberto,
+    LimitadorConcorrencia,
+    PoliticaRetentativas,
+    RegistroConexoes,
+    abre_arquivo_remoto,
+    baixa_arquivo,
+    create_session,
+)
+from tests.conftest import RequestHandler
+
+
+def test_cache_revalida_com_servidor(servidor, tmp_path):
+    pasta, base_url, status_codes = servidor
+    (pasta / "dados.zip").write_bytes(b"conteudo original")
+    cache = CacheHTTP(tmp_path / "cache")
+    session = create_session()
+    url = f"{base_url}/dados.zip"
+
+    with baixa_arquivo(session, url, cache=cache) as fobj:
+        assert fobj.read() == b"conteudo original"
+    with baixa_arquivo(session, url, cache=cache) as fobj:
+        assert fobj.read() == b"conteudo original"
+    assert status_codes == [200, 304]
+    assert cache.metadados(url)["url"] == url
+
+
+def test_cache_nao_guarda_erros(servidor, tmp_path):
+    _, base_url, status_codes = servidor
+    cache = CacheHTTP(tmp_path / "cache")
+    url = f"{base_url}/nao-existe.zip"
+    with baixa_arquivo(create_session(), url, cache=cache) as fobj:
+        fobj.read()
+    assert status_codes == [404]
+    assert cache.metadados(url) is None
+    assert cache.arquivos() == []
+
+
+def test_cache_remove_temporarios_em_caso_de_erro(servidor, tmp_path, monkeypatch):
+    pasta, base_url, _ = servidor
+    (pasta / "dados.zip").write_bytes(b"conteudo")
+    cache = CacheHTTP(tmp_path / "cache")
+    url = f"{base_url}/dados.zip"
+
+    def interrompe(response, fobj):
+        fobj.write(b"cont")
+        raise requests.exceptions.ChunkedEncodingError("conexão interrompida")
+
+    monkeypatch.setattr(utils, "salva_resposta", interrompe)
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        cache.abre(create_session(), url)
+    monkeypatch.undo()
+
+    def falha_metadados(obj, fobj):
+        raise OSError("disco cheio")
+
+    monkeypatch.setattr(utils.json, "dump", falha_metadados)
+    with pytest.raises(OSError):
+        cache.abre(create_session(), url)
+    monkeypatch.undo()
+    assert [arquivo.name for arquivo in (tmp_path / "cache").iterdir() if arquivo.name.startswith(".tmp-")] == []
+
+
+def test_cache_remove_arquivos_usados_ha_mais_tempo(servidor, tmp_path):
+    pasta, base_url, _ = servidor
+    for nome in ("a", "b", "c"):
+        (pasta / nome).write_bytes(b"x" * 100)
+    cache = CacheHTTP(tmp_path / "cache", tamanho_maximo=250)
+    session = create_session()
+    for nome in ("a", "b", "c"):
+        baixa_arquivo(session, f"{base_url}/{nome}", cache=cache).close()
+    assert cache.tamanho() == 200
+    assert cache.metadados(f"{base_url}/a") is None
+    assert cache.metadados(f"{base_url}/c") is not None
+
+
+def test_baixa_arquivo_grande_vai_para_disco(servidor, monkeypatch):
+    pasta, base_url, _ = servidor
+    conteudo = bytes(range(256)) * 1024
+    (pasta / "grande.zip").write_bytes(conteudo)
+    monkeypatch.setattr(utils, "TAMANHO_DOWNLOAD_EM_MEMORIA", 64 * 1024)
+    with baixa_arquivo(create_session(), f"{base_url}/grande.zip") as fobj:
+        assert fobj._rolled  # Não ficou inteiro na memória
+        assert fobj.read() == conteudo
+
+
+def test_abre_arquivo_remoto_le_apenas_o_membro(servidor_range):
+    membros = {f"mes-{mes:02d}.bin": random.Random(mes).randbytes(200_000) for mes in range(1, 13)}
+    with zipfile.ZipFile(servidor_range.pasta / "anual.zip", mode="w") as zf:
+        for nome, conteudo in membros.items():
+            zf.writestr(nome, conteudo)
+    tamanho = (servidor_range.pasta / "anual.zip").stat().st_size
+
+    fobj = abre_arquivo_remoto(create_session(), f"{servidor_range.base_url}/anual.zip", tamanho_bloco=64 * 1024)
+    with fobj, zipfile.ZipFile(fobj) as zf:
+        assert zf.namelist() == list(membros)
+        assert zf.read("mes-05.bin") == membros["mes-05.bin"]
+    assert servidor_range.bytes_enviados < tamanho / 5
+
+
+def test_abre_arquivo_remoto_sem_suporte_a_range(servidor):
+    pasta, base_url, status_codes = servidor
+    (pasta / "dados.zip").write_bytes(b"conteudo")
+    assert abre_arquivo_remoto(create_session(), f"{base_url}/dados.zip") is None
+    assert status_codes == [200]
+
+
+def test_sessoes_compartilham_conexoes(servidor, monkeypatch):
+    monkeypatch.setattr(RequestHandler, "protocol_version", "HTTP/1.1")  # Mantém a conexão aberta (keep-alive)
+    pasta, base_url, _ = servidor
+    (pasta / "dados.csv").write_bytes(b"a;b\n1;2\n")
+    url = f"{base_url}/dados.csv"
+    registro = RegistroConexoes()
+    primeira, segunda = create_session(registro), create_session(registro)
+    del segunda.headers["Accept"]  # Cabeçalhos continuam sendo de cada sessão
+    segunda.headers["CSRFToken"] = "abc"
+    for session in (primeira, segunda, primeira):
+        assert session.get(url).content == b"a;b\n1;2\n"
+    assert "Accept" in primeira.headers and "CSRFToken" not in primeira.headers
+    adaptador = primeira.get_adapter(url)
+    assert segunda.get_adapter(url) is adaptador
+    (pool,) = [adaptador.poolmanager.pools[chave] for chave in adaptador.poolmanager.pools.keys()]
+    assert pool.num_connections == 1  # A mesma conexão atendeu às duas sessões
+    segunda.close()  # Não fecha os pools compartilhados
+    assert len(adaptador.poolmanager.pools) == 1
+
+    host = base_url.split("://")[1]
+    registro.configura(host, pool_maxsize=3)
+    terceira = create_session(registro)
+    assert terceira.get_adapter(url) is not adaptador
+    assert terceira.get_adapter(url)._pool_maxsize == 3
+    assert terceira.get_adapter("http://example.com/") is adaptador
+
+
+def resposta(status_code, **headers):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers)
+    response._content, response._content_consumed = b"", True
+    return response
+
+
+def politica_de_teste(**kwargs):
+    politica = PoliticaRetentativas(**kwargs)
+    politica.esperas = []
+    politica.dorme = politica.esperas.append
+    return politica
+
+
+def test_politica_retentativas_espera_com_jitter():
+    politica = politica_de_teste(espera_minima=0.5, espera_maxima=4)
+    respostas = iter([resposta(520), resposta(503, **{"Retry-After": "3"}), resposta(520), resposta(200)])
+    response = politica.executa("GET", "https://exemplo.com.br/x", lambda: next(respostas))
+    assert response.status_code == 200
+    assert len(politica.esperas) == 3
+    assert all(0.5 <= espera <= 4 for espera in politica.esperas)
+    assert politica.esperas[1] >= 3  # Respeita o `Retry-After`
+
+    # Esgotadas as tentativas, a última resposta é devolvida; erros que não são temporários não são repetidos
+    assert politica.executa("GET", "https://exemplo.com.br/x", lambda: resposta(520), tentativas=2).status_code == 520
+    chamadas = []
+    politica.executa("GET", "https://exemplo.com.br/x", lambda: chamadas.append(1) or resposta(404))
+    assert chamadas == [1]
+
+
+def test_politica_retentativas_orcamento_e_metodos():
+    politica = politica_de_teste(orcamento_maximo=3, proporcao_orcamento=0, limite_falhas=100)
+    chamadas = []
+
+    def falha():
+        chamadas.append(1)
+        return resposta(500)
+
+    politica.executa("GET", "https://exemplo.com.br/", falha, tentativas=10)
+    assert len(chamadas) == 4  # 1 tentativa + 3 retentativas do orçamento
+    politica.executa("GET", "https://exemplo.com.br/", falha, tentativas=10)
+    assert len(chamadas) == 5  # Orçamento esgotado: sem retentativas para o host
+    politica.executa("GET", "https://outro.com.br/", falha, tentativas=2)
+    assert len(chamadas) == 7
+
+    def erro_conexao():
+        chamadas.append(1)
+        raise requests.exceptions.ConnectionError("recusada")
+
+    chamadas.clear()
+    with pytest.raises(requests.exceptions.ConnectionError):
+        politica_de_teste().executa("POST", "https://exemplo.com.br/", erro_conexao)
+    assert len(chamadas) == 1  # Método não idempotente: a requisição pode ter sido processada
+
+
+def test_politica_retentativas_circuito():
+    politica = politica_de_teste(limite_falhas=3, tempo_aberto=0.05)
+    chamadas = []
+
+    def requisita(status):
+        def funcao():
+            chamadas.append(status)
+            return resposta(status)
+
+        return funcao
+
+    politica.executa("GET", "https://exemplo.com.br/", requisita(520), tentativas=3)
+    with pytest.raises(CircuitoAberto):  # Falha sem acessar o host
+        politica.executa("GET", "https://exemplo.com.br/", requisita(200))
+    assert chamadas == [520] * 3
+    assert politica.executa("GET", "https://outro.com.br/", requisita(200)).status_code == 200
+
+    time.sleep(0.06)  # Circuito meio-aberto: uma requisição de teste é liberada e, como falha, o circuito abre de novo
+    politica.executa("GET", "https://exemplo.com.br/", requisita(520), tentativas=1)
+    with pytest.raises(CircuitoAberto):
+        politica.executa("GET", "https://exemplo.com.br/", requisita(200))
+    time.sleep(0.06)
+    assert politica.executa("GET", "https://exemplo.com.br/", requisita(200)).status_code == 200
+    assert politica.estado("exemplo.com.br").aberto_ate is None
+
+
+@pytest.mark.parametrize(
+    "erro", [requests.exceptions.ChunkedEncodingError, requests.exceptions.SSLError, KeyboardInterrupt]
+)
+def test_politica_retentativas_circuito_com_outros_erros(erro):
+    politica = politica_de_teste(limite_falhas=1, tempo_aberto=0.05)
+
+    def falha():
+        raise erro()
+
+    with pytest.raises(erro):
+        politica.executa("GET", "https://exemplo.com.br/", falha, tentativas=1)
+    assert politica.estado("exemplo.com.br").aberto_ate is not None
+    time.sleep(0.06)  # A requisição de teste falha com um erro que não é repetido: o circuito abre de novo
+    with pytest.raises(erro):
+        politica.executa("GET", "https://exemplo.com.br/", falha, tentativas=1)
+    assert not politica.estado("exemplo.com.br").testando
+    time.sleep(0.06)
+    assert politica.executa("GET", "https://exemplo.com.br/", lambda: resposta(200)).status_code == 200
+
+
+def test_limitador_concorrencia_aimd():
+    limitador = LimitadorConcorrencia(inicial=1, maximo=3, intervalo_reducao=10)
+    agora = [0.0]
+    limitador.relogio = lambda: agora[0]
+    url = "https://exemplo.com.br/x"
+
+    def requisita(status=200, latencia=0.1):
+        def funcao():
+            agora[0] += latencia
+            return resposta(status)
+
+        return funcao
+
+    limitador.executa(url, requisita())
+    assert limitador.estado("exemplo.com.br").limite == 2  # Limite todo ocupado e resposta rápida: aumenta
+    for _ in range(10):
+        limitador.executa(url, requisita())
+    assert limitador.estado("exemplo.com.br").limite == 2  # Só 1 requisição por vez: o limite não é usado, não aumenta
+
+    # Requisições aninhadas simulam 2 simultâneas; a lenta (> 3x a latência normal) não aumenta o limite
+    limitador.executa(url, lambda: limitador.executa(url, requisita(latencia=1.0)))
+    assert limitador.estado("exemplo.com.br").limite == 2
+    limitador.executa(url, lambda: limitador.executa(url, requisita()))
+    assert limitador.estado("exemplo.com.br").limite == 2.5
+
+    assert limitador.executa(url, requisita(503)).status_code == 503
+    assert limitador.estado("exemplo.com.br").limite == 1.25
+    limitador.executa(url, requisita(520))  # Dentro do `intervalo_reducao`: não reduz novamente
+    assert limitador.estado("exemplo.com.br").limite == 1.25
+
+    def timeout():
+        raise requests.exceptions.Timeout("lento")
+
+    agora[0] += 10
+    with pytest.raises(requests.exceptions.Timeout):
+        limitador.executa(url, timeout)
+    assert [(evento.motivo, evento.limite) for evento in limitador.eventos] == [("HTTP 503", 1.25), ("timeout", 1)]
+
+    estatisticas = limitador.estatisticas()["exemplo.com.br"]
+    assert estatisticas["limite"] == 1 and estatisticas["em_andamento"] == 0
+    assert estatisticas["requisicoes"] == 18 and estatisticas["reducoes"] == 2
+    assert estatisticas["taxa_falhas"] == 3 / 18
+    assert estatisticas["latencia_p50"] == pytest.approx(0.1) and estatisticas["latencia_p99"] == pytest.approx(1.0)
+    assert "exemplo.com.br: limite 1, 18 requisições" in limitador.relatorio()
+
+
+def test_limitador_concorrencia_limita_requisicoes_simultaneas(servidor):
+    pasta, base_url, _ = servidor
+    (pasta / "dados.txt").write_bytes(b"dados")
+    limitador = LimitadorConcorrencia(inicial=2, maximo=2)
+    simultaneas, maximo, lock = [0], [0], threading.Lock()
+
+    def requisita():
+        with lock:
+            simultaneas[0] += 1
+            maximo[0] = max(maximo[0], simultaneas[0])
+        time.sleep(0.02)
+        with lock:
+            simultaneas[0] -= 1
+        return resposta(200)
+
+    threads = [
+        threading.Thread(target=limitador.executa, args=("https://exemplo.com.br/", requisita)) for _ in range(6)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert maximo[0] == 2
+
+    session = create_session()
+    session.limitador_concorrencia = limitador
+    assert session.get(f"{base_url}/dados.txt").content == b"dados"
+    assert limitador.estatisticas()[base_url.split("//")[1]]["requisicoes"] == 1
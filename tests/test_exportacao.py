@@ -0,0 +1,238 @@
+import csv
+import datetime
+import gzip
+import io
+import json
+from dataclasses import asdict, dataclass
+from decimal import Decimal
+from typing import List, Optional
+
+import pytest
+
+from mercados.b3 import FundoB3, NegociacaoBolsa, TabelaNegociacaoBolsa, le_negociacoes_intradiarias
+from mercados.cvm import InformeDiarioFundo
+from mercados.document import CotistaFundo
+from mercados.exportacao import (
+    EscritorColunar,
+    Exportador,
+    esquema,
+    exporta,
+    extrator_campos,
+    le_colunar,
+    le_registros_colunar,
+)
+from tests.auxiliares import informes, linha_cotahist, linhas_intradiaria
+
+
+def test_esquema_usa_anotacoes():
+    assert esquema(InformeDiarioFundo) == [
+        ("fundo_cnpj", "texto"),
+        ("data_competencia", "data"),
+        ("valor_captado", "decimal"),
+        ("valor_resgatado", "decimal"),
+        ("patrimonio_liquido", "decimal"),
+        ("valor_cota", "decimal"),
+        ("valor_carteira", "decimal"),
+        ("fundo_tipo", "texto"),
+        ("cotistas", "inteiro"),
+    ]
+
+
+def test_colunar_ida_e_volta(tmp_path):
+    filename = tmp_path / "informes.colunar"
+    esperado = list(informes(1000))
+    with EscritorColunar(filename, InformeDiarioFundo, tamanho_lote=300) as escritor:
+        escritor.escreve_varios(esperado)
+    assert escritor.registros == 1000
+    assert list(le_registros_colunar(filename, InformeDiarioFundo)) == esperado
+    colunas = le_colunar(filename)
+    assert colunas["cotistas"][:2] == [None, 1]
+    assert type(colunas["data_competencia"][0]) is datetime.date
+
+
+def test_colunar_datahora_e_nulos(tmp_path):
+    filename = tmp_path / "intradiaria.colunar"
+    negociacoes = list(le_negociacoes_intradiarias(linhas_intradiaria(100)))
+    with EscritorColunar(filename, type(negociacoes[0])) as escritor:
+        escritor.escreve_varios(negociacoes)
+    lidas = list(le_registros_colunar(filename, type(negociacoes[0])))
+    assert lidas == negociacoes
+    assert lidas[0].datahora.utcoffset() == datetime.timedelta(hours=-3)
+
+    filename = tmp_path / "bolsa.colunar"
+    tabela = TabelaNegociacaoBolsa.from_lines(
+        [linha_cotahist("PETR4"), linha_cotahist("PETRL350", quantidade=" " * 18, vencimento="20250117")]
+    )
+    esperado = list(tabela.to_records())
+    with EscritorColunar(filename, NegociacaoBolsa) as escritor:
+        escritor.escreve_varios(esperado)
+    assert list(le_registros_colunar(filename, NegociacaoBolsa)) == esperado
+
+
+def test_colunar_valores_que_nao_cabem_viram_texto(tmp_path):
+    @dataclass
+    class Registro:
+        numero: int
+        valor: Optional[Decimal]
+        lista: List[str]
+
+    registros = [
+        Registro(2**70, Decimal("NaN"), ["a", "b"]),
+        Registro(1, None, []),
+    ]
+    filename = tmp_path / "registros.colunar"
+    with EscritorColunar(filename, Registro) as escritor:
+        escritor.escreve_varios(registros)
+    colunas = le_colunar(filename)
+    assert colunas["numero"] == [2**70, 1]
+    assert colunas["valor"][0].is_nan() and colunas["valor"][1] is None
+    assert colunas["lista"] == ["['a', 'b']", "[]"]
+
+
+def test_colunar_vazio(tmp_path):
+    filename = tmp_path / "vazio.colunar"
+    EscritorColunar(filename, InformeDiarioFundo).fecha()
+    assert le_colunar(filename)["fundo_cnpj"] == []
+
+
+def test_formato_invalido(tmp_path):
+    with pytest.raises(ValueError):
+        EscritorColunar(tmp_path / "dados", InformeDiarioFundo, formato="xlsx")
+
+
+@pytest.mark.parametrize("extensao", ["parquet", "arrow"])
+def test_pyarrow_ida_e_volta(tmp_path, extensao):
+    pyarrow = pytest.importorskip("pyarrow")
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    filename = tmp_path / f"informes.{extensao}"
+    esperado = list(informes(250))
+    with EscritorColunar(filename, InformeDiarioFundo, tamanho_lote=100) as escritor:
+        escritor.escreve_varios(esperado)
+    if extensao == "parquet":
+        tabela = pyarrow.parquet.read_table(filename)
+    else:
+        tabela = pyarrow.ipc.open_file(filename).read_all()
+    assert tabela.num_rows == 250
+    assert tabela.schema.field("data_competencia").type == pyarrow.date32()
+    assert [InformeDiarioFundo(**row) for row in tabela.to_pylist()] == esperado
+
+
+def csv_com_dictwriter(registros, **kwargs):
+    """Como os comandos escreviam o CSV antes de `Exportador`"""
+    fobj, writer = io.StringIO(), None
+    for registro in registros:
+        row = registro.serialize() if hasattr(registro, "serialize") else asdict(registro)
+        if writer is None:
+            writer = csv.DictWriter(fobj, fieldnames=list(row.keys()), **kwargs)
+            writer.writeheader()
+        writer.writerow(row)
+    return fobj.getvalue()
+
+
+def fundo_b3(acronimo, codigos=None):
+    valores = {campo: f"{campo}-{acronimo}" for campo in FundoB3.__dataclass_fields__}
+    valores.update(id_fnet=1, acronimo=acronimo, cotas=1.5, data_aprovacao_cotas=datetime.date(2024, 1, 2))
+    return FundoB3(**{**valores, "codigos_negociacao": codigos})
+
+
+def test_extrator_campos_equivale_a_asdict():
+    @dataclass
+    class Informe:
+        fundo: str
+        cotistas_significativos: List[CotistaFundo]
+
+    informe = Informe("X", [CotistaFundo("PF", "123", Decimal("0.5"))])
+    nomes, extrai = extrator_campos(Informe)
+    assert dict(zip(nomes, extrai(informe))) == asdict(informe)
+    registro = next(informes(1))
+    nomes, extrai = extrator_campos(type(registro))
+    assert dict(zip(nomes, extrai(registro))) == asdict(registro)
+
+
+def le_texto(filename):
+    filename = str(filename)
+    if filename.endswith(".zst"):
+        zstandard = pytest.importorskip("zstandard")
+        fobj = zstandard.open(filename, mode="rt", encoding="utf-8", newline="")
+    elif filename.endswith(".gz"):
+        fobj = gzip.open(filename, mode="rt", encoding="utf-8", newline="")
+    else:
+        fobj = open(filename, encoding="utf-8", newline="")
+    with fobj:
+        return fobj.read()
+
+
+@pytest.mark.parametrize("extensao", ["csv", "tsv", "csv.gz", "tsv.zst"])
+def test_exportador_csv_igual_ao_dictwriter(tmp_path, extensao):
+    if extensao.endswith(".zst"):
+        pytest.importorskip("zstandard")
+    registros = list(informes(50))
+    filename = tmp_path / f"informes.{extensao}"
+    with Exportador(filename, tamanho_lote=7) as exportador:
+        exportador.escreve_varios(registros)
+    assert exportador.registros == 50
+    dialeto = "excel-tab" if extensao.startswith("tsv") else "excel"
+    assert le_texto(filename) == csv_com_dictwriter(registros, dialect=dialeto)
+
+
+def test_exportador_usa_serialize_personalizado(tmp_path):
+    fundos = [fundo_b3("ABCD", ["ABCD11", "ABCD12"]), fundo_b3("EFGH")]
+    filename = tmp_path / "fundos.csv"
+    exporta(fundos, filename)
+    assert le_texto(filename) == csv_com_dictwriter(fundos)
+    assert le_texto(filename).startswith("codigo_negociacao,")
+
+
+@dataclass
+class Aprovacao:
+    codigo: str
+    data: Optional[datetime.date] = None
+
+    def serialize(self):  # Altera o valor apenas quando preenchido (como `FundoB3.serialize`)
+        return {"codigo": self.codigo, "data": self.data.strftime("%d/%m/%Y") if self.data else self.data}
+
+
+@dataclass
+class ComReferenciaInvalida:
+    codigo: str
+    extra: "TipoInexistente" = None  # noqa: F821
+
+
+def test_exportador_decide_serialize_pela_classe(tmp_path):
+    registros = [Aprovacao("A"), Aprovacao("B", datetime.date(2024, 12, 9))]
+    exporta(registros, tmp_path / "aprovacoes.csv")
+    assert le_texto(tmp_path / "aprovacoes.csv").splitlines() == ["codigo,data", "A,", "B,09/12/2024"]
+
+    # Anotações que não podem ser resolvidas não impedem a exportação
+    exporta([ComReferenciaInvalida("A", ["x"])], tmp_path / "referencia.jsonl")
+    assert json.loads((tmp_path / "referencia.jsonl").read_text()) == {"codigo": "A", "extra": ["x"]}
+
+
+def test_exportador_dicionarios_e_jsonl(tmp_path):
+    filename = tmp_path / "linhas.jsonl"
+    registros = [
+        {"data": datetime.date(2024, 12, 9), "valor": Decimal("1.10"), "nome": "Ação"},
+        {"data": None, "valor": Decimal("2"), "nome": "B"},
+    ]
+    assert exporta(registros, filename) == 2
+    linhas = [json.loads(linha) for linha in filename.read_text(encoding="utf-8").splitlines()]
+    assert linhas == [
+        {"data": "2024-12-09", "valor": "1.10", "nome": "Ação"},
+        {"data": None, "valor": "2", "nome": "B"},
+    ]
+    with pytest.raises(ValueError, match="extra"):
+        exporta([{"a": 1}, {"a": 2, "extra": 3}], tmp_path / "erro.csv")
+
+
+def test_exportador_colunar(tmp_path):
+    registros = list(informes(10))
+    assert exporta(registros, tmp_path / "informes.colunar") == 10
+    assert list(le_registros_colunar(tmp_path / "informes.colunar", InformeDiarioFundo)) == registros
+    exporta([], tmp_path / "vazio.colunar", classe=InformeDiarioFundo)
+    assert le_colunar(tmp_path / "vazio.colunar")["fundo_cnpj"] == []
+    with pytest.raises(ValueError):
+        exporta([{"a": 1}], tmp_path / "dicionarios.colunar")
+    with pytest.raises(ValueError):
+        Exportador(tmp_path / "informes.colunar.gz")
@@ -0,0 +1,246 @@
+import csv
+import datetime
+import threading
+
+from mercados.document import DocumentMeta
+from mercados.fundosnet import EstadoSincronizacao, FundosNet
+from mercados.utils import BRT
+
+
+def linha(doc_id, data_entrega, fundo):
+    return {
+        "id": doc_id,
+        "altaPrioridade": False,
+        "analisado": "N",
+        "categoriaDocumento": "Informes Periódicos",
+        "dataEntrega": data_entrega.strftime("%d/%m/%Y %H:%M"),
+        "formatoDataReferencia": "3",
+        "dataReferencia": data_entrega.strftime("%d/%m/%Y"),
+        "especieDocumento": "",
+        "descricaoFundo": fundo,
+        "nomePregao": "",
+        "informacoesAdicionais": "",
+        "descricaoModalidade": "AP",
+        "situacaoDocumento": "A",
+        "descricaoStatus": "AC",
+        "tipoDocumento": "Informe Mensal",
+        "versao": 1,
+    }
+
+
+def data_entrega(row):
+    return datetime.datetime.strptime(row["dataEntrega"], "%d/%m/%Y %H:%M").date()
+
+
+def cria_documentos():
+    documentos, data = [], datetime.datetime(2024, 1, 1, 10, 0)
+    for doc_id in range(1, 61):
+        documentos.append(linha(doc_id, data + datetime.timedelta(days=doc_id // 2), f"Fundo {doc_id % 7}"))
+    return documentos
+
+
+def test_search_particionada_ordena_e_remove_repetidos(monkeypatch):
+    documentos = cria_documentos()
+    instancias = set()
+    lock = threading.Lock()
+
+    def paginate(self, path, params=None, xhr=True, items_per_page=200):
+        with lock:
+            instancias.add(id(self))
+        inicio = datetime.datetime.strptime(params["dataInicial"], "%d/%m/%Y").date()
+        fim = datetime.datetime.strptime(params["dataFinal"], "%d/%m/%Y").date()
+        campo, ordem = [(key, value) for key, value in params.items() if key.startswith("o[0]")][0]
+        chave = {"o[0][dataEntrega]": "dataEntrega", "o[0][denominacaoSocial]": "descricaoFundo"}[campo]
+        selecionados = [row for row in documentos if inicio <= data_entrega(row) <= fim]
+        if chave == "dataEntrega":
+            selecionados.sort(key=lambda row: (data_entrega(row), row["id"]), reverse=ordem == "desc")
+        else:
+            selecionados.sort(key=lambda row: row[chave], reverse=ordem == "desc")
+        # Simula documento repetido na fronteira entre intervalos
+        yield from selecionados + selecionados[:1]
+
+    monkeypatch.setattr(FundosNet, "csrf_token", "token")
+    monkeypatch.setattr(FundosNet, "paginate", paginate)
+    fnet = FundosNet()
+    inicio, fim = datetime.date(2024, 1, 1), datetime.date(2024, 2, 15)
+
+    resultado = list(fnet.search(start_date=inicio, end_date=fim, max_workers=4, dias_por_intervalo=5))
+    datas = [doc.datahora_entrega for doc in resultado]
+    assert datas == sorted(datas, reverse=True)
+    assert len({doc.id for doc in resultado}) == len(resultado)
+    assert len(resultado) == len([row for row in documentos if data_entrega(row) <= fim])
+    assert len(instancias) > 1  # Uma instância de `FundosNet` por thread
+
+    resultado = list(
+        fnet.search(
+            start_date=inicio,
+            end_date=fim,
+            ordering_field="denominacaoSocial",
+            order="asc",
+            max_workers=3,
+            dias_por_intervalo=7,
+        )
+    )
+    assert [doc.fundo for doc in resultado] == sorted(doc.fundo for doc in resultado)
+    assert len({doc.id for doc in resultado}) == len(resultado)
+
+
+def test_sincroniza_devolve_apenas_documentos_novos(monkeypatch, tmp_path):
+    documentos = cria_documentos()[:10]
+    buscas = []
+
+    def paginate(self, path, params=None, xhr=True, items_per_page=200):
+        buscas.append(params["dataInicial"])
+        yield from documentos
+
+    monkeypatch.setattr(FundosNet, "csrf_token", "token")
+    monkeypatch.setattr(FundosNet, "paginate", paginate)
+    fnet = FundosNet()
+    filename = tmp_path / "estado.sqlite"
+    inicio, fim = datetime.date(2024, 1, 1), datetime.date(2024, 3, 1)
+
+    with EstadoSincronizacao(filename) as estado:
+        assert [doc.id for doc in fnet.sincroniza(estado, start_date=inicio, end_date=fim)] == list(range(1, 11))
+    with EstadoSincronizacao(filename) as estado:
+        assert estado.marca_dagua() == datetime.datetime(2024, 1, 6, 10, 0, tzinfo=BRT)
+        assert list(fnet.sincroniza(estado, start_date=inicio, end_date=fim)) == []
+
+    documentos.append(linha(11, datetime.datetime(2024, 1, 7, 9, 0), "Fundo 1"))
+    documentos.append({**documentos[2], "versao": 2})
+    with EstadoSincronizacao(filename) as estado:
+        novos = [(doc.id, doc.versao) for doc in fnet.sincroniza(estado, start_date=inicio, end_date=fim)]
+    assert novos == [(11, 1), (3, 2)]
+    # Depois da primeira sincronização, a busca começa na marca d'água menos a sobreposição (1 dia)
+    assert buscas == ["01/01/2024", "05/01/2024", "05/01/2024"]
+
+
+def test_sincroniza_registra_apenas_documentos_processados(monkeypatch, tmp_path):
+    documentos = cria_documentos()[:10]
+
+    def paginate(self, path, params=None, xhr=True, items_per_page=200):
+        yield from documentos
+
+    monkeypatch.setattr(FundosNet, "csrf_token", "token")
+    monkeypatch.setattr(FundosNet, "paginate", paginate)
+    fnet = FundosNet()
+    inicio, fim = datetime.date(2024, 1, 1), datetime.date(2024, 3, 1)
+
+    # Sincronização interrompida: o documento em processamento não é registrado e a marca d'água não avança
+    filename = tmp_path / "interrompida.sqlite"
+    with EstadoSincronizacao(filename) as estado:
+        for documento in fnet.sincroniza(estado, start_date=inicio, end_date=fim, commit_a_cada=1):
+            if documento.id == 3:
+                break
+    with EstadoSincronizacao(filename) as estado:
+        assert estado.marca_dagua() is None
+        assert [doc.id for doc in fnet.sincroniza(estado, start_date=inicio, end_date=fim)] == list(range(3, 11))
+        assert estado.marca_dagua() == datetime.datetime(2024, 1, 6, 10, 0, tzinfo=BRT)
+
+    # Com `confirma=False`, os documentos podem ser registrados depois que a busca termina (como em um processamento
+    # paralelo) e a marca d'água, calculada em `finaliza`, para no documento mais antigo que não foi registrado
+    filename = tmp_path / "confirmada.sqlite"
+    with EstadoSincronizacao(filename) as estado:
+        devolvidos = list(fnet.sincroniza(estado, start_date=inicio, end_date=fim, confirma=False))
+        assert estado.marca_dagua() is None
+        for documento in devolvidos:
+            if documento.id not in (5, 7):
+                estado.registra(documento)
+        estado.finaliza()
+        assert estado.marca_dagua() == datetime.datetime(2024, 1, 3, 10, 0, tzinfo=BRT)
+    with EstadoSincronizacao(filename) as estado:
+        assert [doc.id for doc in fnet.sincroniza(estado, start_date=inicio, end_date=fim)] == [5, 7]
+        assert estado.marca_dagua() == datetime.datetime(2024, 1, 6, 10, 0, tzinfo=BRT)
+
+
+def test_baixa_documentos_pula_existentes_e_registra_falhas(monkeypatch, servidor, tmp_path):
+    pasta_servidor, base_url, status_codes = servidor
+    for doc_id in (1, 2, 4):
+        (pasta_servidor / f"{doc_id}.pdf").write_bytes(f"documento {doc_id}".encode("ascii"))
+    monkeypatch.setattr(FundosNet, "csrf_token", "token")
+    monkeypatch.setattr(DocumentMeta, "url", property(lambda self: f"{base_url}/{self.id}.pdf"))
+    documentos = [DocumentMeta.from_json(row) for row in cria_documentos()[:4]]
+    pasta = tmp_path / "documentos"
+    pasta.mkdir()
+    (pasta / "2.pdf").write_bytes(b"baixado antes")
+    (pasta / "4.pdf.part").write_bytes(b"incomple")
+
+    fnet = FundosNet()
+    arquivo_falhas = tmp_path / "falhas.csv"
+    resultados = list(fnet.baixa_documentos(documentos, pasta, max_workers=3, arquivo_falhas=arquivo_falhas))
+    assert [(resultado.documento_id, resultado.situacao) for resultado in resultados] == [
+        (1, "baixado"),
+        (2, "existente"),
+        (3, "falha"),
+        (4, "baixado"),
+    ]
+    assert (pasta / "1.pdf").read_bytes() == b"documento 1"
+    assert (pasta / "2.pdf").read_bytes() == b"baixado antes"
+    assert (pasta / "4.pdf").read_bytes() == b"documento 4"
+    assert not (pasta / "4.pdf.part").exists()
+    with arquivo_falhas.open() as fobj:
+        falhas = list(csv.DictReader(fobj))
+    assert [falha["documento_id"] for falha in falhas] == ["3"]
+    assert sorted(status_codes) == [200, 200, 404]
+
+
+def test_sincroniza_com_download_repete_documentos_que_falharam(monkeypatch, servidor, tmp_path):
+    pasta_servidor, base_url, _ = servidor
+    for doc_id in (1, 2, 4):
+        (pasta_servidor / f"{doc_id}.pdf").write_bytes(f"documento {doc_id}".encode("ascii"))
+    documentos = cria_documentos()[:4]
+
+    def paginate(self, path, params=None, xhr=True, items_per_page=200):
+        yield from documentos
+
+    monkeypatch.setattr(FundosNet, "csrf_token", "token")
+    monkeypatch.setattr(FundosNet, "paginate", paginate)
+    monkeypatch.setattr(DocumentMeta, "url", property(lambda self: f"{base_url}/{self.id}.pdf"))
+    fnet = FundosNet()
+    filename, pasta = tmp_path / "estado.sqlite", tmp_path / "documentos"
+    inicio, fim = datetime.date(2024, 1, 1), datetime.date(2024, 3, 1)
+
+    def sincroniza_e_baixa():
+        with EstadoSincronizacao(filename) as estado:
+            novos = fnet.sincroniza(estado, start_date=inicio, end_date=fim, confirma=False)
+            return [
+                (resultado.documento_id, resultado.situacao)
+                for resultado in fnet.baixa_documentos(novos, pasta, max_workers=2, estado=estado)
+            ]
+
+    def marca_dagua():
+        with EstadoSincronizacao(filename) as estado:
+            return estado.marca_dagua()
+
+    assert sincroniza_e_baixa() == [(1, "baixado"), (2, "baixado"), (3, "falha"), (4, "baixado")]
+    assert marca_dagua() == datetime.datetime(2024, 1, 2, 10, 0, tzinfo=BRT)  # Para no documento que falhou
+    assert sincroniza_e_baixa() == [(3, "falha")]  # O documento que falhou não foi registrado
+    (pasta_servidor / "3.pdf").write_bytes(b"documento 3")
+    assert sincroniza_e_baixa() == [(3, "baixado")]
+    assert marca_dagua() == datetime.datetime(2024, 1, 3, 10, 0, tzinfo=BRT)
+    assert sincroniza_e_baixa() == []
+    assert (pasta / "3.pdf").read_bytes() == b"documento 3"
+
+
+def test_sincroniza_com_download_paralelo_avanca_marca_dagua(monkeypatch, servidor, tmp_path):
+    pasta_servidor, base_url, _ = servidor
+    documentos = cria_documentos()[::-1]  # Como no FundosNet, os mais recentes primeiro
+    for row in documentos:
+        (pasta_servidor / f"{row['id']}.pdf").write_bytes(b"documento")
+
+    def paginate(self, path, params=None, xhr=True, items_per_page=200):
+        yield from documentos
+
+    monkeypatch.setattr(FundosNet, "csrf_token", "token")
+    monkeypatch.setattr(FundosNet, "paginate", paginate)
+    monkeypatch.setattr(DocumentMeta, "url", property(lambda self: f"{base_url}/{self.id}.pdf"))
+    fnet = FundosNet()
+    filename = tmp_path / "estado.sqlite"
+    with EstadoSincronizacao(filename) as estado:
+        novos = fnet.sincroniza(
+            estado, start_date=datetime.date(2024, 1, 1), end_date=datetime.date(2024, 3, 1), confirma=False
+        )
+        resultados = list(fnet.baixa_documentos(novos, tmp_path / "documentos", max_workers=4, estado=estado))
+    assert len(resultados) == 60 and {resultado.situacao for resultado in resultados} == {"baixado"}
+    # Os últimos downloads (dos documentos mais antigos) terminam depois da busca, mas não seguram a marca d'água
+    with EstadoSincronizacao(filename) as estado:
+        assert estado.marca_dagua() == datetime.datetime(2024, 1, 31, 10, 0, tzinfo=BRT)
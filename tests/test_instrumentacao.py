@@ -0,0 +1,159 @@
+import argparse
+import datetime
+import json
+import sys
+import zipfile
+
+import pytest
+import requests
+
+from mercados.cvm import CVM
+from mercados.exportacao import exporta
+from mercados.instrumentacao import (
+    ETAPAS,
+    ColetorSpans,
+    Instrumentacao,
+    RegistroMetricas,
+    finaliza_estatisticas,
+    formata_estatisticas,
+    inicia_estatisticas,
+)
+from mercados.utils import CacheHTTP, PoliticaRetentativas, create_session, mapeia_em_paralelo
+from tests.auxiliares import zip_informe_anual
+
+
+@pytest.fixture
+def instrumentacao():
+    instrumentacao = Instrumentacao()
+    metricas = instrumentacao.adiciona(RegistroMetricas(buckets=(0.5, 60)))
+    spans = instrumentacao.adiciona(ColetorSpans())
+    return instrumentacao, metricas, spans
+
+
+def test_instrumentacao_mede_requisicoes(servidor, instrumentacao, tmp_path):
+    pasta, base_url, _ = servidor
+    instrumentacao, metricas, spans = instrumentacao
+    (pasta / "dados.json").write_text(json.dumps({"valor": 1}))
+    politica = PoliticaRetentativas(espera_minima=0)
+    politica.dorme = lambda espera: None
+    session = create_session(politica=politica, instrumentacao=instrumentacao)
+
+    with instrumentacao.span("coleta", comando="teste") as span_coleta:
+        assert session.get(f"{base_url}/dados.json").json() == {"valor": 1}
+        assert session.get(f"{base_url}/inexistente/12345").status_code == 404
+        cache = CacheHTTP(tmp_path / "cache", revalidar=False)
+        for _ in range(2):
+            cache.abre(session, f"{base_url}/dados.json").close()
+        # O span atual também vale nas threads de `mapeia_em_paralelo`
+        list(mapeia_em_paralelo(lambda _: session.get(f"{base_url}/dados.json"), range(4), max_workers=2))
+
+    resultado = metricas.metricas()
+    assert resultado["cache"] == {"miss": 1, "hit": 1}
+    por_endpoint = {item["endpoint"]: item for item in resultado["endpoints"]}
+    assert por_endpoint["/dados.json"]["requisicoes"] == 6
+    assert por_endpoint["/dados.json"]["status"] == {"200": 6}
+    assert por_endpoint["/dados.json"]["bytes_recebidos"] == 6 * len(json.dumps({"valor": 1}))
+    assert por_endpoint["/inexistente/{param}"]["status"] == {"404": 1}
+
+    texto = metricas.prometheus()
+    host = base_url.split("//")[1]
+    assert "# TYPE mercados_http_requisicao_segundos histogram" in texto
+    rotulos = f'host="{host}",endpoint="/dados.json",metodo="GET"'
+    assert f'mercados_http_requisicao_segundos_bucket{{{rotulos},le="+Inf"}} 6' in texto
+    assert (
+        f'mercados_http_respostas_total{{host="{host}",endpoint="/inexistente/{{param}}",metodo="GET",status="404"}} 1'
+        in texto
+    )
+    assert 'mercados_cache_total{resultado="hit"} 1' in texto
+    metricas.escreve_prometheus(tmp_path / "metricas" / "mercados.prom")
+    assert (tmp_path / "metricas" / "mercados.prom").read_text() == texto
+
+    *requisicoes, ultimo = spans.spans
+    assert ultimo is span_coleta and ultimo.atributos == {"comando": "teste"}
+    assert len(requisicoes) == 7
+    assert {span.trace_id for span in requisicoes} == {span_coleta.trace_id}
+    assert {span.span_pai_id for span in requisicoes} == {span_coleta.span_id}
+    dados = requisicoes[1].como_dict()
+    assert dados["kind"] == "SPAN_KIND_CLIENT" and dados["name"] == "GET /inexistente/{param}"
+    assert dados["attributes"]["http.response.status_code"] == 404
+    assert dados["status"]["code"] == "STATUS_CODE_ERROR"
+    assert dados["endTimeUnixNano"] >= dados["startTimeUnixNano"]
+
+
+def test_instrumentacao_conta_retentativas_e_erros(servidor, instrumentacao, monkeypatch):
+    pasta, base_url, _ = servidor
+    (pasta / "dados.txt").write_text("dados")
+    instrumentacao, metricas, spans = instrumentacao
+    politica = PoliticaRetentativas(espera_minima=0)
+    politica.dorme = lambda espera: None
+    session = create_session(politica=politica, instrumentacao=instrumentacao)
+
+    respostas = iter([503, 503, 200])
+    original = requests.Session.request
+
+    def request(self, method, url, *args, **kwargs):  # Simula um servidor instável
+        response = original(self, method, url, *args, **kwargs)
+        response.status_code = next(respostas)
+        return response
+
+    monkeypatch.setattr(requests.Session, "request", request)
+    assert session.get(f"{base_url}/dados.txt").status_code == 200
+    monkeypatch.undo()
+    (item,) = metricas.metricas()["endpoints"]
+    assert item["requisicoes"] == 1 and item["retentativas"] == 2 and item["status"] == {"200": 1}
+    assert spans.spans[-1].atributos["http.request.resend_count"] == 2
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        session.get("http://127.0.0.1:1/", tentativas=1)
+    erro = [item for item in metricas.metricas()["endpoints"] if item["host"] == "127.0.0.1:1"][0]
+    assert erro["status"] == {"ConnectionError": 1}
+    assert spans.spans[-1].como_dict()["status"] == {"code": "STATUS_CODE_ERROR", "message": "ConnectionError"}
+
+
+def test_instrumentacao_sem_coletores_nao_mede(servidor):
+    pasta, base_url, _ = servidor
+    (pasta / "dados.txt").write_text("dados")
+    instrumentacao = Instrumentacao()
+    session = create_session(instrumentacao=instrumentacao)
+    assert session.get(f"{base_url}/dados.txt").text == "dados"
+    metricas = instrumentacao.adiciona(RegistroMetricas())
+    session.get(f"{base_url}/dados.txt")
+    instrumentacao.remove(metricas)
+    session.get(f"{base_url}/dados.txt")
+    assert [item["requisicoes"] for item in metricas.metricas()["endpoints"]] == [1]
+
+
+def test_estatisticas_por_etapa(monkeypatch, servidor, tmp_path):
+    pasta, base_url, _ = servidor
+    zip_informe_anual(pasta / "inf_diario_fi_2019.zip", 2019, linhas_por_mes=500)
+    monkeypatch.setattr(CVM, "url_informe_diario_fundo", lambda self, ano_mes: f"{base_url}/inf_diario_fi_2019.zip")
+    args = argparse.Namespace(stats=True, stats_json=tmp_path / "stats" / "estatisticas.json")
+    monkeypatch.setattr(sys, "argv", ["cvm", "informe-diario-fundo"])
+
+    inicia_estatisticas(args)
+    exporta(CVM(leitura_parcial=False).informe_diario_fundo(datetime.date(2019, 3, 1)), tmp_path / "informes.csv")
+    finaliza_estatisticas(args, comando="informe-diario-fundo")
+    assert not ETAPAS.ativa
+
+    estatisticas = json.loads(args.stats_json.read_text())
+    assert estatisticas["comando"] == "informe-diario-fundo"
+    assert estatisticas["argumentos"] == ["informe-diario-fundo"]
+    etapas = estatisticas["etapas"]
+    assert list(etapas) == ["download", "descompressao", "conversao", "escrita"]
+    assert etapas["download"]["bytes"] == (pasta / "inf_diario_fi_2019.zip").stat().st_size
+    with zipfile.ZipFile(pasta / "inf_diario_fi_2019.zip") as zf:  # Apenas o CSV do mês é descompactado
+        assert etapas["descompressao"]["bytes"] == zf.getinfo("inf_diario_fi_201903.csv").file_size
+    assert etapas["conversao"]["registros"] == etapas["escrita"]["registros"] == 500
+    assert etapas["escrita"]["bytes"] == (tmp_path / "informes.csv").stat().st_size
+    # Os tempos são exclusivos: a soma das etapas (todas na mesma thread) não passa do total
+    assert sum(etapa["tempo"] for etapa in etapas.values()) <= estatisticas["tempo"]
+    assert estatisticas["memoria_maxima"] > 0
+
+    texto = formata_estatisticas(estatisticas)
+    assert texto.splitlines()[0].split()[:3] == ["etapa", "tempo", "(s)"]
+    assert "descompressao" in texto and "pico de memória" in texto
+
+    # Sem `--stats`, nada é medido
+    ETAPAS.conta("download", bytes_=1)
+    inicia_estatisticas(argparse.Namespace(stats=False, stats_json=None))
+    assert not ETAPAS.ativa
@@ -0,0 +1,52 @@
+import random
+import threading
+import time
+
+from mercados.utils import LimitadorTaxa, mapeia_em_paralelo
+
+
+def test_mapeia_em_paralelo_mantem_ordem():
+    def funcao(valor):
+        time.sleep(random.random() / 100)
+        return valor * 10
+
+    assert list(mapeia_em_paralelo(funcao, range(50), max_workers=8)) == [valor * 10 for valor in range(50)]
+
+
+def test_mapeia_em_paralelo_limita_pendentes():
+    lock = threading.Lock()
+    em_execucao, maximo = 0, 0
+
+    def funcao(valor):
+        nonlocal em_execucao, maximo
+        with lock:
+            em_execucao += 1
+            maximo = max(maximo, em_execucao)
+        time.sleep(0.005)
+        with lock:
+            em_execucao -= 1
+        return valor
+
+    consumidos = []
+
+    def itens():
+        for valor in range(40):
+            consumidos.append(valor)
+            yield valor
+
+    resultado = mapeia_em_paralelo(funcao, itens(), max_workers=4)
+    assert next(resultado) == 0
+    assert len(consumidos) <= 2 * 4
+    assert list(resultado) == list(range(1, 40))
+    assert maximo <= 4
+
+
+def test_limitador_taxa_por_host():
+    limitador = LimitadorTaxa(requisicoes_por_segundo=50)
+    inicio = time.monotonic()
+    for _ in range(5):
+        limitador.aguarda("https://exemplo.com.br/a")
+        limitador.aguarda("https://outro.com.br/b")
+    duracao = time.monotonic() - inicio
+    # 5 requisições por host a 50/s: ao menos 4 intervalos de 20ms, e hosts diferentes não se somam
+    assert 0.07 <= duracao < 0.5
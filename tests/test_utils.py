@@ -1,8 +1,12 @@
-from datetime import date
+from dataclasses import asdict
+from datetime import date, datetime
 from decimal import Decimal
 from textwrap import dedent
 
-from mercados.utils import dicts_to_str
+from mercados.b3 import NegociacaoBolsa, NegociacaoBolsaCompacta
+from mercados.document import CotistaFundo, InformeDiarioFundo
+from mercados.utils import BRT, conversor_data, dicts_to_str, parse_date, serializa_dataclass
+from tests.auxiliares import linha_cotahist
 
 data = [
     {"data": date(2024, 11, 2)},
@@ -72,3 +76,55 @@ def test_dicts_to_str_md():
     )
     resultado = dicts_to_str(data, "md")
     assert resultado.strip() == esperado.strip()
+
+
+def test_serializa_dataclass_equivale_a_asdict():
+    linha = linha_cotahist("PETR4")
+    for obj in (NegociacaoBolsa.from_line(linha), NegociacaoBolsaCompacta.from_line(linha)):
+        assert obj.serialize() == serializa_dataclass(obj) == asdict(obj)
+
+    cotistas = [CotistaFundo("PF", "12345678901", Decimal("0.15")), CotistaFundo("PJ", "1234567800019", None)]
+    informe = InformeDiarioFundo(
+        *("doc", "1", date(2024, 12, 9), 10, "00000000000191"),
+        *(Decimal("1"), Decimal("2"), Decimal("3"), Decimal("4"), Decimal("5")),
+        cotistas_significativos=cotistas,
+        data_proximo_pl=date(2024, 12, 10),
+    )
+    resultado = informe.serialize()
+    assert resultado == asdict(informe)
+    assert resultado["cotistas_significativos"][0] == {
+        "tipo": "PF",
+        "documento": "12345678901",
+        "participacao": Decimal("0.15"),
+    }
+    resultado["cotistas_significativos"].clear()  # Assim como em `asdict`, listas aninhadas são cópias
+    assert len(informe.cotistas_significativos) == 2
+
+
+def test_parse_date_equivale_a_strptime():
+    casos = (
+        ("iso-date", "2025-01-02", "%Y-%m-%d"),
+        ("iso-date", "2025-1-2", "%Y-%m-%d"),  # Fora do caminho rápido
+        ("br-date", "02/01/2025", "%d/%m/%Y"),
+        ("br-date", "2/1/2025", "%d/%m/%Y"),
+        ("yyyymmdd", "20250102", "%Y%m%d"),
+        ("4", "02/01/2025 10:30", "%d/%m/%Y %H:%M"),
+        ("iso-datetime-tz", "2025-01-02T10:30:00-0300", "%Y-%m-%dT%H:%M:%S%z"),
+        ("iso-datetime-tz", "2025-01-02 10:30:00-03:00", "%Y-%m-%d %H:%M:%S%z"),
+    )
+    for fmt, valor, formato in casos:
+        esperado = datetime.strptime(valor, formato).replace(tzinfo=BRT)
+        assert parse_date(fmt, valor, full=True) == esperado
+        assert parse_date(fmt, f" {valor} ") == (esperado if fmt in ("4", "iso-datetime-tz") else esperado.date())
+    assert parse_date("1", "2025") == date(2025, 1, 1)
+    assert parse_date("2", "03/2025") == date(2025, 3, 1)
+    for vazio in ("", None, "0001-01-01"):
+        assert parse_date("iso-date", vazio) is None
+        assert parse_date("", vazio) is None  # Como no FundosNet, quando o formato também vem vazio
+    # Formatos desconhecidos são passados diretamente para o `strptime`
+    assert parse_date("%d.%m.%Y %H:%M", "02.01.2025 10:30", full=True) == datetime(2025, 1, 2, 10, 30, tzinfo=BRT)
+
+    converte = conversor_data("iso-date")
+    antes = converte.cache_info().hits
+    assert [converte("2025-01-02") for _ in range(10)] == [date(2025, 1, 2)] * 10
+    assert converte.cache_info().hits >= antes + 9